@@ -79,16 +79,59 @@ class LOCUST_input:
     def __setitem__(self,key,value):
         """
         access member data via []
+
+        notes:
+            drops any cached interpolators generated from data being replaced
         """
 
+        if key in self.data:
+            processing.utils.interpolator_cache.invalidate(self.data[key])
         self.data[key]=value
 
+    def get_interpolators(self,*keys):
+        """
+        returns cached 2D interpolators of quantities stored on R_1D,Z_1D grid
+
+        args:
+            keys - names of 2D quantities to interpolate
+        notes:
+            interpolators are held in processing.utils.interpolator_cache - if a quantity is replaced via [] or changed in place then its interpolator is regenerated
+        usage:
+            psirz_interpolator,=my_equilibrium.get_interpolators('psirz')
+        """
+
+        return [processing.utils.interpolate_2D(self['R_1D'],self['Z_1D'],self[key]) for key in keys]
+
     def read_data(self,data_format=None,filename=None,shot=None,run=None,**properties): #bad practice to change overridden method signatures, so retain all method arguments             
         """
         read data to be overloaded in all children classes
         """
 
         pass
+
+    def dump_data(self,data_format=None,filename=None,shot=None,run=None,**properties):
+        """
+        dump data to be overloaded in all children classes
+        """
+
+        pass
+
+    def __init_subclass__(cls,**kwargs):
+        """
+        adds LOCUST_IO_cache data_format and read-through caching to read_data and dump_data of all children
+
+        notes:
+            see processing.utils.LOCUST_IO_cache_read_data
+        usage:
+            my_input.dump_data(data_format='LOCUST_IO_cache',filename='some_cache')
+            my_input.read_data(data_format='LOCUST_IO_cache',filename='some_cache')
+        """
+
+        super().__init_subclass__(**kwargs)
+        if not getattr(cls.read_data,'LOCUST_IO_cache',False):
+            cls.read_data=processing.utils.LOCUST_IO_cache_read_data(cls.read_data,support.dir_input_files)
+        if not getattr(cls.dump_data,'LOCUST_IO_cache',False):
+            cls.dump_data=processing.utils.LOCUST_IO_cache_dump_data(cls.dump_data,support.dir_input_files)
  
     def look(self):
         """
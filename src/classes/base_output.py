@@ -46,6 +46,120 @@ except:
     raise ImportError("ERROR: LOCUST_IO/src/settings.py could not be imported!\nreturning\n") 
     sys.exit(1)
 
+################################################################## Lazy data
+
+class Lazy_Data(dict):
+    """
+    dictionary which holds loaders for fields and only reads each field from file when first accessed
+
+    self.loaders                dict mapping unloaded or evictable field names to loaders
+
+    notes:
+        a loader is any callable which takes a list of field names and returns a dict containing at least those fields
+        fields sharing a loader are read together in a single call to load() e.g. prefetching several columns with one pass over a file
+        unloaded fields appear in keys(), in and iteration - items() and values() load everything
+        replacing a field via [] drops its loader so it can no longer be evicted or overwritten by a reload
+    usage:
+        data=Lazy_Data(some_dict)
+        data.register(lambda keys: {key:read_some_field(key) for key in keys},'dfn','dfn_s')
+        data['dfn'] #read from file now
+    """
+
+    def __init__(self,*args,**kwargs):
+
+        super().__init__(*args,**kwargs)
+        self.loaders={}
+
+    def register(self,loader,*keys):
+        """
+        register loader for fields
+
+        notes:
+            registered fields are considered unloaded until next accessed
+        """
+
+        for key in keys:
+            dict.pop(self,key,None)
+            self.loaders[key]=loader
+
+    def loaded(self,key):
+        """
+        returns True if field is held in memory
+        """
+
+        return dict.__contains__(self,key)
+
+    def load(self,*keys):
+        """
+        load fields which are not yet held in memory
+
+        notes:
+            fields are grouped by loader so each loader is called at most once
+        """
+
+        groups={}
+        for key in keys:
+            if not self.loaded(key):
+                if key not in self.loaders:
+                    raise KeyError(key)
+                groups.setdefault(id(self.loaders[key]),(self.loaders[key],[]))[1].append(key)
+
+        for loader,group in groups.values():
+            values=loader(group)
+            for key in group:
+                dict.__setitem__(self,key,values[key])
+
+    def evict(self,*keys):
+        """
+        drop loaded fields from memory, to be reloaded when next accessed
+
+        notes:
+            returns list of evicted values
+        """
+
+        return [dict.pop(self,key) for key in keys if key in self.loaders and self.loaded(key)]
+
+    def __missing__(self,key):
+
+        self.load(key)
+        return dict.__getitem__(self,key)
+
+    def __setitem__(self,key,value):
+
+        self.loaders.pop(key,None)
+        dict.__setitem__(self,key,value)
+
+    def __contains__(self,key):
+
+        return dict.__contains__(self,key) or key in self.loaders
+
+    def __iter__(self):
+
+        yield from dict.keys(self)
+        yield from (key for key in self.loaders if not self.loaded(key))
+
+    def __len__(self):
+
+        return dict.__len__(self)+sum(not self.loaded(key) for key in self.loaders)
+
+    def keys(self):
+
+        return list(self)
+
+    def values(self):
+
+        self.load(*self)
+        return dict.values(self)
+
+    def items(self):
+
+        self.load(*self)
+        return dict.items(self)
+
+    def get(self,key,default=None):
+
+        return self[key] if key in self else default
+
 ################################################################## Base class
 
 class LOCUST_output:
@@ -79,10 +193,64 @@ class LOCUST_output:
     def __setitem__(self,key,value):
         """
         access member data via []
+
+        notes:
+            drops any cached interpolators generated from data being replaced
         """
 
+        if self.loaded(key):
+            processing.utils.interpolator_cache.invalidate(self.data[key])
         self.data[key]=value
 
+    def loaded(self,key):
+        """
+        returns True if field is held in memory i.e. accessing it will not read from file
+        """
+
+        return key in self.data and (not isinstance(self.data,Lazy_Data) or self.data.loaded(key))
+
+    def prefetch(self,*keys):
+        """
+        load lazily read fields into memory
+
+        notes:
+            if no key supplied then load all data
+            fields read by the same loader are read together e.g. one pass over a particle list for several coordinates
+            returns self so calls can be chained
+        usage:
+            my_output=Final_Particle_List(ID='',data_format='LOCUST',filename='ptcl_cache.dat',lazy=True).prefetch('R','Z')
+        """
+
+        if isinstance(self.data,Lazy_Data):
+            self.data.load(*(keys if keys else self.data.keys()))
+
+        return self
+
+    def evict(self,*keys):
+        """
+        drop lazily read fields from memory - they are read again when next accessed
+
+        notes:
+            if no key supplied then evict all fields which can be reloaded
+            fields which have been replaced or were not lazily read cannot be evicted
+            returns self so calls can be chained
+        usage:
+            my_output.evict('dfn','dfn_s')
+        """
+
+        if not isinstance(self.data,Lazy_Data):
+            print("WARNING: {} cannot evict() - data was not lazily read\n".format(self.ID))
+            return self
+
+        for key in keys:
+            if key not in self.data.loaders:
+                print("WARNING: {} cannot evict() {} - no loader registered\n".format(self.ID,key))
+
+        for value in self.data.evict(*(keys if keys else list(self.data.loaders.keys()))):
+            processing.utils.interpolator_cache.invalidate(value)
+
+        return self
+
     def read_data(self,data_format=None,filename=None,shot=None,run=None,**properties): #bad practice to change overridden method signatures, so retain all method arguments             
         """
         read data to be overloaded in all children classes
@@ -90,6 +258,30 @@ class LOCUST_output:
 
         pass
 
+    def dump_data(self,data_format=None,filename=None,shot=None,run=None,**properties):
+        """
+        dump data to be overloaded in all children classes
+        """
+
+        pass
+
+    def __init_subclass__(cls,**kwargs):
+        """
+        adds LOCUST_IO_cache data_format and read-through caching to read_data and dump_data of all children
+
+        notes:
+            see processing.utils.LOCUST_IO_cache_read_data
+        usage:
+            my_output.dump_data(data_format='LOCUST_IO_cache',filename='some_cache')
+            my_output.read_data(data_format='LOCUST_IO_cache',filename='some_cache')
+        """
+
+        super().__init_subclass__(**kwargs)
+        if not getattr(cls.read_data,'LOCUST_IO_cache',False):
+            cls.read_data=processing.utils.LOCUST_IO_cache_read_data(cls.read_data,support.dir_output_files)
+        if not getattr(cls.dump_data,'LOCUST_IO_cache',False):
+            cls.dump_data=processing.utils.LOCUST_IO_cache_dump_data(cls.dump_data,support.dir_output_files)
+
     def look(self):
         """
         print class information and data
@@ -125,7 +317,9 @@ class LOCUST_output:
 
         if hasattr(self,'data') and self.data:
             for key in self.data:
-                if type(self.data[key])==type({}): #check for dicts since these mess things up
+                if not self.loaded(key): #do not read lazy data just to print it
+                    print("{key} - not loaded".format(key=key))
+                elif type(self.data[key])==type({}): #check for dicts since these mess things up
                     if self.data[key]: #if dict then check if dict is empty
                         print(key+":")
                         for sub_key in self.data[key]: 
@@ -162,6 +356,52 @@ class LOCUST_output:
             if hasattr(target,'properties'): #copy properties field
                 self.properties=target.properties
      
+    def derive(self):
+        """
+        returns lightweight copy of output object which shares data with self
+
+        notes:
+            arrays are read-only views of self's arrays so no data is copied and self can never be changed through the derived object
+            replacing data via [] or set() is always allowed - call materialize() before editing arrays in place
+        usage:
+            my_derived_output=my_output.derive()
+            my_derived_output.materialize('dfn')['dfn'][0]=0. #edit copy of dfn array
+        """
+
+        derived=copy.copy(self)
+        derived.data={}
+        if isinstance(self.data,Lazy_Data): #unloaded fields are read independently by derived object when accessed
+            derived.data=Lazy_Data()
+            derived.data.loaders={key:loader for key,loader in self.data.loaders.items() if not self.data.loaded(key)}
+        for key in [key for key in self.data if self.loaded(key)]:
+            value=self.data[key]
+            if isinstance(value,np.ndarray):
+                value=value.view()
+                value.flags.writeable=False
+            derived.data[key]=value
+        if hasattr(self,'properties'):
+            derived.properties=copy.copy(self.properties)
+
+        return derived
+
+    def materialize(self,*keys):
+        """
+        replaces read-only shared arrays with writeable copies
+
+        notes:
+            if no key supplied then materialize all data
+            returns self so calls can be chained
+        usage:
+            my_derived_output.materialize() to copy all shared arrays
+            my_derived_output.materialize('dfn','dfn_s') to copy specific fields
+        """
+
+        for key in keys if keys else [key for key in self.data if self.loaded(key)]:
+            if isinstance(self.data[key],np.ndarray) and not self.data[key].flags.writeable:
+                self.data[key]=np.array(self.data[key])
+
+        return self
+
     def set(self,**kwargs):
         """
         set input object data 
@@ -191,15 +431,20 @@ class LOCUST_output:
         notes:
             returns true if all data held by target is also held by self (self can have excess)
             verbose option prints summary of compare results
+            fields not yet loaded by either object are not read so cannot be confirmed the same - returns false and warns, prefetch() them first to compare values
         """
 
         data_missing_self=[]
         data_missing_target=[]
         data_different=[]
+        data_not_loaded=[]
 
         for key in target.data: #record fields we do not have that target does
             if not key in self.data:
                 data_missing_self.append(key) 
+
+            elif not self.loaded(key) or (hasattr(target,'loaded') and not target.loaded(key)):
+                data_not_loaded.append(key)
             
             elif self[key].size!=target[key].size: #both contain data but data is different
                 data_different.append(key)
@@ -221,7 +466,11 @@ class LOCUST_output:
                 print("shared different data:")
                 print('\n'.join(str(key) for key in data_different))
 
-        if not data_different and not data_missing_self: #if shared data is the same and self all target data 
+        if data_not_loaded: #always warn since these values were never checked
+            print("WARNING: compare() did not compare shared data which is not loaded (prefetch() first):")
+            print('\n'.join(str(key) for key in data_not_loaded))
+
+        if not data_different and not data_missing_self and not data_not_loaded: #if shared data is the same and self all target data 
             return True #self is same as target
         else:
             return False
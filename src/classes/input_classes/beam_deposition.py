@@ -723,6 +723,7 @@ def dump_beam_depo_LOCUST_full_orbit(output_data,filepath,**properties):
         output_data - dict holding data to dump
         filepath - full path of target file
         shuffle - if True then shuffle particle list 
+        seed - seed for reproducible shuffle
     notes:
         if absorption_fraction and absorption_scaling missing in output_data, assumes 1.0
         if absorption_fraction or absorption_scaling have length>1 it writes first value
@@ -732,7 +733,7 @@ def dump_beam_depo_LOCUST_full_orbit(output_data,filepath,**properties):
 
     if 'shuffle' not in properties: properties['shuffle']=True
     if properties['shuffle']: 
-        R,phi,Z,V_R,V_phi,V_Z=processing.utils.knuth_shuffle(output_data['R'],output_data['phi'],output_data['Z'],output_data['V_R'],output_data['V_phi'],output_data['V_Z'])
+        R,phi,Z,V_R,V_phi,V_Z=processing.utils.shuffle(output_data['R'],output_data['phi'],output_data['Z'],output_data['V_R'],output_data['V_phi'],output_data['V_Z'],seed=properties.get('seed'))
     else:
         R,phi,Z,V_R,V_phi,V_Z=output_data['R'],output_data['phi'],output_data['Z'],output_data['V_R'],output_data['V_phi'],output_data['V_Z']
 
@@ -744,9 +745,8 @@ def dump_beam_depo_LOCUST_full_orbit(output_data,filepath,**properties):
             else:
                 file.write("{}\n".format(processing.utils.fortran_string(1.0,13)))
 
-        for this_particle in range(output_data['R'].size): #iterate through all particles i.e. length of our dictionary's arrays
-            if phi[this_particle]<0: phi[this_particle]+=2.*np.pi 
-            file.write("{r}{phi}{z}{v_r}{V_phi}{v_z}\n".format(r=processing.utils.fortran_string(R[this_particle],14,6),phi=processing.utils.fortran_string(phi[this_particle],14,6),z=processing.utils.fortran_string(Z[this_particle],14,6),v_r=processing.utils.fortran_string(V_R[this_particle],14,6),V_phi=processing.utils.fortran_string(V_phi[this_particle],14,6),v_z=processing.utils.fortran_string(V_Z[this_particle],14,6)))
+        phi=np.where(phi<0,phi+2.*np.pi,phi)
+        file.writelines(processing.utils.fortran_lines([R,phi,Z,V_R,V_phi,V_Z],(14,6))) #write all particles i.e. length of our dictionary's arrays
     
     print("finished writing full orbit beam deposition to LOCUST") 
 
@@ -758,6 +758,7 @@ def dump_beam_depo_LOCUST_full_orbit_weighted(output_data,filepath,**properties)
         output_data - dict holding data to dump
         filepath - full path of target file
         shuffle - if True then shuffle particle list 
+        seed - seed for reproducible shuffle
     notes:
         -DWLIST -DWREAL are corresponding LOCUST flags
         if absorption_fraction and absorption_scaling missing in output_data, assumes 1.0
@@ -767,7 +768,7 @@ def dump_beam_depo_LOCUST_full_orbit_weighted(output_data,filepath,**properties)
 
     if 'shuffle' not in properties: properties['shuffle']=True
     if properties['shuffle']: 
-        R,phi,Z,V_R,V_phi,V_Z,weight=processing.utils.knuth_shuffle(output_data['R'],output_data['phi'],output_data['Z'],output_data['V_R'],output_data['V_phi'],output_data['V_Z'],output_data['weight'])
+        R,phi,Z,V_R,V_phi,V_Z,weight=processing.utils.shuffle(output_data['R'],output_data['phi'],output_data['Z'],output_data['V_R'],output_data['V_phi'],output_data['V_Z'],output_data['weight'],seed=properties.get('seed'))
     else:
         R,phi,Z,V_R,V_phi,V_Z,weight=output_data['R'],output_data['phi'],output_data['Z'],output_data['V_R'],output_data['V_phi'],output_data['V_Z'],output_data['weight']
 
@@ -779,9 +780,8 @@ def dump_beam_depo_LOCUST_full_orbit_weighted(output_data,filepath,**properties)
             else:
                 file.write("{}\n".format(processing.utils.fortran_string(1.0,13)))
  
-        for this_particle in range(output_data['R'].size): #iterate through all particles i.e. length of our dictionary's arrays
-            if phi[this_particle]<0: phi[this_particle]+=2.*np.pi 
-            file.write("{r}{phi}{z}{v_r}{V_phi}{v_z}{weight}\n".format(r=processing.utils.fortran_string(R[this_particle],14,6),phi=processing.utils.fortran_string(phi[this_particle],14,6),z=processing.utils.fortran_string(Z[this_particle],14,6),v_r=processing.utils.fortran_string(V_R[this_particle],14,6),V_phi=processing.utils.fortran_string(V_phi[this_particle],14,6),v_z=processing.utils.fortran_string(V_Z[this_particle],14,6),weight=processing.utils.fortran_string(weight[this_particle],14,6)))
+        phi=np.where(phi<0,phi+2.*np.pi,phi)
+        file.writelines(processing.utils.fortran_lines([R,phi,Z,V_R,V_phi,V_Z,weight],(14,6))) #write all particles i.e. length of our dictionary's arrays
     
     print("finished writing weighted full orbit beam deposition to LOCUST") 
 
@@ -795,6 +795,7 @@ def dump_beam_depo_LOCUST_guiding_centre_weighted(output_data,filepath,equilibri
         output_data - dict holding data to dump
         filepath - full path of target file
         shuffle - if True then shuffle particle list 
+        seed - seed for reproducible shuffle
     notes:
         assumes R,Z,V_parallel are at the guiding centre
         if absorption_fraction and absorption_scaling missing in output_data, assumes 1.0
@@ -806,6 +807,15 @@ def dump_beam_depo_LOCUST_guiding_centre_weighted(output_data,filepath,equilibri
         print("dump_beam_depo_LOCUST_weighted found no V_pitch in output_data - calculating!")
         output_data['V_pitch']=processing.utils.pitch_calc(particle_list=output_data,equilibria=[equilibrium])
 
+    V=np.sqrt(constants.species_charge*output_data['E']*2./constants.species_mass)
+    V_parallel=V*output_data['V_pitch']
+ 
+    if 'shuffle' not in properties: properties['shuffle']=True
+    if properties['shuffle']: 
+        R,phi,Z,V,V_parallel,weight=processing.utils.shuffle(output_data['R'],output_data['phi'],output_data['Z'],V,V_parallel,output_data['weight'],seed=properties.get('seed'))
+    else:
+        R,phi,Z,V,V_parallel,weight=output_data['R'],output_data['phi'],output_data['Z'],V,V_parallel,output_data['weight']
+
     with open(filepath,'w') as file: #open file
  
         for quantity in ['absorption_fraction','absorption_scaling']:
@@ -814,18 +824,8 @@ def dump_beam_depo_LOCUST_guiding_centre_weighted(output_data,filepath,equilibri
             else:
                 file.write("{}\n".format(processing.utils.fortran_string(1.0,13)))
 
-        V=np.sqrt(constants.species_charge*output_data['E']*2./constants.species_mass)
-        V_parallel=V*output_data['V_pitch']
- 
-    if 'shuffle' not in properties: properties['shuffle']=True
-    if properties['shuffle']: 
-        R,phi,Z,V,V_parallel,weight=processing.utils.knuth_shuffle(output_data['R'],output_data['phi'],output_data['Z'],V,V_parallel,output_data['weight'])
-    else:
-        R,phi,Z,V,V_parallel,weight=output_data['R'],output_data['phi'],output_data['Z'],V,V_parallel,output_data['weight']
-
-        for this_particle in range(output_data['R'].size): #iterate through all particles i.e. length of our dictionary's arrays
-            if phi[this_particle]<0: phi[this_particle]+=2.*np.pi
-            file.write("{r}{phi}{z}{V_parallel}{V}{weight}\n".format(r=processing.utils.fortran_string(R[this_particle],14,6),phi=processing.utils.fortran_string(phi[this_particle],14,6),z=processing.utils.fortran_string(Z[this_particle],14,6),V_parallel=processing.utils.fortran_string(V_parallel[this_particle],14,6),V=processing.utils.fortran_string(V[this_particle],14,6),weight=processing.utils.fortran_string(weight[this_particle],14,6)))
+        phi=np.where(phi<0,phi+2.*np.pi,phi)
+        file.writelines(processing.utils.fortran_lines([R,phi,Z,V_parallel,V,weight],(14,6))) #write all particles i.e. length of our dictionary's arrays
     
     print("finished writing weighted guiding centre beam deposition to LOCUST") 
     
@@ -964,34 +964,15 @@ def dump_beam_depo_ASCOT_full_orbit(output_data,filepath,**properties):
             energies_sum=np.sum(output_data['E'])
             weight=np.zeros(len(output_data['E']))+beam_power/energies_sum
 
-        i=0 #counter for particle identifier
-        for phi,R,Z,V_phi,V_R,V_Z,W in zip(output_data['phi'],output_data['R'],output_data['Z'],output_data['V_phi'],output_data['V_R'],output_data['V_Z'],weight): 
-            
-            line=''
-            line+=processing.utils.fortran_string(2,6,0,False) #mass and charge
-            line+=processing.utils.fortran_string(constants.species_mass_amu,14,5)
-            line+=processing.utils.fortran_string(1,6,0,False)
-            line+=processing.utils.fortran_string(1.0,14,5)
-            
-            #line+=processing.utils.fortran_string(pitch,13,5,False)
-            
-            line+=processing.utils.fortran_string(360.0*(phi/(2.*constants.pi)),18,9) #position
-            line+=processing.utils.fortran_string(R,18,9)
-            line+=processing.utils.fortran_string(Z,18,9)
-
-            line+=processing.utils.fortran_string(V_phi,18,9) #velocity
-            line+=processing.utils.fortran_string(V_R,18,9)
-            line+=processing.utils.fortran_string(V_Z,18,9)
-
-            line+=processing.utils.fortran_string(1.0,9,0,False) #origin
-            line+=processing.utils.fortran_string(W,18,9) #weight
-            line+=processing.utils.fortran_string(i,10,0,False) #ID
-            line+=processing.utils.fortran_string(999.0,18,9) #Tmax
-
-            line+="\n"
-            
-            file.write(line)
-            i+=1
+        columns=[2,constants.species_mass_amu,1,1.0] #mass and charge
+        formats=[(6,0,False),(14,5),(6,0,False),(14,5)]
+        #columns.append(pitch);formats.append((13,5,False))
+        columns.extend([360.0*(output_data['phi']/(2.*constants.pi)),output_data['R'],output_data['Z']]) #position
+        columns.extend([output_data['V_phi'],output_data['V_R'],output_data['V_Z']]) #velocity
+        formats.extend([(18,9)]*6)
+        columns.extend([1.0,weight,np.arange(output_data['R'].size),999.0]) #origin, weight, ID, Tmax
+        formats.extend([(9,0,False),(18,9),(10,0,False),(18,9)])
+        file.writelines(processing.utils.fortran_lines(columns,formats))
 
         file.write("#EOF\n")
 
@@ -1070,38 +1051,18 @@ def dump_beam_depo_ASCOT_guiding_centre(output_data,filepath,equilibrium,**prope
             energies_sum=np.sum(output_data['E'])
             weight=np.zeros(len(output_data['E']))+beam_power/energies_sum
 
-        i=0 #counter for particle identifier
-        for E,V_pitch,phi,R,Z,W in zip(output_data['E'],output_data['V_pitch'],output_data['phi'],output_data['R'],output_data['Z'],weight): 
-            
-            line=''
-            line+=processing.utils.fortran_string(2,6,0,False) #mass and charge
-            line+=processing.utils.fortran_string(constants.species_mass_amu,14,5)
-            line+=processing.utils.fortran_string(1,6,0,False)
-            line+=processing.utils.fortran_string(1.0,14,5)
-            
-            line+=processing.utils.fortran_string(E,18,9) #energy
-            line+=processing.utils.fortran_string(V_pitch,13,5,False)
-            
-            line+=processing.utils.fortran_string(360.0*(phi/(2.*constants.pi)),18,9) #position
-            line+=processing.utils.fortran_string(R,18,9)
-            line+=processing.utils.fortran_string(Z,18,9)
-
-            #line+=processing.utils.fortran_string(V_phi,18,9) #velocity
-            #line+=processing.utils.fortran_string(V_R,18,9)
-            #line+=processing.utils.fortran_string(V_Z,18,9)
-
-            line+=processing.utils.fortran_string(1.0,9,0,False) #origin
-            line+=processing.utils.fortran_string(W,18,9) #weight
-            line+=processing.utils.fortran_string(i,10,0,False) #ID
-            line+=processing.utils.fortran_string(999.0,18,9) #Tmax
-            
-            line+=processing.utils.fortran_string(float(B_field_tor_interpolator(R,Z)),18,9) #B field
-            line+=processing.utils.fortran_string(float(B_field_R_interpolator(R,Z)),18,9) #must interpolate ad hoc to save memory
-            line+=processing.utils.fortran_string(float(B_field_Z_interpolator(R,Z)),18,9)
-            line+="\n"
-            
-            file.write(line)
-            i+=1
+        formats=[(6,0,False),(14,5),(6,0,False),(14,5),(18,9),(13,5,False)]+[(18,9)]*3+[(9,0,False),(18,9),(10,0,False)]+[(18,9)]*4
+        chunk_size=100000
+        for start in range(0,output_data['R'].size,chunk_size): #must interpolate B field ad hoc in chunks to save memory
+            chunk=slice(start,start+chunk_size)
+            R,Z=output_data['R'][chunk],output_data['Z'][chunk]
+            columns=[2,constants.species_mass_amu,1,1.0] #mass and charge
+            columns.extend([output_data['E'][chunk],output_data['V_pitch'][chunk]]) #energy
+            columns.extend([360.0*(output_data['phi'][chunk]/(2.*constants.pi)),R,Z]) #position
+            #columns.extend([output_data['V_phi'][chunk],output_data['V_R'][chunk],output_data['V_Z'][chunk]]) #velocity
+            columns.extend([1.0,weight[chunk],np.arange(start,start+R.size),999.0]) #origin, weight, ID, Tmax
+            columns.extend([B_field_tor_interpolator(R,Z,grid=False),B_field_R_interpolator(R,Z,grid=False),B_field_Z_interpolator(R,Z,grid=False)]) #B field
+            file.writelines(processing.utils.fortran_lines(columns,formats,chunk_size=chunk_size))
 
         file.write("#EOF\n")
 
@@ -1392,11 +1353,11 @@ class Beam_Deposition(classes.base_input.LOCUST_input):
         if ndim==1: #plot 1D histograms
             if weight:
                 try:
-                    self_binned,self_binned_edges=np.histogram(self[axes[0]],bins=number_bins,weights=self['weight'])
+                    [(self_binned,(self_binned_edges,))]=processing.utils.histogram_markers([self[axes[0]]],bins=number_bins,weights=self['weight'],processes=settings.histogram_processes)
                 except:
                     print("ERROR: beam_deposition.plot could not find weight\n")
             else:
-                self_binned,self_binned_edges=np.histogram(self[axes[0]],bins=number_bins)
+                [(self_binned,(self_binned_edges,))]=processing.utils.histogram_markers([self[axes[0]]],bins=number_bins,processes=settings.histogram_processes)
             self_binned_centres=(self_binned_edges[:-1]+self_binned_edges[1:])*0.5
             ax.plot(self_binned_centres,self_binned,color=colmap(colmap_val),linestyle=line_style,label=label)
             ax.set_xlabel(axes[0])
@@ -1409,16 +1370,8 @@ class Beam_Deposition(classes.base_input.LOCUST_input):
                 ax.set_aspect('auto')
 
             if style=='histogram':
-                if grid is not False: #bin according to pre-defined grid
-                    if weight:
-                        self_binned,self_binned_x,self_binned_y=np.histogram2d(self[axes[0]],self[axes[1]],bins=[grid[axes[0]],grid[axes[1]]],weights=self['weight'])
-                    else:
-                        self_binned,self_binned_x,self_binned_y=np.histogram2d(self[axes[0]],self[axes[1]],bins=[grid[axes[0]],grid[axes[1]]])
-                else:
-                    if weight:
-                        self_binned,self_binned_x,self_binned_y=np.histogram2d(self[axes[0]],self[axes[1]],bins=number_bins,weights=self['weight'])
-                    else:
-                        self_binned,self_binned_x,self_binned_y=np.histogram2d(self[axes[0]],self[axes[1]],bins=number_bins)
+                #bin according to pre-defined grid if supplied - result is cached so replotting is instant
+                [(self_binned,(self_binned_x,self_binned_y))]=processing.utils.histogram_markers([self[axes[0]],self[axes[1]]],bins=[grid[axes[0]],grid[axes[1]]] if grid is not False else number_bins,weights=self['weight'] if weight else None,processes=settings.histogram_processes)
                 #self_binned_x and self_binned_x are first edges then converted to centres
                 self_binned_x=(self_binned_x[:-1]+self_binned_x[1:])*0.5
                 self_binned_y=(self_binned_y[:-1]+self_binned_y[1:])*0.5
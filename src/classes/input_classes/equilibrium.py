@@ -75,142 +75,38 @@ def read_equilibrium_GEQDSK(filepath,**properties):
  
     notes:
         originally written by Ben Dudson and edited by Nick Walkden
+        file contents are parsed by processing.utils.read_GEQDSK
     """
 
-    input_data = {}
-
-    def file_numbers(ingf):#instance of generators are objects hence can use .next() method on them
-        """
-        generator to read numbers in a file
-     
-        notes:
-            originally written by Ben Dudson
-     
-            calling get_next() on a generator produced with this function will permanently advance the iterator in this generator
-            when generators reach the end, that's permanently it!
-        """
-        toklist = []
-        while True: #runs forever until break statement (until what is read is not a line) below will cause a return - which permanently stops a generator
-            line = ingf.readline() #read in line from INGF
-            if not line: break #break if readline() doesnt return a line i.e. end of file
-            line = line.replace("NaN","-0.00000e0") #replaces NaNs with 0s
-            pattern = r'[+-]?\d*[\.]?\d+(?:[Ee][+-]?\d+)?' #regular expression to find numbers
-            toklist = re.findall(pattern,line) #toklist now holds all the numbers in a file line (is essentially a single file line)
-            for tok in toklist: #yield every number in that one line individually
-                yield tok #so in terms of iteration, using get_next() will cause another line to be read
-
     print("reading equilibrium from GEQDSK")
-    
-    with open(filepath,'r') as file: #open file
- 
-        line = file.readline() #first line should be case, id number and dimensions
-        if not line:
-            raise IOError("ERROR: read_equilibrium_GEQDSK() cannot read from "+str(filepath))
-         
-        #extract case, id number and dimensions  
-        conts = line.split()    #split by white space (no argument in .split())
-        input_data['nZ_1D'] = np.asarray(int(conts[-1])) #same as nyefit or height dimension
-        input_data['nR_1D'] = np.asarray(int(conts[-2])) #same as nxefit or width dimension
-        input_data['idum'] = np.asarray(int(conts[-3]))
-        #input_data['time'] = np.asarray(int(consts[-4])) #time slice time (in ms)
-        #input_data['EFITshot'] = np.asarray(int(consts[-5])) #shot number
-
-        flags = {} #read the case in (basically just ID data)
-        flags['case'] = conts[0:-4] 
-     
-        #now use generator to read numbers from remaining lines in file
-        token = file_numbers(file) #token now holds all lines in the file, containing all values. each processing.utils.get_next() call will grab the next number in a line (since processing.utils.get_next() returns the next value in the yield loop? check this plz)
-         
-        float_keys = [
-        'rdim','zdim','rcentr','rleft','zmid',
-        'rmaxis','zmaxis','simag','sibry','bcentr',
-        'current','simag','xdum','rmaxis','xdum',
-        'zmaxis','xdum','sibry','xdum','xdum']
-     
-        #read in all 0D floats
-        for key in float_keys:                              
-            input_data[key] = np.asarray(float(processing.utils.get_next(token))) #processing.utils.get_next(token) always yields just a single value, convert this to numpy array
-     
-        def read_1d(n): 
-            """
-            """
-            input_data = np.zeros(n) #initialise blank lists
-            for i in np.arange(n): #instead of using linspace or something makes a temporary numpy array of dimension n to iterate through
-                input_data[i] = float(processing.utils.get_next(token))
-            return input_data
-     
-        def read_2d(nx,ny):
-            """
-            notes:
-                edited this function as it was not consistent with GEQDSK storage format
-            """
-            input_data = np.zeros((nx,ny))
-            for j in np.arange(ny): #same technique here, iterate through one dimension and call read_1d along the other dimension
-                input_data[:,j] = read_1d(nx)
-            return input_data
-
-        #read in the arrays
-        input_data['fpol'] = read_1d(input_data['nR_1D']) #remember input_data['nR_1D'] holds width, input_data['nZ_1D'] holds height
-        input_data['pres'] = read_1d(input_data['nR_1D'])
-        input_data['ffprime'] = read_1d(input_data['nR_1D'])
-        input_data['pprime'] = read_1d(input_data['nR_1D'])
-        input_data['psirz'] = read_2d(input_data['nR_1D'],input_data['nZ_1D'])
-        input_data['qpsi'] = read_1d(input_data['nR_1D'])
-     
-        #now deal with boundaries
-        input_data['lcfs_n'] = np.array(int(processing.utils.get_next(token)))
-        input_data['limitr'] = np.array(int(processing.utils.get_next(token)))
-     
-        def read_bndy(nb,nl): #number of boundaries and limiters
-            if nb > 0: #read in boundaries
-                rb = np.zeros(nb)
-                zb = np.zeros(nb)
-                for i in np.arange(nb):
-                    rb[i] = float(processing.utils.get_next(token)) #read in R,Z pairs
-                    zb[i] = float(processing.utils.get_next(token))
-            else:
-                rb = np.array(0)
-                zb = np.array(0)
-         
-            if nl > 0: #read in limiters
-                rl = np.zeros(nl)
-                zl = np.zeros(nl)
-                for i in np.arange(nl):
-                    rl[i] = float(processing.utils.get_next(token))
-                    zl[i] = float(processing.utils.get_next(token))
-            else:
-                rl = np.array(0)
-                zl = np.array(0)
-     
-            return rb,zb,rl,zl
-     
-        input_data['lcfs_r'],input_data['lcfs_z'],input_data['rlim'],input_data['zlim'] = read_bndy(input_data['lcfs_n'],input_data['limitr'])
-
-        GEQDSKFIX_factor=1.
-        if 'GEQDSKFIX1' in properties and properties['GEQDSKFIX1'] is True: #apply LOCUST flag transformations
-            input_data['psirz']*=-1.
-            input_data['sibry']*=-1.
-            input_data['simag']*=-1.
-            input_data['current']*=-1. #not done in LOCUST
-            GEQDSKFIX_factor*=-1.
-        if 'GEQDSKFIX2' in properties and properties['GEQDSKFIX2'] is True: 
-            input_data['fpol']*=-1.
-            input_data['bcentr']*=-1. #not done in LOCUST
-        PSI_sclh=1./(input_data['sibry']-input_data['simag'])
-        IPDIRh=-1. if PSI_sclh > 0. else 1. 
-        if 'BPFLIP' in properties and properties['BPFLIP'] is True:
-            IPDIRh*=-1.
-        ITDIRh=-1. if input_data['fpol'][0]<0. else 1.
-        if 'BTFLIP' in properties and properties['BTFLIP'] is True:
-            ITDIRh*=-1.
-
-        #additional data
-        input_data['R_1D']=np.linspace(input_data['rleft'],input_data['rleft']+input_data['rdim'],num=input_data['nR_1D'])     
-        input_data['Z_1D']=np.linspace(input_data['zmid']-0.5*input_data['zdim'],input_data['zmid']+0.5*input_data['zdim'],num=input_data['nZ_1D']) 
-        input_data['flux_pol']=np.linspace(input_data['simag'],input_data['sibry'],input_data['ffprime'].size) #all 1D profiles are defined against a flux grid, so use any 1D profile's length
-        input_data['flux_tor']=processing.process_input.QTP_calc(Q=input_data['qpsi'],P=input_data['flux_pol'])*GEQDSKFIX_factor #if we flipped poloidal flux this will also flip toroidal flux since we assume Q sign always +ve by convention
-
-        print("finished reading equilibrium from GEQDSK")
+
+    input_data=processing.utils.read_GEQDSK(filepath) #parse whole file in bulk
+
+    GEQDSKFIX_factor=1.
+    if 'GEQDSKFIX1' in properties and properties['GEQDSKFIX1'] is True: #apply LOCUST flag transformations
+        input_data['psirz']*=-1.
+        input_data['sibry']*=-1.
+        input_data['simag']*=-1.
+        input_data['current']*=-1. #not done in LOCUST
+        GEQDSKFIX_factor*=-1.
+    if 'GEQDSKFIX2' in properties and properties['GEQDSKFIX2'] is True: 
+        input_data['fpol']*=-1.
+        input_data['bcentr']*=-1. #not done in LOCUST
+    PSI_sclh=1./(input_data['sibry']-input_data['simag'])
+    IPDIRh=-1. if PSI_sclh > 0. else 1. 
+    if 'BPFLIP' in properties and properties['BPFLIP'] is True:
+        IPDIRh*=-1.
+    ITDIRh=-1. if input_data['fpol'][0]<0. else 1.
+    if 'BTFLIP' in properties and properties['BTFLIP'] is True:
+        ITDIRh*=-1.
+
+    #additional data
+    input_data['R_1D']=np.linspace(input_data['rleft'],input_data['rleft']+input_data['rdim'],num=input_data['nR_1D'])     
+    input_data['Z_1D']=np.linspace(input_data['zmid']-0.5*input_data['zdim'],input_data['zmid']+0.5*input_data['zdim'],num=input_data['nZ_1D']) 
+    input_data['flux_pol']=np.linspace(input_data['simag'],input_data['sibry'],input_data['ffprime'].size) #all 1D profiles are defined against a flux grid, so use any 1D profile's length
+    input_data['flux_tor']=processing.process_input.QTP_calc(Q=input_data['qpsi'],P=input_data['flux_pol'])*GEQDSKFIX_factor #if we flipped poloidal flux this will also flip toroidal flux since we assume Q sign always +ve by convention
+
+    print("finished reading equilibrium from GEQDSK")
 
     return input_data
 
@@ -393,49 +289,26 @@ def dump_equilibrium_GEQDSK(output_data,filepath,**properties):
 
     try:
         import time
-        import itertools
     except:
         raise ImportError("ERROR: dump_equilibrium_GEQDSK could not import necessary modules!\nreturning\n")
         return
 
     print("writing equilibrium to GEQDSK")
 
-    def write_number(file,number,counter):
-        
-        if number==0:
-            separator = " "
-            number = np.abs(number)
-        elif number < 0:
-            separator = "-"
-            number = np.abs(number)
-        else:
-            separator = " "
-        if processing.utils.get_next(counter) == 4:
-            last = "\n"
-        else:
-            last = ""
-         
-        string = '{:.9e}'.format(float(number))
-        #mant,exp = string.split('E')
-        file.write(separator+string+last)
- 
-    def write_1d(file,array,counter):
-        for num in array:
-            write_number(file,num,counter)
- 
-    def write_2d(file,array,counter):
-        ny = array.shape[1]
-        for j in np.arange(ny):
-            write_1d(file,array[:,j],counter)
-     
-    def write_bndry(file,R,Z,counter):
-        for i in np.arange(len(list(R))):
-            write_number(file,R[i],counter)
-            write_number(file,Z[i],counter)
-    
+    def write_block(file,values):
+        """
+        writes values 5 per line in one call, ending with a newline
+
+        notes:
+            format string for whole block is applied at once - negative numbers run together, e.g. ' 1.000000000e+00-2.000000000e+00'
+        """
+
+        values=np.asarray(values,dtype=float).ravel()+0. #+0. removes negative zeros
+        number_lines,remainder=divmod(values.size,5)
+        fmt=('% .9e'*5+'\n')*number_lines+'% .9e'*remainder+('\n' if remainder else '')
+        file.write(fmt%tuple(values.tolist()))
+
     with open(filepath,'w') as file:
-        
-        cnt = itertools.cycle([0,1,2,3,4]) #initialise counter
 
         EFIT_shot=19113 #just 'make up' a shot number and time (in ms) for now
         EFIT_time=23
@@ -448,38 +321,20 @@ def dump_equilibrium_GEQDSK(output_data,filepath,**properties):
         'rmaxis','zmaxis','simag','sibry','bcentr',
         'current','simag','xdum','rmaxis','xdum',
         'zmaxis','xdum','sibry','xdum','xdum']
-        for key in float_keys:
-            write_number(file,output_data[key],cnt)
+        write_block(file,[output_data[key] for key in float_keys])
  
-        write_1d(file,output_data['fpol'],cnt)
-        if processing.utils.get_next(cnt) != 0: #if last character was not newline, write newline
-            file.write('\n') 
-        cnt = itertools.cycle([0,1,2,3,4]) #reinitialise counter
-        write_1d(file,output_data['pres'],cnt)
-        if processing.utils.get_next(cnt) != 0: #if last character was not newline, write newline
-            file.write('\n') 
-        cnt = itertools.cycle([0,1,2,3,4]) #reinitialise counter
-        write_1d(file,output_data['ffprime'],cnt)
-        if processing.utils.get_next(cnt) != 0: #if last character was not newline, write newline
-            file.write('\n') 
-        cnt = itertools.cycle([0,1,2,3,4]) #reinitialise counter
-        write_1d(file,output_data['pprime'],cnt)
-        if processing.utils.get_next(cnt) != 0: #if last character was not newline, write newline
-            file.write('\n') 
-        cnt = itertools.cycle([0,1,2,3,4]) #reinitialise counter
-        write_2d(file,output_data['psirz'],cnt)    
-        if processing.utils.get_next(cnt) != 0: #if last character was not newline, write newline
-            file.write('\n') 
-        cnt = itertools.cycle([0,1,2,3,4]) #reinitialise counter
-        write_1d(file,output_data['qpsi'],cnt) 
-        if processing.utils.get_next(cnt) == 0: #check if \n was written last
-            file.write(processing.utils.fortran_string(len(output_data['lcfs_r']),5)+processing.utils.fortran_string(len(output_data['rlim']),5)+'\n') #write out number of limiter/plasma boundary points
-        else:
-            file.write('\n'+processing.utils.fortran_string(len(output_data['lcfs_r']),5)+processing.utils.fortran_string(len(output_data['rlim']),5)+'\n') #write out number of limiter/plasma boundary points
-        cnt = itertools.cycle([0,1,2,3,4]) #reinitialise counter
-        write_bndry(file,output_data['lcfs_r'],output_data['lcfs_z'],cnt)
-        write_bndry(file,output_data['rlim'],output_data['zlim'],cnt)
-        file.write("\n") #file has a newline here
+        write_block(file,output_data['fpol']) #each section starts on a new line
+        write_block(file,output_data['pres'])
+        write_block(file,output_data['ffprime'])
+        write_block(file,output_data['pprime'])
+        write_block(file,np.asarray(output_data['psirz']).ravel(order='F')) #written psirz[:,0],psirz[:,1]...
+        write_block(file,output_data['qpsi']) 
+        file.write(processing.utils.fortran_string(len(output_data['lcfs_r']),5)+processing.utils.fortran_string(len(output_data['rlim']),5)+'\n') #write out number of limiter/plasma boundary points
+
+        boundary=np.concatenate((np.column_stack((output_data['lcfs_r'],output_data['lcfs_z'])).ravel(),np.column_stack((output_data['rlim'],output_data['zlim'])).ravel())) #plasma boundary then limiter R,Z pairs
+        write_block(file,boundary)
+        if boundary.size%5==0: #file has a blank line here
+            file.write("\n")
 
         print("finished writing equilibrium to GEQDSK")
  
@@ -1089,14 +944,7 @@ class Equilibrium(classes.base_input.LOCUST_input):
 
         print("fpolrz_calc - calculating 2D flux function")
 
-        fpolrz=processing.utils.flux_func_to_RZ(self['flux_pol'],self['fpol'],self)
-        Z,R=np.meshgrid(self['Z_1D'],self['R_1D'])
-        within_LCFS=processing.utils.within_LCFS(R.flatten(),Z.flatten(),self).reshape(self['nR_1D'],self['nZ_1D'])
-
-        for w in np.arange(self['nR_1D']): #loop over 2D grid and any points outside LCFS set to vacuum field
-            for h in np.arange(self['nZ_1D']):
-                if not within_LCFS[w,h]:
-                    fpolrz[w,h]=self['bcentr']*self['rcentr']
+        fpolrz=processing.utils.flux_func_to_RZ(self['flux_pol'],self['fpol'],self,fill_value=self['bcentr']*self['rcentr']) #any points outside LCFS set to vacuum field
 
         print("fpolrz_calc - finished calculating 2D flux function")
 
@@ -1162,41 +1010,49 @@ class Equilibrium(classes.base_input.LOCUST_input):
 
         return rmaxis,zmaxis,simag
 
-    def evaluate(self,R,Z):
+    def evaluate(self,R,Z,magnitude=False,unit=False,chunk_size=1000000):
         """
         returns the three components of magnetic field at a point in the plasma 
         
         args:
             R - array of R coordinates to calculate magnetic field components at 
             Z - array of Z coordinates to calculate magnetic field components at
+            magnitude - toggle to also return |B|
+            unit - toggle to return components of unit vector B/|B| instead of B
+            chunk_size - evaluate this many points at a time to bound memory
         notes:
-
+            interpolators are generated once and cached in processing.utils.interpolator_cache, they are regenerated if B_field arrays are replaced
+            all points in a chunk are evaluated in one call per component
         usage:
             B_R,B_tor,B_Z=my_equilibrium.evaluate(R=[1,2,3],Z=[1,2,3])
+            B_R_hat,B_tor_hat,B_Z_hat,B=my_equilibrium.evaluate(R=[1,2,3],Z=[1,2,3],magnitude=True,unit=True)
         """
         
         if not np.all([component in self.data.keys() for component in ['B_field_R','B_field_tor','B_field_Z']]): #calculate B field if missing
             print("evaluate found no B_field in equilibrium - calculating!")
             self.B_calc()
 
-        print("evaluate generating B_field interpolators")
-        B_field_R_interpolator=processing.utils.interpolate_2D(self['R_1D'],self['Z_1D'],self['B_field_R']) #construct interpolators here
-        B_field_tor_interpolator=processing.utils.interpolate_2D(self['R_1D'],self['Z_1D'],self['B_field_tor'])
-        B_field_Z_interpolator=processing.utils.interpolate_2D(self['R_1D'],self['Z_1D'],self['B_field_Z'])
-        print("evaluate finished generating B_field interpolators")
-
-        B_R=[]
-        B_tor=[]
-        B_Z=[]  
-
-        for R_point,Z_point in zip(R,Z):
-            B_R.append(float(B_field_R_interpolator(R_point,Z_point)))
-            B_tor.append(float(B_field_tor_interpolator(R_point,Z_point)))
-            B_Z.append(float(B_field_Z_interpolator(R_point,Z_point)))
-        
-        B_R=np.asarray(B_R)
-        B_tor=np.asarray(B_tor)
-        B_Z=np.asarray(B_Z)
+        interpolators=self.get_interpolators('B_field_R','B_field_tor','B_field_Z')
+
+        R=np.asarray(R,dtype=float).ravel()
+        Z=np.asarray(Z,dtype=float).ravel()
+        B_R=np.empty(R.size)
+        B_tor=np.empty(R.size)
+        B_Z=np.empty(R.size)
+
+        for start in range(0,R.size,int(chunk_size)):
+            chunk=slice(start,start+int(chunk_size))
+            for B_component,interpolator in zip([B_R,B_tor,B_Z],interpolators):
+                B_component[chunk]=interpolator.ev(R[chunk],Z[chunk])
+
+        if magnitude or unit:
+            B=np.sqrt(B_R**2+B_tor**2+B_Z**2)
+            if unit:
+                B_R/=B
+                B_tor/=B
+                B_Z/=B
+            if magnitude:
+                return B_R,B_tor,B_Z,B
 
         return B_R,B_tor,B_Z
 
@@ -472,8 +472,7 @@ def dump_number_density_LOCUST(output_data,filepath,**properties):
         normalised_flux,output_n=processing.utils.sort_arrays(output_data['flux_pol_norm'],output_data['n']) #check order
  
         file.write("{}\n".format(processing.utils.fortran_string(output_data['flux_pol_norm'].size,12))) #re-insert line containing length
-        for point in range(normalised_flux.size): #iterate through all points i.e. length of our dictionary's arrays
-            file.write("{flux_pol_norm}{n}\n".format(flux_pol_norm=processing.utils.fortran_string(normalised_flux[point],16,8),n=processing.utils.fortran_string(output_n[point],16,8)))
+        file.writelines(processing.utils.fortran_lines([normalised_flux,output_n],(16,8))) #write all points i.e. length of our dictionary's arrays
  
     print("finished writing number density to LOCUST")
 
@@ -574,8 +573,7 @@ def dump_number_density_MARSF(output_data,filepath,**properties):
  
         file.write("{length} {some_number}\n".format(length=int(flux_pol_norm_sqrt.size),some_number=1)) #re-insert line containing length
         
-        for point in range(flux_pol_norm_sqrt.size): #iterate through all points i.e. length of our dictionary's arrays
-            file.write("{flux_pol_norm_sqrt} {n}\n".format(flux_pol_norm_sqrt=processing.utils.fortran_string(flux_pol_norm_sqrt[point],24,18),n=processing.utils.fortran_string(output_n[point],24,18)))
+        file.writelines(processing.utils.fortran_lines([flux_pol_norm_sqrt,output_n],[(24,18),(25,18)])) #write all points i.e. length of our dictionary's arrays - extra character width for separating space
 
     print("finished writing number density to MARSF mogui")
 
@@ -68,73 +68,54 @@ def read_perturbation_LOCUST(filepath,**properties):
     reads perturbation stored in LOCUST format
 
     notes:
-        assumes R is slower-varying dimension in file when inferring dimensions
+        data lines are those holding 8 numbers - header lines are skipped
+        file is read 16MB of whole lines at a time and each chunk converted in bulk by processing.utils.numeric_rows
+        grid dimensions are inferred from the first change in the slower-varying dimension
     """
 
     print("reading LOCUST perturbation")
 
-    with open(filepath,'r') as file:
-
-        #initialise data
-        input_data={}
-        input_data['R_2D']=[]
-        input_data['Z_2D']=[]
-        input_data['dB_field_R_real']=[]
-        input_data['dB_field_R_imag']=[]
-        input_data['dB_field_Z_real']=[]
-        input_data['dB_field_Z_imag']=[]
-        input_data['dB_field_tor_real']=[]
-        input_data['dB_field_tor_imag']=[]
-
-        #read lazily
-        for line in file:
-            split_line=line.split()
-            if len(split_line)==8 and not any(letter in line for letter in support.alphabet):
-                input_data['R_2D'].append(float(split_line[0]))
-                input_data['Z_2D'].append(float(split_line[1]))
-                input_data['dB_field_R_real'].append(float(split_line[2]))
-                input_data['dB_field_R_imag'].append(float(split_line[3]))
-                input_data['dB_field_Z_real'].append(float(split_line[4]))
-                input_data['dB_field_Z_imag'].append(float(split_line[5]))
-                input_data['dB_field_tor_real'].append(float(split_line[6]))
-                input_data['dB_field_tor_imag'].append(float(split_line[7]))
+    quantities=['R_2D','Z_2D','dB_field_R_real','dB_field_R_imag','dB_field_Z_real','dB_field_Z_imag','dB_field_tor_real','dB_field_tor_imag']
+    chunk_bytes=2**24
+
+    with open(filepath,'rb') as file:
+
+        blocks=[]
+        tail=b''
+        while True:
+            chunk=file.read(chunk_bytes)
+            if chunk:
+                chunk=tail+chunk
+                split=chunk.rfind(b'\n')+1 #only convert whole lines
+                chunk,tail=chunk[:split],chunk[split:]
+            elif tail: #last line may not end in newline
+                chunk,tail=tail,b''
+            else:
+                break
+            blocks.append(processing.utils.numeric_rows(chunk,len(quantities)))
 
-        input_data['R_2D']=np.asarray(input_data['R_2D'])
-        input_data['Z_2D']=np.asarray(input_data['Z_2D'])
-        input_data['dB_field_R_real']=np.asarray(input_data['dB_field_R_real'])
-        input_data['dB_field_R_imag']=np.asarray(input_data['dB_field_R_imag'])
-        input_data['dB_field_Z_real']=np.asarray(input_data['dB_field_Z_real'])
-        input_data['dB_field_Z_imag']=np.asarray(input_data['dB_field_Z_imag'])
-        input_data['dB_field_tor_real']=np.asarray(input_data['dB_field_tor_real'])
-        input_data['dB_field_tor_imag']=np.asarray(input_data['dB_field_tor_imag'])
-  
-        #infer the grid dimensions and axes
-        if input_data['Z_2D'][0]==input_data['Z_2D'][1]: #Z is slowly-varying
-            R_dim=int(np.where(input_data['Z_2D']==input_data['Z_2D'][0])[0].size)
-            Z_dim=int(np.where(input_data['R_2D']==input_data['R_2D'][0])[0].size)
-            input_data['R_2D']=input_data['R_2D'].reshape(Z_dim,R_dim).T
-            input_data['Z_2D']=input_data['Z_2D'].reshape(Z_dim,R_dim).T
-            input_data['R_1D']=input_data['R_2D'][:,0]
-            input_data['Z_1D']=input_data['Z_2D'][0,:]
-            input_data['dB_field_R_real']=input_data['dB_field_R_real'].reshape(Z_dim,R_dim).T
-            input_data['dB_field_R_imag']=input_data['dB_field_R_imag'].reshape(Z_dim,R_dim).T
-            input_data['dB_field_Z_real']=input_data['dB_field_Z_real'].reshape(Z_dim,R_dim).T
-            input_data['dB_field_Z_imag']=input_data['dB_field_Z_imag'].reshape(Z_dim,R_dim).T
-            input_data['dB_field_tor_real']=input_data['dB_field_tor_real'].reshape(Z_dim,R_dim).T
-            input_data['dB_field_tor_imag']=input_data['dB_field_tor_imag'].reshape(Z_dim,R_dim).T
-        else: #R is slowly-varying
-            R_dim=int(np.where(input_data['Z_2D']==input_data['Z_2D'][0])[0].size)
-            Z_dim=int(np.where(input_data['R_2D']==input_data['R_2D'][0])[0].size)
-            input_data['R_2D']=input_data['R_2D'].reshape(R_dim,Z_dim)
-            input_data['Z_2D']=input_data['Z_2D'].reshape(R_dim,Z_dim)
-            input_data['R_1D']=input_data['R_2D'][:,0]
-            input_data['Z_1D']=input_data['Z_2D'][0,:]
-            input_data['dB_field_R_real']=input_data['dB_field_R_real'].reshape(R_dim,Z_dim)
-            input_data['dB_field_R_imag']=input_data['dB_field_R_imag'].reshape(R_dim,Z_dim)
-            input_data['dB_field_Z_real']=input_data['dB_field_Z_real'].reshape(R_dim,Z_dim)
-            input_data['dB_field_Z_imag']=input_data['dB_field_Z_imag'].reshape(R_dim,Z_dim)
-            input_data['dB_field_tor_real']=input_data['dB_field_tor_real'].reshape(R_dim,Z_dim)
-            input_data['dB_field_tor_imag']=input_data['dB_field_tor_imag'].reshape(R_dim,Z_dim)
+    columns=np.ascontiguousarray(np.concatenate(blocks).T) #each quantity contiguous
+    input_data={}
+    for quantity,column in zip(quantities,columns):
+        input_data[quantity]=column
+
+    def first_change(values):
+        changes=np.flatnonzero(values!=values[0])
+        return int(changes[0]) if changes.size else values.size
+
+    #infer the grid dimensions and axes
+    if input_data['Z_2D'][0]==input_data['Z_2D'][1]: #Z is slowly-varying
+        R_dim=first_change(input_data['Z_2D'])
+        Z_dim=input_data['Z_2D'].size//R_dim
+        for quantity in quantities:
+            input_data[quantity]=input_data[quantity].reshape(Z_dim,R_dim).T
+    else: #R is slowly-varying
+        Z_dim=first_change(input_data['R_2D'])
+        R_dim=input_data['R_2D'].size//Z_dim
+        for quantity in quantities:
+            input_data[quantity]=input_data[quantity].reshape(R_dim,Z_dim)
+    input_data['R_1D']=input_data['R_2D'][:,0]
+    input_data['Z_1D']=input_data['Z_2D'][0,:]
 
     print("finished reading LOCUST perturbation")
     
@@ -389,7 +370,7 @@ def read_perturbation_MARSF(filepath,**properties):
     
     return input_data
 
-def read_perturbation_MARSF_bplas(filepath=pathlib.Path(''),response=True,ideal=False,phase=0,bcentr=1.75660107,rmaxis=1.70210874,nR_1D=400,nZ_1D=600):
+def read_perturbation_MARSF_bplas(filepath=pathlib.Path(''),response=True,ideal=False,phase=0,bcentr=1.75660107,rmaxis=1.70210874,nR_1D=400,nZ_1D=600,cache=True,**properties):
     """
     read perturbation bplas files produced by MARSF for individual harmonics and coil sets 
     
@@ -402,6 +383,7 @@ def read_perturbation_MARSF_bplas(filepath=pathlib.Path(''),response=True,ideal=
        rmaxis - R at magnetic axis (O-point)
        nR_1D - number of points in R
        nZ_1D - number of points in Z
+       cache - toggle whether to cache geometry and its mapping onto the R,Z grid in LOCUST_IO/data/cache_files/MARSF_bplas/
     notes:
        adapted from David Ryan's scripts david.ryan@ukaea.uk
        response overrides ideal toggle setting
@@ -413,222 +395,118 @@ def read_perturbation_MARSF_bplas(filepath=pathlib.Path(''),response=True,ideal=
           bplas_vac_lower/bplas_ideal_resp_lower/bplas_resist_resp_lower
        e.g. of file name from MARS-F for individual harmonic=bplas_resist_resp_lower
        reading this way allows one to rotate coil sets with respect to each other
+       geometry, Jacobian and triangulation onto the R,Z grid only depend on rmzm_geom, rmaxis and grid size - cache is keyed by checksum of rmzm_geom so coil rows, harmonics and phase scans sharing a geometry reuse it
+       upper and lower rows are interpolated onto the R,Z grid separately then combined, since linear interpolation commutes with the phase shift
+    usage:
+       phases=np.linspace(0,2.*np.pi,10)
+       perturbations=[Perturbation(ID='phase={}'.format(phase),data_format='MARSF_bplas',filename='some_MARSF_run',phase=phase) for phase in phases] #geometry calculated for first phase only
     """
 
     print("reading MARSF_bplas perturbation")
 
-    class rzcoords():
- 
-        def __init__(self, path, nchi):
-            rmzm=scipy.loadtxt(path)
-            Nm0=int(rmzm[0,0]) #Num. poloidal harmonics for equilibrium quantities (not necessarily same as for perturbation quantities, but should be).
-            Ns_plas=int(rmzm[0,1]) #Num. radial points in plasma
-            Ns_vac=int(rmzm[0,2]) #Num. radial points in vacuum
-            Ns=Ns_plas+Ns_vac
-            R0EXP=rmzm[0,3]
-            B0EXP=rmzm[1,3]
-            s=rmzm[1:Ns+1, 0]
-            RM=rmzm[Ns+1:,0]+1j*rmzm[Ns+1:,1]
-            ZM=rmzm[Ns+1:,2]+1j*rmzm[Ns+1:,3]
-            RM=RM.reshape((Nm0, Ns))
-            RM=scipy.transpose(RM)
-            ZM=ZM.reshape((Nm0, Ns))
-            ZM=scipy.transpose(ZM)
-            RM[:,1:]=2*RM[:,1:]
-            ZM[:,1:]=2*ZM[:,1:]
-            
-            m=scipy.arange(0,Nm0,1)
-            chi=scipy.linspace(-scipy.pi, scipy.pi,nchi)
-            expmchi=scipy.exp(scipy.tensordot(m,chi,0)*1j)
-            R=scipy.dot(RM[:,:Nm0],expmchi)
-            Z=scipy.dot(ZM[:,:Nm0],expmchi)
-            
-            self.R=scipy.array(R.real) #R coordinates
-            self.Z=scipy.array(Z.real) #Z coordinates
-            self.Nchi=nchi
-            self.Nm0=Nm0
-            self.Ns_plas=Ns_plas       #number is s points in plasma
-            self.Ns_vac=Ns_vac         #number of s points in vacuum
-            self.Ns=Ns                 #total number of s points
-            self.R0EXP=R0EXP           #normalisation length
-            self.B0EXP=B0EXP           #normalisation magnetic field
-            self.m=m                   #equilibrium poloidal harmonics
-            self.chi=chi               #poloidal angle coordinate
-            self.s=s                   #radial coordinate=sqrt(psi_pol)
- 
-    class jacobian():
- 
-        #decide what stuff is needed later, and add a self. in front of it.
-        def __init__(self, rz):
-            if not isinstance(rz, rzcoords):
-                print("read_perturbation_MARSF_bplas.jacobian - must pass in coordinate system of type plotting_base.rzcoords")
-                return
+    def read_geometry(path,nchi):
+        """
+        returns R,Z on the (s,chi) grid of MARSF with derivatives and Jacobian
+
+        notes:
+            d/dchi taken spectrally from the poloidal harmonics
+            d/ds taken from cubic splines along s, fitted separately in plasma and vacuum
+        """
+
+        rmzm=np.loadtxt(path)
+        Nm0=int(rmzm[0,0]) #num. poloidal harmonics for equilibrium quantities (not necessarily same as for perturbation quantities, but should be)
+        Ns_plas=int(rmzm[0,1]) #num. radial points in plasma
+        Ns_vac=int(rmzm[0,2]) #num. radial points in vacuum
+        Ns=Ns_plas+Ns_vac
+        s=rmzm[1:Ns+1,0] #radial coordinate=sqrt(psi_pol)
+        RM=(rmzm[Ns+1:,0]+1j*rmzm[Ns+1:,1]).reshape(Nm0,Ns).T
+        ZM=(rmzm[Ns+1:,2]+1j*rmzm[Ns+1:,3]).reshape(Nm0,Ns).T
+        RM[:,1:]*=2
+        ZM[:,1:]*=2
+
+        m=np.arange(0,Nm0,1) #equilibrium poloidal harmonics
+        chi=np.linspace(-np.pi,np.pi,nchi) #poloidal angle coordinate
+        expmchi=np.exp(np.multiply.outer(m,chi)*1j)
+
+        geometry={}
+        geometry['chi']=chi
+        geometry['R']=np.dot(RM,expmchi).real
+        geometry['Z']=np.dot(ZM,expmchi).real
+        geometry['dRdchi']=np.dot(RM*m*1j,expmchi).real
+        geometry['dZdchi']=np.dot(ZM*m*1j,expmchi).real
+        for quantity in ['R','Z']:
+            derivative=np.empty((Ns,nchi))
+            for region in [slice(Ns_plas-1,Ns),slice(0,Ns_plas)]: #vacuum region includes plasma boundary, which plasma region then overwrites
+                derivative[region]=scipy.interpolate.make_interp_spline(s[region],geometry[quantity][region],k=3,axis=0).derivative()(s[region])
+            geometry['d{}ds'.format(quantity)]=derivative
+
+        geometry['jacobian']=(-geometry['dRdchi']*geometry['dZds']+geometry['dRds']*geometry['dZdchi'])*geometry['R']
+        geometry['jacobian'][0,:]=geometry['jacobian'][1,:]
+
+        return geometry
+
+    def grid_mapping(R,Z,R_1D,Z_1D):
+        """
+        returns vertices and weights which linearly interpolate from scattered R,Z points onto R_1D,Z_1D grid
+
+        notes:
+            equivalent to scipy.interpolate.griddata(method='linear') but triangulates once for any number of fields
+            weights are NaN outside convex hull of R,Z
+        """
+
+        triangulation=scipy.spatial.Delaunay(np.column_stack((R.ravel(),Z.ravel())))
+        R_2D,Z_2D=np.meshgrid(R_1D,Z_1D,indexing='ij')
+        points=np.column_stack((R_2D.ravel(),Z_2D.ravel()))
+        simplices=triangulation.find_simplex(points)
+        transform=triangulation.transform[simplices]
+        barycentric=np.einsum('ijk,ik->ij',transform[:,:2,:],points-transform[:,2,:])
+        weights=np.column_stack((barycentric,1.-barycentric.sum(axis=1)))
+        weights[simplices==-1]=np.nan
+
+        return triangulation.simplices[simplices],weights
+
+    def read_bplas(path,geometry):
+        """
+        returns R,Z,phi components of bplas perturbation on the (s,chi) grid of MARSF
+        """
+
+        bplasma=np.loadtxt(path)
+        Nm1=int(bplasma[0,0]) #number of perturbation poloidal harmonics (should be same as equilibrium harmonics)
+        m=bplasma[1:Nm1+1,0]
+        bm1,bm2,bm3=[(bplasma[Nm1+1:,column]+1j*bplasma[Nm1+1:,column+1]).reshape(Nm1,-1) for column in [0,2,4]]
+
+        #bm2 and bm3 are defined at half int points.
+        #3 ways to recompute at int points, see MacReadBPLASMA.m, lines 109-124
+        #For now, simplest implemented. Assume spline_B23==2.
+        bm2[:,1:]=bm2[:,:-1].copy()
+        bm3[:,1:]=bm3[:,:-1].copy()
+
+        expmchi=np.exp(np.multiply.outer(m,geometry['chi'])*1j)
+        b1=np.dot(bm1.T,expmchi)
+        b2=np.dot(bm2.T,expmchi)
+        b3=np.dot(bm3.T,expmchi)
+
+        BR=(b1*geometry['dRds']+b2*geometry['dRdchi'])/geometry['jacobian']
+        BZ=(b1*geometry['dZds']+b2*geometry['dZdchi'])/geometry['jacobian']
+        BP=b3*geometry['R']/geometry['jacobian']
+        BR[0,:]=BR[1,:]
+        BZ[0,:]=BZ[1,:]
+        BP[0:2,:]=BP[3,:]
+
+        return BR,BZ,BP
+
+    def map_field(field,geometry):
+        """
+        linearly interpolates field on the (s,chi) grid of MARSF onto the R,Z grid
+        """
+
+        return np.einsum('ij,ij->i',field.ravel()[geometry['vertices']],geometry['weights']).reshape(nR_1D,nZ_1D)
 
-            self.Ns=rz.Ns #Used in jacobian.plot(), so pass in from rzcoords
-            
-            self.dRds=scipy.copy(rz.R) 
-            self.dZds=scipy.copy(rz.R)
-            self.dRdchi=scipy.copy(rz.R)
-            self.dZdchi=scipy.copy(rz.R)
-            self.jacobian=scipy.copy(rz.R)
-    
-            #this is for the vacuum region. these are overwritten for the plasma region
-            #just having a number to denote the boundary index might be simpler in the future.
-            #Vac_start variable should be all that's needed. II is way too complicated
-            II_start=int(rz.Ns_plas)-1; II_end=len(rz.R[:,0])
-            II2_start=int(rz.Ns_plas); II2_end=len(rz.R[:,0])
-           
-            s0=scipy.copy(rz.s[II_start:II_end]); R0=scipy.copy(rz.R[II_start:II_end, :])
-            chi0=scipy.squeeze(scipy.copy(scipy.array(rz.chi))); Z0=scipy.copy(rz.Z[II_start:II_end, :])
-           
-            hs=0.5*(s0[1:]-s0[:-1]).min(); hs=min(hs,  2e-5)
-            hchi=0.5*(chi0[1:]-chi0[:-1]).min(); hchi=min(hchi,  1e-4)
-            s1=s0-hs; s2=s0+hs
-            chi1=chi0-hchi;  chi2=chi0+hchi
-           
-            #compute dR/ds using R(s,chi)
-            R1=scipy.zeros(scipy.shape(R0))
-            R2=scipy.zeros(scipy.shape(R0))
-            for i in range(rz.Nchi):
-               R1[:,i]=scipy.interpolate.InterpolatedUnivariateSpline(s0,R0[:,i], bbox=[s1[0], s0[-1]])(s1)
-               R2[:,i]=scipy.interpolate.InterpolatedUnivariateSpline(s0,R0[:,i], bbox=[s0[0], s2[-1]])(s2)
-            self.dRds[II_start:II_end,:]=(R2-R1)/(2*hs)
-    
-            #compute dZ/ds using Z(s,chi) 
-            Z1=scipy.zeros(scipy.shape(Z0))
-            Z2=scipy.zeros(scipy.shape(Z0))
-            for i in range(rz.Nchi):
-               Z1[:,i]=scipy.interpolate.InterpolatedUnivariateSpline(s0,Z0[:,i], bbox=[s1[0], s0[-1]])(s1)
-               Z2[:,i]=scipy.interpolate.InterpolatedUnivariateSpline(s0,Z0[:,i], bbox=[s0[0], s2[-1]])(s2)
-            self.dZds[II_start:II_end,:]=(Z2-Z1)/(2*hs)
-    
-            # compute dR/dchi using R(s,chi) 
-            R1=scipy.zeros(scipy.shape(R0))
-            R2=scipy.zeros(scipy.shape(R0))
-            for i in range(int(rz.Ns_vac)+1):
-               R1[i,:]=scipy.interpolate.InterpolatedUnivariateSpline(chi0,R0[i,:], bbox=[chi1[0], chi0[-1]])(chi1)
-               R2[i,:]=scipy.interpolate.InterpolatedUnivariateSpline(chi0,R0[i,:], bbox=[chi0[0], chi2[-1]])(chi2) 
-               self.dRdchi[i+II_start,:]=(R2[i,:]-R1[i,:])/(2*hchi) 
-       
-            #compute dZ/dchi using Z(s,chi) 
-            Z1=scipy.zeros(scipy.shape(Z0))
-            Z2=scipy.zeros(scipy.shape(Z0))
-            for i in range(int(rz.Ns_vac)+1):
-               Z1[i,:]=scipy.interpolate.InterpolatedUnivariateSpline(chi0,Z0[i,:], bbox=[chi1[0], chi0[-1]])(chi1)
-               Z2[i,:]=scipy.interpolate.InterpolatedUnivariateSpline(chi0,Z0[i,:], bbox=[chi0[0], chi2[-1]])(chi2)
-            self.dZdchi[II_start:II_end,:]=(Z2-Z1)/(2*hchi)
-       
-            #Now do same calculations for plasma region
-            II_start=0; II_end=rz.Ns_plas;
-       
-            s0=scipy.copy(rz.s[II_start:II_end]); R0=scipy.copy(rz.R[II_start:II_end, :])
-            chi0=scipy.squeeze(scipy.copy(scipy.array(rz.chi))); Z0=scipy.copy(rz.Z[II_start:II_end, :])
-       
-            hs=0.5*(s0[1:]-s0[:-1]).min(); hs=min(hs,  2e-5)
-            hchi=0.5*(chi0[1:]-chi0[:-1]).min(); hchi=min(hchi,  1e-4)
-            s1=s0-hs; s2=s0+hs
-            chi1=chi0-hchi;  chi2=chi0+hchi
-       
-            #compute dR/ds using R(s,chi) 
-            R1=scipy.zeros(scipy.shape(R0))
-            R2=scipy.zeros(scipy.shape(R0))
-            for i in range(rz.Nchi):
-                R1[:,i]=scipy.interpolate.InterpolatedUnivariateSpline(s0,R0[:,i], bbox=[s1[0], s0[-1]])(s1)
-                R2[:,i]=scipy.interpolate.InterpolatedUnivariateSpline(s0,R0[:,i], bbox=[s0[0], s2[-1]])(s2)
-            self.dRds[II_start:II_end,:]=(R2-R1)/(2*hs)
-    
-            #compute dZ/ds using Z(s,chi) 
-            Z1=scipy.zeros(scipy.shape(Z0))
-            Z2=scipy.zeros(scipy.shape(Z0))
-            for i in range(rz.Nchi):
-                Z1[:,i]=scipy.interpolate.InterpolatedUnivariateSpline(s0,Z0[:,i], bbox=[s1[0], s0[-1]])(s1)
-                Z2[:,i]=scipy.interpolate.InterpolatedUnivariateSpline(s0,Z0[:,i], bbox=[s0[0], s2[-1]])(s2)
-                self.dZds[:II_end,i]=(Z2[:,i]-Z1[:,i])/(2*hs)
-    
-            # compute dR/dchi using R(s,chi)
-            R1=scipy.zeros(scipy.shape(R0))
-            R2=scipy.zeros(scipy.shape(R0))
-            for i in range(int(rz.Ns_plas)):
-               R1[i,:]=scipy.interpolate.InterpolatedUnivariateSpline(chi0,R0[i,:], bbox=[chi1[0], chi0[-1]])(chi1)
-               R2[i,:]=scipy.interpolate.InterpolatedUnivariateSpline(chi0,R0[i,:], bbox=[chi0[0], chi2[-1]])(chi2)
-            self.dRdchi[II_start:II_end,:]=(R2-R1)/(2*hchi)
-    
-            #compute dZ/dchi using Z(s,chi) 
-            Z1=scipy.zeros(scipy.shape(Z0))
-            Z2=scipy.zeros(scipy.shape(Z0))
-            for i in range(int(rz.Ns_plas)):
-               Z1[i,:]=scipy.interpolate.InterpolatedUnivariateSpline(chi0,Z0[i,:], bbox=[chi1[0], chi0[-1]])(chi1)
-               Z2[i,:]=scipy.interpolate.InterpolatedUnivariateSpline(chi0,Z0[i,:], bbox=[chi0[0], chi2[-1]])(chi2)
-            self.dZdchi[II_start:II_end,:]=(Z2-Z1)/(2*hchi)
-    
-            G11=scipy.square(self.dRds)+scipy.square(self.dZds)
-            G12=scipy.multiply(self.dRds, self.dRdchi)+scipy.multiply(self.dZds, self.dZdchi)
-            G22=scipy.square(self.dRdchi)+scipy.square(self.dZdchi)
-            G22[0,:]=G22[1,:]
-            G33=scipy.square(rz.R)
-    
-            #Metrics elements
-            self.G11=G11
-            self.G12=G12
-            self.G22=G22
-            self.G33=G33
-    
-            self.jacobian=(-self.dRdchi*self.dZds+self.dRds*self.dZdchi)*rz.R
-            self.jacobian[0,:]=self.jacobian[1,:]
-    
-    class bplasma():
- 
-        def __init__(self, path, rz, jc):
-        
-            self.path=path
-            bplasma=scipy.loadtxt(self.path)
-            Nm1=int(bplasma[0,0]) #Number of perturbation poloidal harmonics (should be same as equilibrium harmonics)
-            self.bm1=bplasma[Nm1+1:, 0]+1j*bplasma[Nm1+1:, 1]
-            self.bm2=bplasma[Nm1+1:, 2]+1j*bplasma[Nm1+1:, 3]
-            self.bm3=bplasma[Nm1+1:, 4]+1j*bplasma[Nm1+1:, 5]
-        
-            self.bm1=self.bm1.reshape((Nm1, rz.Ns))
-            self.bm2=self.bm2.reshape((Nm1, rz.Ns))
-            self.bm3=self.bm3.reshape((Nm1, rz.Ns))
-        
-            #bm2 and bm3 are defined at half int points. 
-            #3 ways to recompute at int points, see MacReadBPLASMA.m, lines 109-124
-            #For now, simplest implemented. Assume spline_B23==2.
-            for i in range(len(self.bm2[:,1])):
-                self.bm2[i, 1:]=self.bm2[i, :-1]
-                self.bm3[i, 1:]=self.bm3[i, :-1]
-        
-            m=scipy.array(bplasma[1:Nm1+1,0])
-        
-            expmchi=scipy.exp(scipy.tensordot(m,rz.chi,0)*1j)
-        
-            self.b1=scipy.dot(self.bm1.T,expmchi)
-            self.b2=scipy.dot(self.bm2.T,expmchi)
-            self.b3=scipy.dot(self.bm3.T,expmchi)
-        
-            self.bn=self.b1/scipy.sqrt(jc.G22*jc.G33)
-        
-            self.m=m 
-        
-            self.Br=scipy.divide(scipy.multiply(self.b1, jc.dRds)+scipy.multiply(self.b2, jc.dRdchi), jc.jacobian)
-            self.Bz=scipy.divide(scipy.multiply(self.b1, jc.dZds)+scipy.multiply(self.b2,jc.dZdchi), jc.jacobian)
-            self.Bphi=scipy.divide(scipy.multiply(self.b3, rz.R), jc.jacobian)
-        
-            self.Br[0,:]=self.Br[1,:]
-            self.Bz[0,:]=self.Bz[1,:]
-            self.Bphi[0:2,:]=self.Bphi[3,:]
-        
-            self.AbsB=scipy.sqrt(scipy.square(scipy.absolute(self.Br))+scipy.square(scipy.absolute(self.Bz))+scipy.square(scipy.absolute(self.Bphi)))
-        
-            self.Nm1=Nm1
-        
-            self.rz=rz
-            self.jc=jc
-       
     #start of function
- 
-    import scipy
+
     import scipy.interpolate
+    import scipy.spatial
+    import hashlib
 
     rmzm_geom_path=filepath / 'rmzm_geom'
     rmzm_pest_path=filepath / 'rmzm_pest'
@@ -644,66 +522,69 @@ def read_perturbation_MARSF_bplas(filepath=pathlib.Path(''),response=True,ideal=
     else:
         bplas_u_path=filepath / 'bplas_vac_upper'
         bplas_l_path=filepath / 'bplas_vac_lower'
- 
+
     #make ascot input from B field
     nchi=2400
-  
+
     R_min=0.5
     R_max=2.5
-  
+
     Z_min=-1.5
     Z_max=1.5
-  
-    numR=nR_1D
-    numZ=nZ_1D
-  
-    rz_geom=rzcoords(rmzm_geom_path, nchi)
-    jc_geom=jacobian(rz_geom)
-    bplas_u_geom=bplasma(bplas_u_path, rz_geom,jc_geom)
-    bplas_l_geom=bplasma(bplas_l_path, rz_geom,jc_geom)
-  
-    BN=(bplas_u_geom.bn*scipy.exp(1j*phase)+bplas_l_geom.bn)*bcentr
-    BR=(bplas_u_geom.Br*scipy.exp(1j*phase)+bplas_l_geom.Br)*bcentr
-    BZ=(bplas_u_geom.Bz*scipy.exp(1j*phase)+bplas_l_geom.Bz)*bcentr
-    BP=(bplas_u_geom.Bphi*scipy.exp(1j*phase)+bplas_l_geom.Bphi)*bcentr
-  
-    B=scipy.sqrt(scipy.square(scipy.absolute(BR))+scipy.square(scipy.absolute(BZ))+scipy.square(scipy.absolute(BP)))
-  
-    R1=rz_geom.R*rmaxis
-    Z1=rz_geom.Z*rmaxis
-  
-    B1=B
-    BR1=BR
-    BZ1=BZ
-    BP1=BP
-  
-    R_rect=scipy.linspace(R_min, R_max, numR)
-    Z_rect=scipy.linspace(Z_min, Z_max, numZ)
-  
-    R_grid, Z_grid=scipy.meshgrid(R_rect,Z_rect)
-  
-    BR_rect=scipy.interpolate.griddata((R1.ravel(), Z1.ravel()), BR1.ravel(), (R_grid, Z_grid), method='linear')
-    BR_rect=BR_rect.reshape((numZ,numR))
-  
-    BZ_rect=scipy.interpolate.griddata((R1.ravel(), Z1.ravel()), BZ1.ravel(), (R_grid, Z_grid), method='linear')
-    BZ_rect=BZ_rect.reshape((numZ,numR))
-  
-    BP_rect=scipy.interpolate.griddata((R1.ravel(), Z1.ravel()), BP1.ravel(), (R_grid, Z_grid), method='linear')
-    BP_rect=BP_rect.reshape((numZ,numR))
-  
-    B_rect=scipy.sqrt(scipy.absolute(BR_rect)**2+scipy.absolute(BZ_rect)**2+scipy.absolute(BP_rect)**2)
- 
+
+    R_1D=np.linspace(R_min,R_max,nR_1D)
+    Z_1D=np.linspace(Z_min,Z_max,nZ_1D)
+
+    #geometry and triangulation are independent of coil row and phase so try cache first
+    cache_filepath=None
+    if cache:
+        checksum=processing.utils.file_checksum(rmzm_geom_path)
+        if checksum is not None:
+            settings_geometry=repr((checksum,nchi,rmaxis,R_min,R_max,nR_1D,Z_min,Z_max,nZ_1D))
+            cache_filepath=support.dir_cache_files / 'MARSF_bplas' / 'rmzm_geom_{}.npz'.format(hashlib.blake2b(settings_geometry.encode(),digest_size=16).hexdigest())
+
+    geometry=None
+    if cache_filepath is not None and cache_filepath.is_file():
+        try:
+            with np.load(cache_filepath,allow_pickle=False) as file:
+                geometry={key:file[key] for key in file.files}
+        except:
+            print("WARNING: read_perturbation_MARSF_bplas could not read cache {} - recalculating geometry".format(cache_filepath))
+
+    if geometry is None:
+        geometry=read_geometry(rmzm_geom_path,nchi)
+        geometry['vertices'],geometry['weights']=grid_mapping(geometry['R']*rmaxis,geometry['Z']*rmaxis,R_1D,Z_1D)
+        if cache_filepath is not None: #write next to cache then move into place so a partially written cache is never read
+            cache_filepath_temporary=cache_filepath.with_name('{}.{}.npz'.format(cache_filepath.stem,id(geometry)))
+            try:
+                cache_filepath.parent.mkdir(parents=True,exist_ok=True)
+                np.savez(cache_filepath_temporary,**geometry)
+                cache_filepath_temporary.replace(cache_filepath)
+            except:
+                print("WARNING: read_perturbation_MARSF_bplas could not write cache {}".format(cache_filepath))
+                cache_filepath_temporary.unlink(missing_ok=True)
+
+    BR_u,BZ_u,BP_u=[map_field(field,geometry) for field in read_bplas(bplas_u_path,geometry)]
+    BR_l,BZ_l,BP_l=[map_field(field,geometry) for field in read_bplas(bplas_l_path,geometry)]
+
+    BR_rect=(BR_u*np.exp(1j*phase)+BR_l)*bcentr
+    BZ_rect=(BZ_u*np.exp(1j*phase)+BZ_l)*bcentr
+    BP_rect=(BP_u*np.exp(1j*phase)+BP_l)*bcentr
+
+    outside=np.isnan(geometry['weights'][:,0]).reshape(nR_1D,nZ_1D)
+    for B_rect in [BR_rect,BZ_rect,BP_rect]:
+        B_rect[outside]=np.nan #match griddata fill_value
+
     input_data={}
-    input_data['R_2D']=np.array(R_grid,ndmin=2).swapaxes(0,1)
-    input_data['Z_2D']=np.array(Z_grid,ndmin=2).swapaxes(0,1)
-    input_data['R_1D']=np.squeeze(np.array(input_data['R_2D'][:,0],ndmin=2))
-    input_data['Z_1D']=np.squeeze(np.array(input_data['Z_2D'][0,:],ndmin=2))
-    input_data['dB_field_R_real']=np.array(BR_rect.real,ndmin=2).swapaxes(0,1)
-    input_data['dB_field_R_imag']=np.array(BR_rect.imag,ndmin=2).swapaxes(0,1)
-    input_data['dB_field_Z_real']=np.array(BZ_rect.real,ndmin=2).swapaxes(0,1)
-    input_data['dB_field_Z_imag']=np.array(BZ_rect.imag,ndmin=2).swapaxes(0,1)
-    input_data['dB_field_tor_real']=np.array(BP_rect.real,ndmin=2).swapaxes(0,1)
-    input_data['dB_field_tor_imag']=np.array(BP_rect.imag,ndmin=2).swapaxes(0,1)
+    input_data['R_1D']=R_1D
+    input_data['Z_1D']=Z_1D
+    input_data['R_2D'],input_data['Z_2D']=np.meshgrid(R_1D,Z_1D,indexing='ij')
+    input_data['dB_field_R_real']=BR_rect.real
+    input_data['dB_field_R_imag']=BR_rect.imag
+    input_data['dB_field_Z_real']=BZ_rect.real
+    input_data['dB_field_Z_imag']=BZ_rect.imag
+    input_data['dB_field_tor_real']=BP_rect.real
+    input_data['dB_field_tor_imag']=BP_rect.imag
 
     print("finished reading MARSF_bplas perturbation")
 
@@ -727,12 +608,7 @@ def dump_perturbation_LOCUST(output_data,filepath,**properties):
         
         quantities=['R_2D','Z_2D','dB_field_R_real','dB_field_R_imag','dB_field_Z_real','dB_field_Z_imag','dB_field_tor_real','dB_field_tor_imag']
 
-        for row in np.array([output_data[quantity].flatten() for quantity in quantities]).T:
-            line=''
-            for number in row:
-                line+=processing.utils.fortran_string(number_out=number,length=18,decimals=10,exponential=True)
-            line+=' \n' 
-            file.write(line)
+        file.writelines(processing.utils.fortran_lines([output_data[quantity].ravel() for quantity in quantities],(18,10,True),line_end=' \n'))
 
     print("finished writing LOCUST perturbation")
 
@@ -751,30 +627,10 @@ def dump_perturbation_point_data_LOCUST(output_data,filepath='point_data.inp',BC
     with open(filepath,'w') as file: #open file
 
         if BCHECK==1:
-            for R,Phi,Z,time in zip(output_data['R_point_data'],output_data['phi_point_data'],output_data['Z_point_data'],output_data['time_point_data']):
-                line=' '
-                line+=processing.utils.fortran_string(R,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(Phi,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(Z,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(time,11,6,exponential=False)
-                line+='  '
-                file.write('{}\n'.format(line))
+            file.writelines(processing.utils.fortran_lines([output_data['R_point_data'],output_data['phi_point_data'],output_data['Z_point_data'],output_data['time_point_data']],(12,6,False),line_end='  \n')) #each column is a space followed by 11 character float
 
         elif BCHECK==2:
-            for X,Y,Z,time in zip(output_data['X_point_data'],output_data['Y_point_data'],output_data['Z_point_data'],output_data['time_point_data']):
-                line=' '
-                line+=processing.utils.fortran_string(X,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(Y,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(Z,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(time,11,6,exponential=False)
-                line+='  '
-                file.write('{}\n'.format(line))
+            file.writelines(processing.utils.fortran_lines([output_data['X_point_data'],output_data['Y_point_data'],output_data['Z_point_data'],output_data['time_point_data']],(12,6,False),line_end='  \n'))
 
     print("finished writing point_inp.dat test points")
 
@@ -852,13 +708,8 @@ def dump_perturbation_POCA(output_data,filepath,**properties):
 
         quantities=['R_2D','Z_2D','dB_field_R_real','dB_field_R_imag','dB_field_Z_real','dB_field_Z_imag','dB_field_tor_real','dB_field_tor_imag']
 
-        for row in np.array([output_data[quantity].flatten() for quantity in quantities]).T:
-            line='  '
-            line+='0' #index indicating whether the grid is inside or outside of separatrix - set just to 1 here
-            for number in row:
-                line+=processing.utils.fortran_string(number_out=number,length=16,decimals=8,exponential=True)
-            line+=' \n' 
-            file.write(line)
+        columns=[0]+[output_data[quantity].ravel() for quantity in quantities] #first column is index indicating whether the grid is inside or outside of separatrix - set just to 0 here
+        file.writelines(processing.utils.fortran_lines(columns,[(3,)]+[(16,8,True)]*len(quantities),line_end=' \n'))
 
     print("finished writing POCA perturbation")
 
@@ -1261,7 +1112,7 @@ class Perturbation(classes.base_input.LOCUST_input):
             plt.show()
 
 
-    def evaluate(self,R,phi,Z,mode_number=None,i3dr=-1,phase=0):
+    def evaluate(self,R,phi,Z,mode_number=None,i3dr=-1,phase=0,harmonics=None,chunk_size=1000000):
         """
         returns the three components of perturbation field at a point in the plasma 
         
@@ -1271,46 +1122,45 @@ class Perturbation(classes.base_input.LOCUST_input):
             Z - array of Z coordinates
             mode_number - mode number of this toroidal harmonic
             i3dr - flip definition of phi (+1 anti-clockwise, -1 clockwise)
-            phase - perturbation mode where dB~sin(n*phi-phase) (of field origin with respect to locust origin) (radians, anti-clockwise)
+            phase - perturbation mode where dB~sin(n*phi-phase) (of field origin with respect to locust origin) (radians, anti-clockwise) - can be an array of phases
+            harmonics - list of further perturbation objects whose fields are summed with this one, each uses its own mode_number
+            chunk_size - evaluate this many points at a time to bound memory
         notes:
-
+            real/imaginary field interpolators are cached in processing.utils.interpolator_cache so are only generated once
+            each harmonic is evaluated once per point and phases are then applied using cos(a-phase)=cos(a)cos(phase)+sin(a)sin(phase) 
+            if phase is a scalar then returned components have shape (n_points) else (n_phase,n_points)
         usage:
             dB_R,dB_tor,dB_Z=my_perturbation.evaluate(R=[1,2,3],phi=[0,0,0],Z=[1,2,3])
+            dB_R,dB_tor,dB_Z=my_perturbation.evaluate(R=[1,2,3],phi=[0,0,0],Z=[1,2,3],phase=np.linspace(0,2.*np.pi,10),harmonics=[my_other_perturbation]) #sum two harmonics for 10 phases
         """
 
         if not mode_number: mode_number=self.mode_number
+        if harmonics is None: harmonics=[]
+
+        R=np.asarray(R,dtype=float).ravel()
+        phi=np.asarray(phi,dtype=float).ravel()
+        Z=np.asarray(Z,dtype=float).ravel()
+        phases=np.atleast_1d(np.asarray(phase,dtype=float))
 
-        print("perturbation_calc_point generating B_field interpolators")
-        dB_field_R_real_interpolator=processing.utils.interpolate_2D(self['R_1D'],self['Z_1D'],self['dB_field_R_real']) #construct interpolators here
-        dB_field_R_imag_interpolator=processing.utils.interpolate_2D(self['R_1D'],self['Z_1D'],self['dB_field_R_imag']) 
-        dB_field_tor_real_interpolator=processing.utils.interpolate_2D(self['R_1D'],self['Z_1D'],self['dB_field_tor_real'])
-        dB_field_tor_imag_interpolator=processing.utils.interpolate_2D(self['R_1D'],self['Z_1D'],self['dB_field_tor_imag'])
-        dB_field_Z_real_interpolator=processing.utils.interpolate_2D(self['R_1D'],self['Z_1D'],self['dB_field_Z_real'])
-        dB_field_Z_imag_interpolator=processing.utils.interpolate_2D(self['R_1D'],self['Z_1D'],self['dB_field_Z_imag'])
-        print("perturbation_calc_point finished generating B_field interpolators")
-
-        dB_R=[]
-        dB_tor=[]
-        dB_Z=[]  
-
-        for R_point,phi_point,Z_point in zip(R,phi,Z):
-            dB_field_R_real=float(dB_field_R_real_interpolator(R_point,Z_point))
-            dB_field_R_imag=float(dB_field_R_imag_interpolator(R_point,Z_point))
-            dB_field_tor_real=float(dB_field_tor_real_interpolator(R_point,Z_point))
-            dB_field_tor_imag=float(dB_field_tor_imag_interpolator(R_point,Z_point))
-            dB_field_Z_real=float(dB_field_Z_real_interpolator(R_point,Z_point))
-            dB_field_Z_imag=float(dB_field_Z_imag_interpolator(R_point,Z_point))
-
-            cp = np.cos(mode_number*phi_point*i3dr-phase)
-            sp = np.sin(mode_number*phi_point*i3dr-phase)
-
-            dB_R.extend([dB_field_R_real*cp - dB_field_R_imag*sp])
-            dB_tor.extend([(dB_field_tor_real*cp - dB_field_tor_imag*sp)*i3dr])
-            dB_Z.extend([dB_field_Z_real*cp - dB_field_Z_imag*sp])
-
-        dB_R=np.asarray(dB_R)
-        dB_tor=np.asarray(dB_tor)
-        dB_Z=np.asarray(dB_Z)
+        cos_components=np.zeros((3,R.size)) #components are sum over harmonics of cos_components*cos(phase)+sin_components*sin(phase)
+        sin_components=np.zeros((3,R.size))
+
+        for harmonic,harmonic_mode_number in [(self,mode_number)]+[(harmonic,harmonic.mode_number) for harmonic in harmonics]:
+            interpolators=harmonic.get_interpolators('dB_field_R_real','dB_field_R_imag','dB_field_tor_real','dB_field_tor_imag','dB_field_Z_real','dB_field_Z_imag')
+            for start in range(0,R.size,int(chunk_size)):
+                chunk=slice(start,start+int(chunk_size))
+                angle=harmonic_mode_number*phi[chunk]*i3dr
+                cos_angle,sin_angle=np.cos(angle),np.sin(angle)
+                for component,(real_interpolator,imag_interpolator,sign) in enumerate(zip(interpolators[0::2],interpolators[1::2],[1,i3dr,1])):
+                    real=real_interpolator.ev(R[chunk],Z[chunk])
+                    imag=imag_interpolator.ev(R[chunk],Z[chunk])
+                    cos_components[component,chunk]+=sign*(real*cos_angle-imag*sin_angle)
+                    sin_components[component,chunk]+=sign*(real*sin_angle+imag*cos_angle)
+
+        dB_R,dB_tor,dB_Z=(np.outer(np.cos(phases),cos_component)+np.outer(np.sin(phases),sin_component) for cos_component,sin_component in zip(cos_components,sin_components))
+
+        if np.ndim(phase)==0:
+            return dB_R[0],dB_tor[0],dB_Z[0]
 
         return dB_R,dB_tor,dB_Z
 
@@ -1421,6 +1271,37 @@ class Perturbation(classes.base_input.LOCUST_input):
         if ax_flag is False and fig_flag is False:
             plt.show()
 
+def read_perturbations(IDs,data_format,filenames,mode_numbers=None,processes=1,**properties):
+    """
+    reads several perturbations e.g. toroidal harmonics, optionally in parallel
+
+    args:
+        IDs - list of IDs of each perturbation
+        data_format - data format of all files
+        filenames - list of filenames in input_files folder
+        mode_numbers - list of mode numbers of each perturbation
+        processes - number of worker processes reading files at once
+        properties - passed on to every Perturbation.read_data()
+    notes:
+        files are read by a process pool so parsing is not serialised by the GIL
+    returns:
+        list of Perturbation objects
+    usage:
+        perturbation,*harmonics=read_perturbations(IDs=['n=3','n=6'],data_format='LOCUST',filenames=['BPLASMA_n3','BPLASMA_n6'],mode_numbers=[3,6],processes=2)
+        perturbation.evaluate(R,phi,Z,harmonics=harmonics)
+    """
+
+    mode_numbers=mode_numbers if mode_numbers is not None else [None]*len(filenames)
+    arguments=[dict(ID=ID,data_format=data_format,filename=filename,mode_number=mode_number,**properties) for ID,filename,mode_number in zip(IDs,filenames,mode_numbers)]
+
+    if processes>1:
+        import concurrent.futures
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+            futures=[executor.submit(Perturbation,**argument) for argument in arguments]
+            return [future.result() for future in futures]
+
+    return [Perturbation(**argument) for argument in arguments]
+
 #################################
  
 ##################################################################
@@ -298,8 +298,7 @@ def dump_rotation_LOCUST(output_data,filepath,**properties):
  
         file.write("{}\n".format(processing.utils.fortran_string(output_rot.size,12))) #re-insert line containing length
         
-        for point in range(output_rot.size): #iterate through all points i.e. length of our dictionary's arrays
-            file.write("{flux_pol_norm}{rot}\n".format(flux_pol_norm=processing.utils.fortran_string(normalised_flux[point],16,8),rot=processing.utils.fortran_string(output_rot[point],16,8)))
+        file.writelines(processing.utils.fortran_lines([normalised_flux,output_rot],(16,8))) #write all points i.e. length of our dictionary's arrays
  
     print("finished writing rotation to LOCUST")
 
@@ -323,8 +322,7 @@ def dump_rotation_MARSF(output_data,filepath,**properties):
  
         file.write("{length} {some_number}\n".format(length=int(flux_pol_norm_sqrt.size),some_number=1)) #re-insert line containing length
         
-        for point in range(flux_pol_norm_sqrt.size): #iterate through all points i.e. length of our dictionary's arrays
-            file.write("{flux_pol_norm_sqrt}{rotation}\n".format(flux_pol_norm_sqrt=processing.utils.fortran_string(flux_pol_norm_sqrt[point],24,18),rotation=processing.utils.fortran_string(rotation[point],24,18)))
+        file.writelines(processing.utils.fortran_lines([flux_pol_norm_sqrt,rotation],(24,18))) #write all points i.e. length of our dictionary's arrays
 
     print("finished writing rotation to MARSF mogui")
 
@@ -450,8 +450,7 @@ def dump_temperature_LOCUST(output_data,filepath,**properties):
  
         file.write("{}\n".format(processing.utils.fortran_string(output_T.size,12))) #re-insert line containing length
         
-        for point in range(output_T.size): #iterate through all points i.e. length of our dictionary's arrays
-            file.write("{flux_pol_norm}{T}\n".format(flux_pol_norm=processing.utils.fortran_string(normalised_flux[point],16,8),T=processing.utils.fortran_string(output_T[point],16,8)))
+        file.writelines(processing.utils.fortran_lines([normalised_flux,output_T],(16,8))) #write all points i.e. length of our dictionary's arrays
  
     print("finished writing temperature to LOCUST")
 
@@ -550,8 +549,7 @@ def dump_temperature_MARSF(output_data,filepath,**properties):
  
         file.write("{length} {some_number}\n".format(length=int(flux_pol_norm_sqrt.size),some_number=1)) #re-insert line containing length
         
-        for point in range(flux_pol_norm_sqrt.size): #iterate through all points i.e. length of our dictionary's arrays 
-            file.write("{flux_pol_norm}{T}\n".format(flux_pol_norm=processing.utils.fortran_string(flux_pol_norm_sqrt[point],24,18),T=processing.utils.fortran_string(output_T[point],24,18)))
+        file.writelines(processing.utils.fortran_lines([flux_pol_norm_sqrt,output_T],(24,18))) #write all points i.e. length of our dictionary's arrays
  
     print("finished writing temperature to MARSF mogui")
 
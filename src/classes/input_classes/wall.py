@@ -109,119 +109,18 @@ def read_wall_LOCUST_2D(filepath,**properties):
 def read_wall_GEQDSK(filepath,**properties):
     """
     notes:
+        file contents are parsed by processing.utils.read_GEQDSK
     """
 
-    buffer_data={}
     input_data={}
 
-    def file_numbers(ingf):#instance of generators are objects hence can use .next() method on them
-        """
-        generator to read numbers in a file
-     
-        notes:
-            originally written by Ben Dudson
-     
-            calling get_next() on a generator produced with this function will permanently advance the iterator in this generator
-            when generators reach the end, that's permanently it!
-        """
-        toklist = []
-        while True: #runs forever until break statement (until what is read is not a line) below will cause a return - which permanently stops a generator
-            line = ingf.readline() #read in line from INGF
-            if not line: break #break if readline() doesnt return a line i.e. end of file
-            line = line.replace("NaN","-0.00000e0") #replaces NaNs with 0s
-            pattern = r'[+-]?\d*[\.]?\d+(?:[Ee][+-]?\d+)?' #regular expression to find numbers
-            toklist = re.findall(pattern,line) #toklist now holds all the numbers in a file line (is essentially a single file line)
-            for tok in toklist: #yield every number in that one line individually
-                yield tok #so in terms of iteration, using get_next() will cause another line to be read
-
     print("reading 2D wall from GEQDSK")
-  
-    with open(filepath,'r') as file: #open file
- 
-        line = file.readline() #first line should be case, id number and dimensions
-        if not line:
-            raise IOError("ERROR: read_equilibrium_GEQDSK() cannot read from "+str(filepath))
-         
-        #extract case, id number and dimensions  
-        conts = line.split()    #split by white space (no argument in .split())
-        buffer_data['nZ_1D'] = np.asarray(int(conts[-1])) #same as nyefit or height dimension
-        buffer_data['nR_1D'] = np.asarray(int(conts[-2])) #same as nxefit or width dimension
-        buffer_data['idum'] = np.asarray(int(conts[-3]))
-        #buffer_data['time'] = np.asarray(int(consts[-4])) #time slice time (in ms)
-        #buffer_data['EFITshot'] = np.asarray(int(consts[-5])) #shot number
-
-        flags = {} #read the case in (basically just ID data)
-        flags['case'] = conts[0:-4] 
-     
-        #now use generator to read numbers from remaining lines in file
-        token = file_numbers(file) #token now holds all lines in the file, containing all values. each processing.utils.get_next() call will grab the next number in a line (since processing.utils.get_next() returns the next value in the yield loop? check this plz)
-         
-        float_keys = [
-        'rdim','zdim','rcentr','rleft','zmid',
-        'rmaxis','zmaxis','simag','sibry','bcentr',
-        'current','simag','xdum','rmaxis','xdum',
-        'zmaxis','xdum','sibry','xdum','xdum']
-     
-        #read in all 0D floats
-        for key in float_keys:                              
-            buffer_data[key] = np.asarray(float(processing.utils.get_next(token))) #processing.utils.get_next(token) always yields just a single value, convert this to numpy array
-     
-        def read_1d(n): 
-            """
-            """
-            buffer_data = np.zeros(n) #initialise blank lists
-            for i in np.arange(n): #instead of using linspace or something makes a temporary numpy array of dimension n to iterate through
-                buffer_data[i] = float(processing.utils.get_next(token))
-            return buffer_data
-     
-        def read_2d(nx,ny):
-            """
-            notes:
-                edited this function as it was not consistent with GEQDSK storage format
-            """
-            buffer_data = np.zeros((nx,ny))
-            for j in np.arange(ny): #same technique here, iterate through one dimension and call read_1d along the other dimension
-                buffer_data[:,j] = read_1d(nx)
-            return buffer_data
-
-        #read in the arrays
-        buffer_data['fpol'] = read_1d(buffer_data['nR_1D']) #remember buffer_data['nR_1D'] holds width, buffer_data['nZ_1D'] holds height
-        buffer_data['pres'] = read_1d(buffer_data['nR_1D'])
-        buffer_data['ffprime'] = read_1d(buffer_data['nR_1D'])
-        buffer_data['pprime'] = read_1d(buffer_data['nR_1D'])
-        buffer_data['psirz'] = read_2d(buffer_data['nR_1D'],buffer_data['nZ_1D'])
-        buffer_data['qpsi'] = read_1d(buffer_data['nR_1D'])
-     
-        #now deal with boundaries
-        buffer_data['lcfs_n'] = np.array(int(processing.utils.get_next(token)))
-        input_data['limitr'] = np.array(int(processing.utils.get_next(token)))
-     
-        def read_bndy(nb,nl): #number of boundaries and limiters
-            if nb > 0: #read in boundaries
-                rb = np.zeros(nb)
-                zb = np.zeros(nb)
-                for i in np.arange(nb):
-                    rb[i] = float(processing.utils.get_next(token)) #read in R,Z pairs
-                    zb[i] = float(processing.utils.get_next(token))
-            else:
-                rb = np.array(0)
-                zb = np.array(0)
-         
-            if nl > 0: #read in limiters
-                rl = np.zeros(nl)
-                zl = np.zeros(nl)
-                for i in np.arange(nl):
-                    rl[i] = float(processing.utils.get_next(token))
-                    zl[i] = float(processing.utils.get_next(token))
-            else:
-                rl = np.array(0)
-                zl = np.array(0)
-     
-            return rb,zb,rl,zl
-     
-        buffer_data['lcfs_r'],buffer_data['lcfs_z'],input_data['rlim'],input_data['zlim'] = read_bndy(buffer_data['lcfs_n'],input_data['limitr'])
-
-        print("finished reading 2D wall from GEQDSK")
+
+    buffer_data=processing.utils.read_GEQDSK(filepath)
+    for key in ['limitr','rlim','zlim']:
+        input_data[key]=buffer_data[key]
+
+    print("finished reading 2D wall from GEQDSK")
 
     return input_data
 
@@ -353,8 +252,7 @@ def dump_wall_LOCUST_2D(output_data,filepath,**properties):
         radii_interpolator=processing.utils.interpolate_1D(angles,radii,type='interp1d',function='linear')
         radii_new=radii_interpolator(angles_new)
 
-        for radius in radii_new: 
-            file.write("{}\n".format(processing.utils.fortran_string(radius**2,13,7,exponential=False)))
+        file.writelines(processing.utils.fortran_lines([radii_new**2],(13,7,False)))
 
     print("finished writing 2D limiter wall to LOCUST format")
 
@@ -376,9 +274,7 @@ def dump_wall_ASCOT_2D_input(output_data,filepath,**properties):
 
         file.write("{number_points} (R,z) wall points & divertor flag (1 = divertor, 0 = wall)\n".format(number_points=int(output_data['rlim'].size)))
         
-        for r,z in zip(output_data['rlim'],output_data['zlim']):
-            line=processing.utils.fortran_string(r,16,7)+processing.utils.fortran_string(z,16,7)+processing.utils.fortran_string(0.0,4,0,False)+"\n"
-            file.write(line)
+        file.writelines(processing.utils.fortran_lines([output_data['rlim'],output_data['zlim'],0.0],[(16,7),(16,7),(4,0,False)])) #divertor flag always 0
 
     print("finished dumping wall to ASCOT format")
 
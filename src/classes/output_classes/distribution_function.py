@@ -35,6 +35,11 @@ except:
     raise ImportError("ERROR: LOCUST_IO/src/processing/utils.py could not be imported!\nreturning\n")
     sys.exit(1)  
 
+try:
+    import processing.process_output
+except:
+    raise ImportError("ERROR: LOCUST_IO/src/processing/process_output.py could not be imported!\nreturning\n")
+    sys.exit(1)
 try:
     import classes.base_output 
 except:
@@ -83,6 +88,11 @@ def read_distribution_function_LOCUST(filepath,**properties):
         must keep an eye on the double/single GPU formats specified in LOCUST's prec_mod.f90 to ensure Dfn is read correctly from LOCUST binary format
 
         final Dfn is s^3/m^6
+
+        if properties['memmap'] and nphase==1 then IDFTYP!=3 dfn and dfn_s are read-only np.memmap views of the file so are only paged in when accessed
+            IDFTYP==1 dfn is then left per dSolidAngle/4pi as stored and dfn['dfn_scale']=0.5 holds the factor to convert to per unit pitch - transform() and get_dfn_point apply it, see processing.utils.dfn_scale
+            records of nphase>1 files are interleaved by reshape so dfn and dfn_s are always read fully into memory
+        if properties['lazy'] then IDFTYP!=3 dfn and dfn_s are only read when first accessed - see classes.base_output.Lazy_Data
     """
 
     print("reading distribution function from LOCUST")
@@ -106,8 +116,9 @@ def read_distribution_function_LOCUST(filepath,**properties):
         raise ImportError("ERROR: read_distribution_function_LOCUST could not import scipy.io.FortranFile!\nreturning\n")
         return
 
-    file=FortranFile(filepath,'r')
-    input_data={} #initialise blank dictionary
+    file_binary=open(filepath,'rb') #FortranFile reads records sequentially from this handle so it can also be indexed directly
+    file=FortranFile(file_binary,'r')
+    input_data=classes.base_output.Lazy_Data() if properties.get('lazy',False) else {} #initialise blank dictionary
     input_data['IDFTYP']=np.array(IDFTYP)
 
     if IDFTYP==3:
@@ -213,34 +224,39 @@ def read_distribution_function_LOCUST(filepath,**properties):
         #nP-1
         input_data['nphase']=file.read_ints() #poloidal gyro-phase cell boundaries
         
-        if properties['ITER']: #NOTE these blocks essentially do the same thing right now
-
-            if properties['WIPE']:
-                input_data['dfn']=[] #Final combined DFn. grid
-                input_data['dfn_s']=[] #Dfn. M.C. error
-                for line in range(int(input_data['nphase'])):
-                    input_data['dfn'].extend(file.read_reals(dtype=np.float32)) #nP*nc long
-                for line in range(int(input_data['nphase'])):
-                    input_data['dfn_s'].extend(file.read_reals(dtype=np.float32)) #nP*nc long
-                
+        #Final combined DFn. grid then Dfn. M.C. error, each nphase records nP*nc long
+        #index record positions once then read (or map if memmap) each quantity in bulk - ITER/WIPE do not change layout
+        nphase=int(input_data['nphase'])
+        records=processing.utils.fortran_record_index(file_binary,2*nphase) #leaves file_binary after the records so FortranFile carries on from there
+
+        mapped=properties['memmap'] and nphase==1 #F-order reshape interleaves multiple records so they cannot be viewed in place
+        if mapped and IDFTYP==1:
+            input_data['dfn_scale']=np.array(0.5) #convert from same pitch dimension as TRANSP (per dSolidAngle/4pi) to per unit pitch 
+
+        def read_dfn(key):
+            key_records=records[:nphase] if key=='dfn' else records[nphase:]
+            if mapped:
+                dfn=np.memmap(filepath,dtype=np.float32,mode='r',offset=key_records[0][0],shape=(key_records[0][1]//4,))
             else:
-                input_data['dfn']=[] #Final combined DFn. grid  
-                input_data['dfn_s']=[] #Dfn. M.C. error
-                for line in range(int(input_data['nphase'])): #Dfn. M.C. error
-                    input_data['dfn'].extend(file.read_reals(dtype=np.float32)) #nP*nc long
-                for line in range(int(input_data['nphase'])):
-                    input_data['dfn_s'].extend(file.read_reals(dtype=np.float32)) #nP*nc long
-        
+                dfn=[np.fromfile(str(filepath),dtype=np.float32,count=number_bytes//4,offset=offset) for offset,number_bytes in key_records]
+                dfn=dfn[0] if nphase==1 else np.concatenate(dfn) #records are not contiguous on disk so multiple records must be read
+
+            if IDFTYP==1:
+                dfn=dfn.reshape(nphase,int(input_data['nE' if properties['EBASE'] else 'nV']),int(input_data['nV_pitch']),int(input_data['nZ']),int(input_data['nR']),order='F')
+                if key=='dfn':
+                    dfn=np.swapaxes(dfn,3,4) #swap final order to ...r,z - means plotting functions can assume index order x,y
+                    if not mapped: #mapped dfn is scaled by dfn['dfn_scale'] when used
+                        dfn*=0.5 #convert from same pitch dimension as TRANSP (per dSolidAngle/4pi) to per unit pitch 
+            elif IDFTYP==2 and key=='dfn':
+                dfn=np.swapaxes(dfn,2,3) #swap final order to ...r,z - means plotting functions can assume index order x,y
+
+            return dfn
+
+        if properties.get('lazy',False):
+            input_data.register(lambda keys: {key:read_dfn(key) for key in keys},'dfn','dfn_s')
         else:
-            input_data['dfn']=[] #Final combined DFn. grid   
-            input_data['dfn_s']=[] #Dfn. M.C. error
-            for line in range(int(input_data['nphase'])): #Dfn. M.C. error
-                input_data['dfn'].extend(file.read_reals(dtype=np.float32)) #nP*nc long
-            for line in range(int(input_data['nphase'])):
-                input_data['dfn_s'].extend(file.read_reals(dtype=np.float32)) #nP*nc long
-
-        if input_data['IDFTYP']==2:
-            input_data['dfn']=np.swapaxes(input_data['dfn'],2,3) #swap final order to ...r,z - means plotting functions can assume index order x,y
+            for key in ['dfn','dfn_s']:
+                input_data[key]=read_dfn(key)
         
         nEQ=file.read_ints() 
 
@@ -358,17 +374,9 @@ def read_distribution_function_LOCUST(filepath,**properties):
 
         if properties['EBASE']:
             input_data['dfn_index']=np.array(['P','E','V_pitch','R','Z']) #reference for names of each dfn dimension
-            for key in ['dfn','dfn_s']:
-                input_data[key]=np.array(input_data[key]).reshape(int(input_data['nphase']),int(input_data['nE']),int(input_data['nV_pitch']),int(input_data['nZ']),int(input_data['nR']),order='F')  
-            input_data['nc']=len(input_data['dfn'])/input_data['nphase'] #nV*nV_pitch*nZ*nR (nZ, nR = nF)
         else:
             input_data['dfn_index']=np.array(['P','V','V_pitch','R','Z']) #reference for names of each dfn dimension
-            for key in ['dfn','dfn_s']:
-                input_data[key]=np.array(input_data[key]).reshape(int(input_data['nphase']),int(input_data['nV']),int(input_data['nV_pitch']),int(input_data['nZ']),int(input_data['nR']),order='F')  
-            input_data['nc']=len(input_data['dfn'])/input_data['nphase'] #nV*nV_pitch*nZ*nR (nZ, nR = nF)
-        input_data['dfn']=np.swapaxes(input_data['dfn'],3,4) #swap final order to ...r,z - means plotting functions can assume index order x,y
-
-        input_data['dfn']*=0.5 #convert from same pitch dimension as TRANSP (per dSolidAngle/4pi) to per unit pitch 
+        input_data['nc']=nphase/input_data['nphase'] #dfn and dfn_s are read and reshaped by read_dfn - len(dfn)==nphase
         input_data['dR']=np.array(input_data['R'][1]-input_data['R'][0]) #R bin width
         input_data['dZ']=np.array(input_data['Z'][1]-input_data['Z'][0]) #Z bin width
         input_data['dV_pitch']=np.array(input_data['V_pitch'][1]-input_data['V_pitch'][0]) #pitch bin width
@@ -469,15 +477,24 @@ def read_distribution_function_particle_list(source,**properties):
     generate a distribution function from a pre-existing list of markers e.g. beam dsitribution or a loss list
 
     notes:
+        markers are binned onto the grid of properties['template'] distribution function - see processing.process_output.extract_DFN_particle_list
+    args:
+        source - particle list object e.g. Final_Particle_List or Beam_Deposition
+        template - distribution function defining grid
+        equilibrium - equilibrium used to calculate pitch if source holds no V_pitch
+        weight - toggle whether to include marker weights
+        chunk_size - number of markers binned at once
     """
 
-    print("generating reading distribution function from particle list")
-
-    input_data={}
+    print("generating distribution function from particle list")
 
-    #do something with an nD histogram here
+    dfn=processing.process_output.extract_DFN_particle_list(source,properties['template'],some_equilibrium=properties.get('equilibrium',None),weight=properties.get('weight',True),chunk_size=int(properties.get('chunk_size',1000000)))
+    input_data={key:dfn[key] for key in dfn.data} if dfn is not None else {}
+    for key,value in input_data.items(): #do not share axes with template
+        if isinstance(value,np.ndarray) and not value.flags.writeable:
+            input_data[key]=np.array(value)
 
-    print("finished generating reading distribution function from particle list")
+    print("finished generating distribution function from particle list")
 
     return input_data
 
@@ -588,7 +605,7 @@ class Distribution_Function(classes.base_output.LOCUST_output):
                 self.data_format=data_format #add to the member data
                 self.filename=filename
                 self.filepath=support.dir_output_files / filename                
-                for variable, default_value in zip(['ITER','wtot','WIPE','TEST','EBASE','dfn_s','J','J_s','cpu_time'],[True,False,False,False,True,True,True,True,True]): #default properties settings
+                for variable, default_value in zip(['ITER','wtot','WIPE','TEST','EBASE','dfn_s','J','J_s','cpu_time','memmap','lazy'],[True,False,False,False,True,True,True,True,True,False,False]): #default properties settings
                     if variable not in properties:
                         properties[variable]=default_value
                 self.properties={**properties}
@@ -606,6 +623,18 @@ class Distribution_Function(classes.base_output.LOCUST_output):
                 self.properties={**properties}
                 self.data=read_distribution_function_ASCOT(self.filepath,**properties)
 
+        elif data_format=='particle_list':
+            if not processing.utils.none_check(self.ID,self.LOCUST_output_type,"ERROR: {} cannot read_data() from particle_list - source and template required\n".format(self.ID),properties.get('source',None),properties.get('template',None)):
+
+                self.data_format=data_format
+                source=properties.pop('source')
+                if 'EBASE' not in properties: #default properties settings
+                    properties['EBASE']=properties['template'].properties.get('EBASE',True)
+                self.properties={**properties}
+                self.data=read_distribution_function_particle_list(source,**properties)
+                for key in ['template','equilibrium']: #binning done so do not keep these objects alive
+                    self.properties.pop(key,None)
+
         elif data_format=='IDS':
             if not processing.utils.none_check(self.ID,self.LOCUST_output_type,"ERROR: {} cannot read_data() from IDS - shot and run required\n".format(self.ID),shot,run):
                 
@@ -616,7 +645,7 @@ class Distribution_Function(classes.base_output.LOCUST_output):
                 self.data=read_distribution_function_IDS(self.shot,self.run,**properties)
 
         else:
-            print("ERROR: {} cannot read_data() - please specify a compatible data_format (LOCUST/ASCOT/IDS)\n".format(self.ID))            
+            print("ERROR: {} cannot read_data() - please specify a compatible data_format (LOCUST/ASCOT/IDS/particle_list)\n".format(self.ID))            
 
     def dump_data(self,data_format=None,filename=None,shot=None,run=None,**properties):
         """
@@ -767,7 +796,7 @@ class Distribution_Function(classes.base_output.LOCUST_output):
             if transform is True:
                 dfn_copy=self.transform(axes=axes) #user-supplied axes are checked for validity here
             else:
-                dfn_copy=copy.deepcopy(self)
+                dfn_copy=self.derive()
 
             if vminmax:
                 vmin=vminmax[0]
@@ -872,15 +901,16 @@ class Distribution_Function(classes.base_output.LOCUST_output):
                 Z - [m]^-3
                 V_pitch - [dPitch]^-1  
                 N - total # 
+                options are available for both EBASE and velocity based dfns, see processing.utils.dfn_integrate
             list of indices and slices
         """
 
-        dfn=copy.deepcopy(self) #make deep copy here since functions designed to repeatedly take fresh DFNs would otherwise permanently change it
-
+        dfn=self.derive() #derived object shares data with self as read-only views - arrays are only ever replaced below, never edited in place
 
         #general option
         if len(axes)==dfn['dfn'].ndim: #if user supplies all axes then slice WITHOUT integrating
-            dfn['dfn']=dfn['dfn'][tuple(axes)]
+            dfn['dfn']=dfn['dfn'][tuple(axes)]*processing.utils.dfn_scale(dfn)
+            dfn.data.pop('dfn_scale',None)
             #XXX need to then reset dfn['nV'],dfn['R'],dfn['dfn_index'] etc data here?
 
         else:
@@ -889,136 +919,12 @@ class Distribution_Function(classes.base_output.LOCUST_output):
 
             if dfn['IDFTYP']==1:
 
-                if dfn.properties['EBASE'] is True: #if LOCUST dfn is against energy
-
-                    if axes==['R','Z']:
-                        dfn['dfn']*=dfn['dE']*dfn['dV_pitch'] #integrate
-                        for counter in range(3): #sum
-                            dfn['dfn']=np.sum(dfn['dfn'],axis=0)
-
-                    elif axes==['E','V_pitch']:
-                        #applying real space Jacobian and integrate over toroidal angle
-                        for r in range(len(dfn['R'])):
-                            dfn['dfn'][:,:,:,r,:]*=dfn['R'][r]*2.*constants.pi*dfn['dR']*dfn['dZ']
-                        #then need to integrate over the unwanted coordinates
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #over Z
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #over R
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=0) #over P
-
-                    elif axes==['E']:
-                        #applying real space Jacobian and integrate over toroidal angle
-                        for r in range(len(dfn['R'])):
-                            dfn['dfn'][:,:,:,r,:]*=dfn['R'][r]*2.*constants.pi*dfn['dR']*dfn['dZ']
-                        dfn['dfn']*=dfn['dV_pitch'] #integrate over pitch
-                        
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #sum over Z
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #sum over R
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #sum over V_pitch
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=0) #over P
-
-                    elif axes==['R']:
-                        dfn['dfn']*=dfn['dE']*dfn['dV_pitch'] #integrate
-                        for counter in range(3): #sum over gyrophase, pitch and energy
-                            dfn['dfn']=np.sum(dfn['dfn'],axis=0)
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #sum over Z
-
-                    elif axes==['Z']:
-                        dfn['dfn']*=dfn['dE']*dfn['dV_pitch'] #integrate
-                        for counter in range(3): #sum over gyrophase, pitch and energy
-                            dfn['dfn']=np.sum(dfn['dfn'],axis=0)
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=0) #sum over R
-
-                    elif axes==['V_pitch']:
-                        #applying real space Jacobian and integrate over toroidal angle
-                        for r in range(len(dfn['R'])):
-                            dfn['dfn'][:,:,:,r,:]*=dfn['R'][r]*2.*constants.pi*dfn['dR']*dfn['dZ']*dfn['dE']
-                        #then need to integrate over the unwanted coordinates
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #over Z
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #over R
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=0) #over P
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=0) #over E
-
-                    elif axes==['N']:
-                        #applying full Jacobian and integrate over toroidal angle
-                        for r in range(len(dfn['R'])):
-                            dfn['dfn'][:,:,:,r,:]*=dfn['R'][r]*2.*constants.pi*dfn['dR']*dfn['dZ']*dfn['dV_pitch']*dfn['dE']
-                        for all_axes in range(dfn['dfn'].ndim): #sum over all dimensions
-                            dfn['dfn']=np.sum(dfn['dfn'],axis=0) 
-
-                    #general option
-                    elif len(axes)==dfn['dfn'].ndim: #if user supplies all axes then slice WITHOUT integrating
-                        dfn['dfn']=dfn['dfn'][tuple(axes)]
-                        #XXX need to then reset dfn['nV'],dfn['R'] etc data here?
-                    else:
-                        print("ERROR: dfn_transform given invalid axes argument: {axes} (ID={ID})".format(axes=str(axes),ID=self.ID))
-
-                else: #if LOCUST dfn is against velocity
-
-                    if axes==['R','Z']:
-                        #apply velocity space Jacobian
-                        for v in range(len(dfn['V'])):
-                            dfn['dfn'][:,v,:,:,:]*=dfn['V'][v]**2
-                        dfn['dfn']*=dfn['dV']*dfn['dV_pitch']*dfn['dP']
-
-                        #then need to integrate over the first 3 dimensions which we do not need
-                        for counter in range(3):
-                            dfn['dfn']=np.sum(dfn['dfn'],axis=0) #sum over gyrophase then V then V_pitch
-
-                    elif axes==['E','V_pitch']:
-                        #applying velocity space and gyrophase Jacobian
-                        for v in range(len(dfn['V'])):
-                            dfn['dfn'][:,v,:,:,:]*=dfn['V'][v]
-                        dfn['dfn']*=dfn['dP']*constants.species_charge/(constants.species_mass)
-
-                        #applying real space Jacobian and integrate over toroidal angle
-                        for r in range(len(dfn['R'])):
-                            dfn['dfn'][:,:,:,r,:]*=dfn['R'][r]*2.0*constants.pi*dfn['dR']*dfn['dZ']
-
-                        #then need to integrate over the unwanted coordinates
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=0) #over gyrophase
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #over Z
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #over R
-
-                    elif axes==['E']:
-                        #applying velocity space and gyrophase Jacobian
-                        for v in range(len(dfn['V'])):
-                            dfn['dfn'][:,v,:,:,:]*=dfn['V'][v]
-                        dfn['dfn']*=dfn['dP']*dfn['dV_pitch']*constants.species_charge/(constants.species_mass)
-
-                        #applying real space Jacobian and integrate over toroidal angle
-                        for r in range(len(dfn['R'])):
-                            dfn['dfn'][:,:,:,r,:]*=dfn['R'][r]*2.0*constants.pi*dfn['dR']*dfn['dZ']
-
-                        #then need to integrate over the unwanted coordinates
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=0) #over gyrophase
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #over Z
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #over R
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #over V_pitch
-
-                    elif axes==['R']:
-                        #apply velocity space Jacobian
-                        for v in range(len(dfn['V'])):
-                            dfn['dfn'][:,v,:,:,:]*=dfn['V'][v]**2
-                        dfn['dfn']*=dfn['dV']*dfn['dV_pitch']*dfn['dP']
-
-                        #then need to integrate over the first 3 dimensions which we do not need
-                        for counter in range(3):
-                            dfn['dfn']=np.sum(dfn['dfn'],axis=0) #sum over gyrophase then V then V_pitch
-                        dfn['dfn']=np.sum(dfn['dfn'],axis=-1) #sum over Z
-
-                    elif axes==['N']:
-                        #apply velocity space Jacobian
-                        for v in range(len(dfn['V'])):
-                            dfn['dfn'][:,v,:,:,:]*=dfn['V'][v]**2
-                        dfn['dfn']*=dfn['dV']*dfn['dV_pitch']*dfn['dP']
-
-                        #applying real space Jacobian and integrate over toroidal angle
-                        for r in range(len(dfn['R'])):
-                            dfn['dfn'][:,:,:,r,:]*=dfn['R'][r]*2.0*constants.pi*dfn['dR']*dfn['dZ']
-
-                        #sum over all axes
-                        for all_axes in range(dfn['dfn'].ndim):
-                            dfn['dfn']=np.sum(dfn['dfn'],axis=0)
+                dfn_integrated=processing.utils.dfn_integrate(dfn,axes,EBASE=dfn.properties['EBASE'] is True) #apply Jacobian and integrate in single pass
+                if dfn_integrated is None:
+                    print("ERROR: dfn_transform given invalid axes argument: {axes} (ID={ID})".format(axes=str(axes),ID=self.ID))
+                else:
+                    dfn['dfn']=dfn_integrated
+                    dfn.data.pop('dfn_scale',None) #dfn_integrate applies scale
 
             if dfn['IDFTYP']==3: #assume that each e.g. R dimension has corresponding dR quantity
 
@@ -1055,41 +961,39 @@ class Distribution_Function(classes.base_output.LOCUST_output):
             new_dfn=crop(R=[1]) generates dfn at point closest to R=1
             new_dfn=crop(R=[0,1]) crops dfn between 0<R<1 (sets outside of this=0)
             new_dfn=crop(R=[1,0]) crops dfn between 1<R and R<0 (sets inside of this=0)
+            new_dfn.materialize() to edit cropped dfn in place
         """
 
-        dfn=copy.deepcopy(self)
+        dfn=self.derive() #derived object shares data with self as read-only views, dfn['dfn'] is only copied if values must be zeroed
 
         if not inside:
-            dfn['dfn'][:]=0
+            dfn['dfn']=np.zeros_like(self['dfn'])
 
         for key,value in kwargs.items():
             if key not in dfn['dfn_index']:
                 print("ERROR: crop supplied invalid axis name ({}) - see ['dfn_index'] for possible axes".format(key))    
             else:
                 dimension_to_edit=dfn['dfn_index'].tolist().index(key) #figure out which dimension we are cropping over
+                index=[slice(None)]*dfn['dfn'].ndim
                 if len(value)==2: #user has supplied range - get new indices which satisfy range
                     if value[1]>value[0]: #range is a window - set outside to zero
-                        i=np.any([(value[0]>dfn[key]),(dfn[key]>value[1])],axis=0)
+                        index[dimension_to_edit]=np.any([(value[0]>dfn[key]),(dfn[key]>value[1])],axis=0)
                     else: #range is outside a window - set window to 0
-                        i=np.all([(value[1]<dfn[key]),(dfn[key]<value[0])],axis=0)
+                        index[dimension_to_edit]=np.all([(value[1]<dfn[key]),(dfn[key]<value[0])],axis=0)
                     
-                    dfn['dfn']=np.moveaxis(dfn['dfn'],dimension_to_edit,0) #move desired axis of dfn array to front to crop
+                    dfn.materialize('dfn')
                     if inside: #invert if not inside
-                        dfn['dfn'][i]=0 #crop dfn
+                        dfn['dfn'][tuple(index)]=0 #crop dfn
                     else:
-                        self['dfn']=np.moveaxis(self['dfn'],dimension_to_edit,0)
-                        dfn['dfn'][i]=self['dfn'][i]
-                        self['dfn']=np.moveaxis(self['dfn'],0,dimension_to_edit) 
-                    dfn['dfn']=np.moveaxis(dfn['dfn'],0,dimension_to_edit) #move desired axis of dfn array back to original position                             
+                        dfn['dfn'][tuple(index)]=self['dfn'][tuple(index)]
                 
                 elif len(value)==1: #user has supplied single value for nearest neighbour
-                    i=[np.abs(dfn[key]-value[0]).argmin()]
-                    dfn[key]=dfn[key][i] #crop 1D arrays accordingly
+                    i=np.abs(dfn[key]-value[0]).argmin()
+                    index[dimension_to_edit]=slice(i,i+1) #slice rather than index so dfn remains a view
+                    dfn[key]=dfn[key][i:i+1] #crop 1D arrays accordingly
                     nkey='n{}'.format(key) #reset associated nkey values too e.g. reset nR if cropping R
                     dfn[nkey]=np.array(len(dfn[key]))
-                    dfn['dfn']=np.moveaxis(dfn['dfn'],dimension_to_edit,0) #move desired axis of dfn array to front to crop
-                    dfn['dfn']=dfn['dfn'][i] #crop dfn
-                    dfn['dfn']=np.moveaxis(dfn['dfn'],0,dimension_to_edit) #move desired axis of dfn array back to original position             
+                    dfn['dfn']=dfn['dfn'][tuple(index)] #crop dfn
 
         return dfn
 
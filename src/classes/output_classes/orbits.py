@@ -63,57 +63,132 @@ except:
 
 ################################################################## Orbit read functions
 
-def read_orbits_LOCUST(filepath,number_coords=3,particles=[],**properties):
+def read_orbits_LOCUST(filepath,number_coords=3,particles=[],stream=False,timesteps_per_block=1000,stride=1,t_start=0,t_stop=None,simplify=None,**properties):
     """
     reads orbits stored in LOCUST format - r phi z
 
+    args:
+        number_coords - number of coordinates written per particle per time step
+        particles - list of particle numbers to read, in order of output (defaults to all)
+        stream - if True return generator of input_data dicts holding timesteps_per_block time steps each, so memory is bounded for long orbit files
+        timesteps_per_block - number of time steps converted at once (and held by each streamed dict)
+        stride - only keep every stride'th time step
+        t_start - index of first time step to keep
+        t_stop - index of time step to stop reading at (exclusive) - defaults to all
+        simplify - if set, drop time steps using Ramer-Douglas-Peucker line simplification in R,Z with this tolerance [m]
     notes:
         reads in a headerline for number of particles
         reads in a footerline for number of time steps
+        tokens are converted in bulk one block of time steps at a time and particles selected with a single index
+        'timesteps' holds indices of time steps kept
+        file is only read up to t_stop and time steps outside window/stride are never stored
+        simplify is applied per block of timesteps_per_block time steps (block end points always kept) and keeps any time step needed by any particle, so arrays stay [t,p]
+    usage:
+        input_data=read_orbits_LOCUST(filepath,particles=[0,10])
+        input_data=read_orbits_LOCUST(filepath,stride=10,t_start=1000,t_stop=5000,simplify=1.e-3)
+        for input_data in read_orbits_LOCUST(filepath,stream=True): 
     """
 
     print("reading orbits from LOCUST")
 
-    file=open(filepath)
-    number_timesteps=int(next(processing.utils.reversed_fp_iter(file)))
-    file.close()
-
     with open(filepath) as file:
+        number_timesteps=int(next(processing.utils.reversed_fp_iter(file)))
 
-        input_data={}
-
-        number_particles_total=int(next(file)) #extract number of particles in file
-        particles=particles if particles else list(range(number_particles_total))
-        number_particles_to_read=len(particles) if particles else number_particles_total
-
-        data_array=np.empty(shape=(number_timesteps+1,number_coords,number_particles_to_read))
-        counter=0
-        counter_particle=0
-        counter_coord=0
-        counter_timestep=0
-        while counter<number_timesteps*number_coords*number_particles_total:
-            line=file.readline()
-            if not line: break
-            for number in line.split():
-                if counter_particle in particles:
-                    data_array[counter_timestep,counter_coord,particles.index(counter_particle)]=float(number)
-                
-                counter+=1
-                counter_particle=np.mod(counter,number_particles_total)
-                counter_coord=np.mod(int(counter/number_particles_total),number_coords)
-                counter_timestep=np.mod(int(counter/(number_particles_total*number_coords)),number_timesteps)
-
-        if np.all(data_array[-1,:,:] == 0):
-            data_array=data_array[:-1,:,:]
+    t_stop=number_timesteps if t_stop is None else min(t_stop,number_timesteps)
 
+    def read_blocks():
+        """
+        generates (time step indices, data_array[t,coord,p]) for each block of time steps within window
+        """
 
+        with open(filepath,'rb') as file:
+
+            number_particles_total=int(file.readline()) #extract number of particles in file
+            particles_to_read=np.asarray(particles,dtype=int) if len(particles) else slice(None)
+            number_tokens_timestep=number_coords*number_particles_total
+            number_tokens_block=number_tokens_timestep*timesteps_per_block
+            number_tokens_remaining=t_stop*number_tokens_timestep #ignore footer and time steps after window
+            chunk_bytes=2**24
+
+            tokens=np.empty(0)
+            tail=b''
+            timestep=0
+            while number_tokens_remaining>0:
+                chunk=file.read(chunk_bytes)
+                if chunk:
+                    chunk=tail+chunk
+                    split=max(chunk.rfind(b' '),chunk.rfind(b'\n'),chunk.rfind(b'\t'))+1 #last token may continue into next chunk
+                    chunk,tail=chunk[:split],chunk[split:]
+                else: #end of file
+                    chunk,tail=tail,b''
+                new_tokens=np.fromstring(chunk,sep=' ')[:number_tokens_remaining]
+                number_tokens_remaining-=new_tokens.size
+                tokens=np.concatenate((tokens,new_tokens)) if tokens.size else new_tokens
+                if not chunk: #file is shorter than footer states
+                    number_tokens_remaining=0
+                    tokens=tokens[:tokens.size-tokens.size%number_tokens_timestep]
+
+                number_blocks=tokens.size//number_tokens_block if number_tokens_remaining>0 else int(np.ceil(tokens.size/number_tokens_block))
+                for block in range(number_blocks):
+                    data_block=tokens[block*number_tokens_block:(block+1)*number_tokens_block].reshape(-1,number_coords,number_particles_total)
+                    timesteps=np.arange(timestep,timestep+data_block.shape[0])
+                    timestep+=data_block.shape[0]
+                    keep=(timesteps>=t_start)&((timesteps-t_start)%stride==0)
+                    if not np.any(keep):
+                        continue
+                    data_block=data_block[keep][:,:,particles_to_read]
+                    timesteps=timesteps[keep]
+                    if simplify is not None:
+                        keep=np.zeros(len(timesteps),dtype=bool)
+                        for particle in range(data_block.shape[2]):
+                            keep|=processing.utils.simplify_line(data_block[:,0,particle],data_block[:,2,particle],simplify)
+                        data_block,timesteps=data_block[keep],timesteps[keep]
+                    yield timesteps,data_block
+                tokens=tokens[number_blocks*number_tokens_block:]
+
+        if timestep<t_stop:
+            print("WARNING: read_orbits_LOCUST found {} of {} time steps in file!".format(timestep,number_timesteps))
+
+    def to_input_data(data_array):
+        input_data={}
         variable_names=['R','phi','Z',None,None,None,'mu','P_phi','E','sign']
         for variable_name,index in zip(variable_names,range(number_coords)):
             input_data[variable_name]=data_array[:,index,:]
 
-        input_data['number_particles']=np.asarray(number_particles_to_read)
-        input_data['number_timesteps']=np.asarray(number_timesteps)
+        input_data['number_particles']=np.asarray(data_array.shape[2])
+        input_data['number_timesteps']=np.asarray(data_array.shape[0])
         input_data['X'],input_data['Y']=processing.utils.RphiZ_to_XYZ(input_data['R'],input_data['phi'])
+        return input_data
+
+    if stream:
+        def stream_blocks():
+            for timesteps,data_block in read_blocks():
+                input_data=to_input_data(data_block)
+                input_data['timesteps']=timesteps
+                yield input_data
+            print("finished reading orbits from LOCUST")
+        return stream_blocks()
+
+    if simplify is None: #number of time steps kept is known so fill single array
+        data_array=None
+        timesteps=np.arange(t_start,t_stop,stride)
+        number_timesteps_read=0
+        for timesteps_block,data_block in read_blocks():
+            if data_array is None:
+                data_array=np.empty(shape=(len(timesteps),number_coords,data_block.shape[2]))
+            data_array[number_timesteps_read:number_timesteps_read+data_block.shape[0]]=data_block
+            number_timesteps_read+=data_block.shape[0]
+        data_array=data_array[:number_timesteps_read] if data_array is not None else np.empty(shape=(0,number_coords,len(particles)))
+        timesteps=timesteps[:number_timesteps_read]
+    else:
+        blocks=list(read_blocks())
+        data_array=np.concatenate([data_block for timesteps_block,data_block in blocks]) if blocks else np.empty(shape=(0,number_coords,len(particles)))
+        timesteps=np.concatenate([timesteps_block for timesteps_block,data_block in blocks]) if blocks else np.empty(0,dtype=int)
+
+    input_data=to_input_data(data_array)
+    input_data['timesteps']=timesteps
+    if stride==1 and t_start==0 and t_stop==number_timesteps and simplify is None and data_array.shape[0]==number_timesteps: #complete full read
+        input_data['number_timesteps']=np.asarray(number_timesteps)
            
     print("finished reading orbits from LOCUST")
 
@@ -124,31 +199,38 @@ def read_orbits_ASCOT(filepath,**properties):
     reads orbits stored in ASCOT
 
     notes:
-        reads only one particle
-        optionally read the particle with ID stored in properties['ID'] 
+        reads particles with IDs stored in properties['ID'] - single ID, list of IDs or 'all' (by default reads particle 0)
+        data for particle p at time step t is stored [t,p] in order of requested IDs - particles with fewer time steps are padded with NaN
+        data rows are converted in bulk one chunk of lines at a time in a single pass
+        first read writes a sidecar index (<filename>.index.npz) holding byte range of each run of rows belonging to one particle
+            later reads seek straight to rows of requested particles
+            index is rebuilt if file size or modification time change
+            set properties['index']=False to neither read nor write index
     """
 
     print("reading orbits from ASCOT")
 
-    with open(filepath) as file:
-
-        if 'ID' in properties:
-            ID_desired=properties['ID']
-        else:
-            ID_desired=0 #by default read particle 0
+    ID_desired=properties['ID'] if 'ID' in properties else 0 #by default read particle 0
+    IDs=None if ID_desired=='all' else np.atleast_1d(np.asarray(ID_desired,dtype=int))
+    use_index=properties['index'] if 'index' in properties else True
+    undesired_variables=['rho']
+    chunk_bytes=2**24
+    max_gap_bytes=2**16 #read through gaps smaller than this between requested rows rather than seeking
 
-        undesired_variables=['rho']
+    filepath=pathlib.Path(filepath)
+    index_filepath=filepath.parent / (filepath.name+'.index.npz')
+    file_stat=filepath.stat()
 
-        input_data={} #to store the desired data that is output
-        data_key={} #to tell us which column corresponds to which data field
+    with open(filepath,'rb') as file:
 
         for line in file:
-            if '# Number of different fields for each particle [10 first letters are significant]' in line:
+            if b'# Number of different fields for each particle [10 first letters are significant]' in line:
                 number_of_data_fields=int(line.split()[0])
                 break #now at the point where the data fields are defined
 
+        variables=[] #to tell us which column corresponds to which data field
         for data_field in range(number_of_data_fields):
-            variable=file.readline().split()[0]
+            variable=file.readline().decode().split()[0]
             if variable=='pitch':
                 variable='V_pitch'
             if variable=='z':
@@ -157,26 +239,139 @@ def read_orbits_ASCOT(filepath,**properties):
                 variable='E'
             if variable=='id':
                 variable='ID'
-            input_data[variable]=[]
-            data_key[variable]=int(data_field)
-
-        for variable in undesired_variables: #get rid of data we do not want to read
-            del(data_key[variable])
+            variables.append(variable)
 
         line=file.readline() #read a blank line 
+        data_start=file.tell()
 
-        for line in file:
-            split_line=line.split()
-            if len(split_line)<number_of_data_fields: #reached end of file
-                break
-            elif int(split_line[data_key['ID']])!=ID_desired: #check if this is the particle we care about
-                pass
-            else:
-               for variable_name,field_number in data_key.items():
-                    input_data[variable_name].append(float(split_line[field_number]))
-
-        for variable in input_data:
-            input_data[variable]=np.asarray(input_data[variable])[:,np.newaxis] #add fake axis to match LOCUST format
+    ID_column=variables.index('ID')
+
+    def scan():
+        """
+        single pass over all data rows - returns rows of requested particles and index of runs of rows
+        """
+
+        rows=[]
+        run_IDs,run_starts,run_bytes=[],[],[]
+        with open(filepath,'rb') as file:
+            file.seek(data_start)
+            offset=data_start
+            tail=b''
+            finished=False
+            while not finished:
+                chunk=file.read(chunk_bytes)
+                if chunk:
+                    chunk=tail+chunk
+                    split=chunk.rfind(b'\n')+1 #only convert whole lines
+                    chunk,tail=chunk[:split],chunk[split:]
+                    if not chunk:
+                        continue
+                else: #end of file
+                    chunk,tail,finished=tail,b'',True
+                    if not chunk:
+                        break
+
+                buffer=np.frombuffer(chunk,dtype=np.uint8)
+                line_ends=np.flatnonzero(buffer==ord('\n'))
+                if line_ends.size==0 or line_ends[-1]!=buffer.size-1: #last line may not end in newline
+                    line_ends=np.append(line_ends,buffer.size-1)
+                line_starts=np.concatenate(([0],line_ends[:-1]+1))
+                whitespace=(buffer==ord(' '))|(buffer==ord('\t'))|(buffer==ord('\n'))|(buffer==ord('\r'))
+                token_starts=np.flatnonzero(~whitespace&np.concatenate(([True],whitespace[:-1])))
+                token_ends=np.flatnonzero(~whitespace&np.append(whitespace[1:],True))+1
+                tokens_per_line=np.diff(np.searchsorted(token_starts,np.append(line_starts,buffer.size)))
+                short_lines=np.flatnonzero(tokens_per_line<number_of_data_fields)
+                if short_lines.size: #reached end of file
+                    number_lines=short_lines[0]
+                    finished=True
+                else:
+                    number_lines=line_starts.size
+
+                if number_lines:
+                    ID_tokens=np.searchsorted(token_starts,line_starts[:number_lines])+ID_column #only convert ID field of every line
+                    ID_starts,ID_widths=token_starts[ID_tokens],token_ends[ID_tokens]-token_starts[ID_tokens]
+                    width=int(ID_widths.max())
+                    characters=buffer[np.minimum(ID_starts[:,np.newaxis]+np.arange(width),buffer.size-1)]
+                    characters=np.where(np.arange(width)<ID_widths[:,np.newaxis],characters,ord(' ')).astype(np.uint8)
+                    row_IDs=characters.view('S{}'.format(width)).ravel().astype(float).astype(int)
+
+                    run_first=np.concatenate(([0],np.flatnonzero(np.diff(row_IDs))+1))
+                    run_last=np.append(run_first[1:],number_lines)-1
+                    run_IDs.append(row_IDs[run_first])
+                    run_starts.append(offset+line_starts[run_first])
+                    run_bytes.append(line_ends[run_last]+1-line_starts[run_first])
+
+                    data_bytes=buffer[:line_ends[number_lines-1]+1]
+                    if IDs is not None: #only convert lines of requested particles
+                        data_bytes=data_bytes[np.repeat(np.isin(row_IDs,IDs),line_ends[:number_lines]+1-line_starts[:number_lines])]
+                    rows.append(np.fromstring(data_bytes.tobytes(),sep=' ').reshape(-1,number_of_data_fields))
+
+                offset+=len(chunk)
+
+        index={}
+        index['run_IDs']=np.concatenate(run_IDs) if run_IDs else np.empty(0,dtype=int)
+        index['run_starts']=np.concatenate(run_starts) if run_starts else np.empty(0,dtype=int)
+        index['run_bytes']=np.concatenate(run_bytes) if run_bytes else np.empty(0,dtype=int)
+        return rows,index
+
+    def read_indexed(index):
+        """
+        reads rows of requested particles by seeking to their runs in index 
+        """
+
+        runs=np.arange(index['run_IDs'].size) if IDs is None else np.flatnonzero(np.isin(index['run_IDs'],IDs))
+        if runs.size==0:
+            return []
+        starts=index['run_starts'][runs]
+        ends=starts+index['run_bytes'][runs]
+        new_span=np.flatnonzero(starts[1:]-ends[:-1]>max_gap_bytes)+1 #merge runs separated by small gaps into spans
+        span_starts=starts[np.concatenate(([0],new_span))]
+        span_ends=ends[np.append(new_span,runs.size)-1]
+
+        rows=[]
+        with open(filepath,'rb') as file:
+            for span_start,span_end in zip(span_starts,span_ends):
+                file.seek(span_start)
+                data=np.fromstring(file.read(span_end-span_start),sep=' ').reshape(-1,number_of_data_fields)
+                rows.append(data if IDs is None else data[np.isin(data[:,ID_column].astype(int),IDs)])
+        return rows
+
+    index=None
+    if use_index and index_filepath.is_file():
+        with np.load(index_filepath) as index_file:
+            index={key:index_file[key] for key in index_file.files}
+        if not (index['size']==file_stat.st_size and index['mtime']==file_stat.st_mtime_ns and index['data_start']==data_start):
+            index=None #file has changed
+
+    if index is not None:
+        rows=read_indexed(index)
+    else:
+        rows,index=scan()
+        if use_index:
+            try:
+                with open(index_filepath,'wb') as index_file:
+                    np.savez(index_file,size=file_stat.st_size,mtime=file_stat.st_mtime_ns,data_start=data_start,**index)
+            except OSError:
+                print("WARNING: read_orbits_ASCOT could not write index to {}".format(index_filepath))
+
+    rows=np.concatenate(rows) if rows else np.empty((0,number_of_data_fields))
+    row_IDs=rows[:,ID_column].astype(int)
+    order=np.argsort(row_IDs,kind='stable') #group rows by particle keeping time order
+    rows,row_IDs=rows[order],row_IDs[order]
+    IDs_read=np.unique(row_IDs) if IDs is None else IDs
+    first_rows=np.searchsorted(row_IDs,IDs_read,side='left')
+    number_rows=np.searchsorted(row_IDs,IDs_read,side='right')-first_rows
+    if np.any(number_rows==0):
+        print("WARNING: read_orbits_ASCOT found no data for particles {}".format(IDs_read[number_rows==0]))
+
+    data_array=np.full((int(np.max(number_rows,initial=0)),IDs_read.size,number_of_data_fields),np.nan)
+    for particle,(first_row,number_row) in enumerate(zip(first_rows,number_rows)):
+        data_array[:number_row,particle]=rows[first_row:first_row+number_row]
+
+    input_data={} #to store the desired data that is output
+    for field,variable in enumerate(variables):
+        if variable not in undesired_variables: #get rid of data we do not want to read
+            input_data[variable]=data_array[:,:,field]
 
     print("finished reading orbits from ASCOT")
 
@@ -76,17 +76,53 @@ def read_final_particle_list_LOCUST(filepath,**properties):
         filename typically ptcl_cache.dat
         contains lots of references to process_ptcles.pro, written by Rob Akers
         status_flag describes each particle's final status (guide stored in status_flags, verbose guide in LOCUST/ctrk_mod.f90/ctrk_kernel) 
+        file is streamed in chunks of chunk_size bytes and tokenised straight into numpy - memory is bounded by the size of the returned arrays
+        file is laid out IDL/FORTRAN-style [niter,npt_,nphc,n*ngpu] - every chunk of whole particle records is viewed in this shape without copying and only the requested slots kept
+        only the first phc values are read i.e. phc index = 0
     args:
-        compression - toggle True for large files for efficient processing
-        coordinates - the particle coordinates to read in if compression enabled        
+        coordinates - list of particle coordinates to read in e.g. ['R','Z','dt'] (default all)
+        chunk_size - number of bytes to read from file per chunk
+        lazy - only read header now and stream coordinates from file when first accessed - see classes.base_output.Lazy_Data
     """
 
     print("reading final particle list from LOCUST")
 
-    with open(filepath) as file:
-        
+    coordinates=properties.get('coordinates',None)
+    chunk_size=int(properties.get('chunk_size',2**24))
+
+    indices_coordinate={} #map between quantity and (info slot, first time iteration) in file
+    indices_coordinate['R']=(0,0)
+    indices_coordinate['phi']=(1,0)
+    indices_coordinate['Z']=(2,0)
+    indices_coordinate['V_R']=(3,0)
+    indices_coordinate['V_phi']=(4,0)
+    indices_coordinate['V_Z']=(5,0)
+    indices_coordinate['time']=(6,0)
+    indices_coordinate['dt']=(7,0)
+    indices_coordinate['FG']=(8,0)
+    indices_coordinate['weight']=(8,0)
+    indices_coordinate['tet']=(9,0)
+    indices_coordinate['psi']=(0,1)
+    indices_coordinate['V_R_next']=(1,1)
+    indices_coordinate['V_phi_next']=(2,1)
+    indices_coordinate['V_Z_next']=(3,1)
+    indices_coordinate['R_next']=(4,1)
+    indices_coordinate['phi_next']=(5,1)
+    indices_coordinate['Z_next']=(6,1)
+
+    if coordinates is None:
+        coordinates=list(indices_coordinate.keys())
+    else:
+        coordinates=run_scripts.utils.literal_eval(coordinates) #in case taking command line input and coordinates are string
+        for coordinate in coordinates:
+            if coordinate not in indices_coordinate:
+                print("ERROR: read_final_particle_list_LOCUST() supplied invalid coordinate ({}) - available options = {}!\nreturning\n".format(coordinate,list(indices_coordinate.keys())))
+                return
+
+    with open(filepath,'rb') as file:
+
         try:
-            lines=file.readlines() #return lines as list            
+            header=np.fromstring(file.readline(),dtype=np.float64,sep=' ')
         except:
             raise IOError("ERROR: read_final_particle_list_LOCUST() cannot read from "+str(filepath))
 
@@ -94,7 +130,6 @@ def read_final_particle_list_LOCUST(filepath,**properties):
         input_data={}
 
         #read in headerlines
-        header=lines[0].split()
         n=int(header[0]) 
         ngpu=int(header[1]) #n*ngpu=number of particles
         niter=int(header[2]) #time iterations
@@ -134,42 +169,78 @@ def read_final_particle_list_LOCUST(filepath,**properties):
         input_data['status_flags'][-15.0]='cross_open_face'
         input_data['status_flags'][-16000.0]='bin_fail_hard_2'
         input_data['status_flags'][-99999.]='generic_fail_hard'
-        def status_flags_dispatch(value):
-            try:
-                return input_data['status_flags'][value]
-            except:
-                return 'ok'
-
-        #get rid of white space and completely flatten IDL/FORTRAN-style
-        lines=[[float(number) for number in line.split()] for line in lines]
-        lines=[number for line in lines for number in line]
-        del(lines[0:6])
-        input_data['f']=np.array(lines[-1]) #Pdep/Pabs
-            
-        #transfer chunk from lines to file_buffer and assimilate into dictionary
-        lines=np.array([lines[0:niter*npt_*nphc*(n*ngpu)]]).reshape(niter,npt_,nphc,(n*ngpu),order='F')
-
-        input_data['R']=lines[:,0,0,:].flatten()
-        input_data['phi']=lines[:,1,0,:].flatten()
-        input_data['Z']=lines[:,2,0,:].flatten()
-        input_data['V_R']=lines[:,3,0,:].flatten()
-        input_data['V_phi']=lines[:,4,0,:].flatten()
-        input_data['V_Z']=lines[:,5,0,:].flatten()
-        input_data['time']=lines[:,6,0,:].flatten()
-        input_data['dt']=lines[:,7,0,:].flatten()
-        input_data['FG']=lines[:,8,0,:].flatten()
-        input_data['weight']=lines[:,8,0,:].flatten()
-        input_data['tet']=lines[:,9,0,:].flatten()
-        input_data['psi']=lines[1:,0,0,:].flatten()
-        input_data['V_R_next']=lines[1:,1,0,:].flatten()
-        input_data['V_phi_next']=lines[1:,2,0,:].flatten()
-        input_data['V_Z_next']=lines[1:,3,0,:].flatten()
-        input_data['R_next']=lines[1:,4,0,:].flatten()
-        input_data['phi_next']=lines[1:,5,0,:].flatten()
-        input_data['Z_next']=lines[1:,6,0,:].flatten()
-
-        #calculate some additional things
-        input_data['status_flag']=np.array([status_flags_dispatch(dt) for dt in input_data['dt']])
+
+        if properties.get('lazy',False): #only header is read now - coordinates are streamed from file when first accessed
+            input_data=classes.base_output.Lazy_Data(input_data)
+            def read_coordinates(keys):
+                coordinates=[key for key in keys if key in indices_coordinate]
+                if 'E' in keys:
+                    coordinates+=['V_R','V_phi','V_Z']
+                if 'status_flag' in keys or 'status_flag_names' in keys:
+                    coordinates+=['dt']
+                return read_final_particle_list_LOCUST(filepath,**{**properties,'lazy':False,'coordinates':list(set(coordinates)) or ['R']})
+            keys=coordinates+['f']
+            if 'dt' in coordinates:
+                keys+=['status_flag','status_flag_names']
+            if all([quant in coordinates for quant in ['V_R','V_phi','V_Z']]):
+                keys+=['E']
+            input_data.register(read_coordinates,*keys)
+            return input_data
+
+        number_particles=n*ngpu #number of particle records in file
+        record_length=niter*npt_*nphc #number of values per particle record
+        slots=sorted(set(indices_coordinate[coordinate][0] for coordinate in coordinates)) #info slots we need to keep
+        slot_data={slot:np.empty((niter,number_particles)) for slot in slots} #preallocate output arrays
+
+        values=header[6:] #parsed values not yet assigned to a particle record - header line may run on into data
+        f=values[-1] if values.size else None #Pdep/Pabs is last value in file
+        particle_number=0
+        remainder=b''
+        while True:
+
+            chunk=file.read(chunk_size)
+            if chunk: #only parse up to last whitespace - partial token is carried over to next chunk
+                chunk=remainder+chunk
+                split=max(chunk.rfind(b' '),chunk.rfind(b'\n'))+1
+                chunk,remainder=chunk[:split],chunk[split:]
+            else: #end of file
+                chunk,remainder=remainder,b''
+
+            chunk_values=np.fromstring(chunk,dtype=np.float64,sep=' ')
+            if chunk_values.size:
+                f=chunk_values[-1]
+            values=np.concatenate((values,chunk_values)) if values.size else chunk_values
+
+            number_records=min(values.size//record_length,number_particles-particle_number) #transfer whole particle records from values to output
+            if number_records>0:
+                records=values[:number_records*record_length].reshape(niter,npt_,nphc,number_records,order='F') #view, no copy
+                for slot in slots:
+                    slot_data[slot][:,particle_number:particle_number+number_records]=records[:,slot,0,:]
+                particle_number+=number_records
+                values=values[number_records*record_length:]
+
+            if not chunk and not remainder:
+                break
+
+    if particle_number<number_particles:
+        raise IOError("ERROR: read_final_particle_list_LOCUST() found {} of {} particles in ".format(particle_number,number_particles)+str(filepath))
+
+    input_data['f']=np.array(f)
+
+    for coordinate in coordinates: #first time iteration quantities share memory with slot arrays, subsequent time iteration quantities are copied
+        slot,iteration=indices_coordinate[coordinate]
+        if iteration==0 and coordinate!='weight':
+            input_data[coordinate]=slot_data[slot].reshape(-1)
+        else:
+            input_data[coordinate]=slot_data[slot][iteration:].flatten()
+
+    #calculate some additional things
+    if 'dt' in input_data: #decode status flags in bulk to int8 codes - input_data['status_flag_names'][code] gives name of status, any dt not in status_flags is 'ok'
+        status_flag_values=np.array(sorted(input_data['status_flags'].keys()))
+        input_data['status_flag_names']=np.array([input_data['status_flags'][value] for value in status_flag_values]+['ok'])
+        indices=np.searchsorted(status_flag_values,input_data['dt']).clip(max=len(status_flag_values)-1)
+        input_data['status_flag']=np.where(status_flag_values[indices]==input_data['dt'],indices,len(status_flag_values)).astype(np.int8)
+    if all([quant in input_data for quant in ['V_R','V_phi','V_Z']]):
         input_data['E']=.5*constants.species_mass*(input_data['V_R']**2+input_data['V_phi']**2+input_data['V_Z']**2)/constants.species_charge
 
     print("finished reading final particle list from LOCUST")
@@ -355,6 +426,7 @@ class Final_Particle_List(classes.base_output.LOCUST_output):
 
     notes:
         my_final_particle_list['status_flags'] contains a guide to the values a particle's status flag may contain 
+        LOCUST status flags are stored as int8 codes in my_final_particle_list['status_flag'] with names in my_final_particle_list['status_flag_names'][code] - see status_flag_code()
     """
 
     LOCUST_output_type='final particle list'
@@ -422,6 +494,25 @@ class Final_Particle_List(classes.base_output.LOCUST_output):
         else:
             print("ERROR: {} cannot dump_data() - please specify a compatible data_format (LOCUST/TRANSP)\n".format(self.ID))
 
+    def status_flag_code(self,status):
+        """
+        returns value held in self['status_flag'] by particles with a given status
+
+        notes:
+            LOCUST status flags are categorical codes into self['status_flag_names'], other formats store the status directly
+            returns -1 if status is not a known LOCUST status
+        args:
+            status - status name e.g. 'PFC_intercept_3D' 
+        usage:
+            lost_particles=np.where(my_final_particle_list['status_flag']==my_final_particle_list.status_flag_code('PFC_intercept_3D'))[0]
+        """
+
+        if 'status_flag_names' in self.data:
+            code=np.where(self['status_flag_names']==status)[0]
+            return code[0] if code.size else -1
+        else:
+            return status
+
     def plot(self,grid=False,style='histogram',number_bins=20,fill=True,vminmax=None,axes=['R','Z'],LCFS=False,limiters=False,real_scale=False,status_flags=['PFC_intercept_3D'],weight=False,colmap=settings.cmap_default,colmap_val=np.random.uniform(),colfield='time',line_style=settings.plot_line_style,label='',ax=False,fig=False):
         """
         plot the final particle list
@@ -478,33 +569,22 @@ class Final_Particle_List(classes.base_output.LOCUST_output):
         ndim=len(axes)
         if ndim==1: #plot 1D histograms
 
-            for status in status_flags:
-                p=np.where(self['status_flag']==status)[0] #find the particle indices which have the desired status_flag
-                if weight:
-                    self_binned,self_binned_edges=np.histogram(self[axes[0]][p],bins=number_bins,weights=self['weight'][p])                
-                else:
-                    self_binned,self_binned_edges=np.histogram(self[axes[0]][p],bins=number_bins)
+            histograms=processing.utils.histogram_markers([self[axes[0]]],bins=number_bins,weights=self['weight'] if weight else None,flags=self['status_flag'],flag_values=[self.status_flag_code(status) for status in status_flags],processes=settings.histogram_processes) #bin particles with each desired status_flag in one pass
+            for self_binned,(self_binned_edges,) in histograms:
                 self_binned_centres=(self_binned_edges[:-1]+self_binned_edges[1:])*0.5
                 ax.plot(self_binned_centres,self_binned,color=colmap(colmap_val),label=label,linestyle=line_style)
                 ax.set_xlabel(axes[0])
 
         elif ndim==2: #plot 2D histograms
 
-            for status in status_flags: #XXX THIS MIGHT BE CAUSING THE BUG FOR PLOTTING MULTIPLE STATUS FLAGS, AS AXES COULD BE RESET BETWEEN EACH PLOT
-                p=np.where(self['status_flag']==status)[0] #find the particle indices which have the desired status_flag
+            if style=='histogram': #bin particles with each desired status_flag in one pass - result is cached so replotting is instant
+                histograms=processing.utils.histogram_markers([self[axes[0]],self[axes[1]]],bins=[grid[axes[0]],grid[axes[1]]] if grid is not False else number_bins,weights=self['weight'] if weight else None,flags=self['status_flag'],flag_values=[self.status_flag_code(status) for status in status_flags],processes=settings.histogram_processes)
+
+            for counter,status in enumerate(status_flags): #XXX THIS MIGHT BE CAUSING THE BUG FOR PLOTTING MULTIPLE STATUS FLAGS, AS AXES COULD BE RESET BETWEEN EACH PLOT
                 
                 if style=='histogram':
 
-                    if grid is not False: #bin according to pre-defined grid
-                        if weight:
-                            self_binned,self_binned_x,self_binned_y=np.histogram2d(self[axes[0]][p],self[axes[1]][p],bins=[grid[axes[0]],grid[axes[1]]],weights=self['weight'][p])
-                        else:
-                            self_binned,self_binned_x,self_binned_y=np.histogram2d(self[axes[0]][p],self[axes[1]][p],bins=[grid[axes[0]],grid[axes[1]]])
-                    else:
-                        if weight:
-                            self_binned,self_binned_x,self_binned_y=np.histogram2d(self[axes[0]][p],self[axes[1]][p],bins=number_bins,weights=self['weight'][p])
-                        else:
-                            self_binned,self_binned_x,self_binned_y=np.histogram2d(self[axes[0]][p],self[axes[1]][p],bins=number_bins)
+                    self_binned,(self_binned_x,self_binned_y)=histograms[counter]
 
                     #self_binned_x and self_binned_x are first edges then converted to centres
                     self_binned_x=(self_binned_x[:-1]+self_binned_x[1:])*0.5
@@ -534,6 +614,7 @@ class Final_Particle_List(classes.base_output.LOCUST_output):
                         fig.colorbar(mesh,ax=ax,orientation='horizontal')
                         
                 elif style=='scatter':
+                    p=np.where(self['status_flag']==self.status_flag_code(status))[0] #find the particle indices which have the desired status_flag
                     mesh=ax.scatter(self[axes[0]][p],self[axes[1]][p],c=self[colfield][p],cmap=colmap,marker='x',s=1,label=self.ID)
 
             if axes==['R','Z']:
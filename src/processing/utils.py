@@ -24,6 +24,14 @@ try:
     import copy
     import random
     import os
+    import hashlib
+    import collections
+    import itertools
+    import functools
+    import json
+    import pickle
+    import shutil
+    import tempfile
 except:
     raise ImportError("ERROR: initial modules could not be imported!\nreturning\n")
     sys.exit(1) 
@@ -130,6 +138,266 @@ def fortran_string(number_out,length,decimals=None,exponential=True):
     else:
         print('ERROR: fortran_string() too many decimal places for requested string length!')
 
+def fortran_lines(columns,formats,line_end='\n',chunk_size=100000):
+    """
+    bulk version of fortran_string - generates fixed-width lines of text from columns of numbers
+
+    notes:
+        every column is formatted exactly as fortran_string would format each of its numbers
+        rows are formatted chunk_size at a time by applying one precompiled % format string to the whole chunk
+        generates one string per chunk so pass to file.writelines() to avoid building whole file in memory
+    args:
+        columns - list of 1D arrays or scalars (broadcast to length of arrays) or 2D array [row,column]
+        formats - (length,decimals,exponential) tuple for each column, as fortran_string args, or single tuple for all columns - decimals defaults to None, exponential to True
+        line_end - string appended to each line
+        chunk_size - number of lines formatted at once
+    usage:
+        file.writelines(fortran_lines([R,phi,Z],(14,6))) #write three columns of 14 wide exponentials to 6 decimal places
+        file.writelines(fortran_lines([r,z,0.],[(16,7),(16,7),(4,0,False)]))
+    """
+
+    if isinstance(columns,np.ndarray) and columns.ndim==2:
+        columns=list(columns.T)
+    columns=[np.asarray(column) for column in columns]
+    number_rows=max([column.size for column in columns]+[0])
+    columns=[np.broadcast_to(column.reshape(-1) if column.size==number_rows else column.reshape(-1)[:1],(number_rows,)) for column in columns]
+    if not isinstance(formats[0],(tuple,list)):
+        formats=[formats]*len(columns)
+
+    specifiers=[]
+    line_length=len(line_end)
+    for counter,(column,format) in enumerate(zip(columns,formats)):
+        length,decimals,exponential=(tuple(format)+(None,True)[len(format)-1:])[:3]
+        line_length+=length
+        if decimals is not None:
+            specifiers.append('%{}.{}{}'.format(length,decimals,'e' if exponential is True else 'f'))
+        elif column.dtype.kind in 'iu':
+            specifiers.append('%{}d'.format(length))
+        else: #fortran_string writes str() of non-integers without decimals
+            specifiers.append('%{}s'.format(length))
+            columns[counter]=column.astype(str)
+    line_format=''.join(specifiers)+line_end
+
+    for start in range(0,number_rows,chunk_size):
+        stop=min(start+chunk_size,number_rows)
+        values=tuple(itertools.chain.from_iterable(zip(*[column[start:stop].tolist() for column in columns])))
+        lines=(line_format*(stop-start))%values
+        if len(lines)!=line_length*(stop-start):
+            print('ERROR: fortran_lines() too many decimal places for requested string length!')
+        yield lines
+
+def fortran_numbers(text):
+    """
+    bulk tokeniser for numbers in Fortran-formatted text
+
+    notes:
+        finds same tokens as the original GEQDSK file_numbers() generator written by Ben Dudson (single regular expression pass over whole text)
+        NaNs are read as -0.
+    args:
+        text - string containing numbers
+    returns:
+        1D array of numbers
+    """
+
+    import re
+
+    text=text.replace("NaN","-0.00000e0") #replaces NaNs with 0s
+    pattern=r'[+-]?\d*[\.]?\d+(?:[Ee][+-]?\d+)?' #regular expression to find numbers
+    return np.array(re.findall(pattern,text),dtype=np.float64)
+
+def fortran_block(text,number,width=16):
+    """
+    bulk reader for a block of numbers written in fixed-width Fortran format e.g. GEQDSK 5e16.9
+
+    notes:
+        if the lines holding the first number values are all a whole number of fields wide, the block is sliced into fields and converted in one call
+        this handles run-together negative numbers e.g. 0.1E+01-0.2E+01, NaNs are read as -0.
+        otherwise falls back to fortran_numbers() on the whole text
+    args:
+        text - bytes starting with the block
+        number - number of values in block
+        width - width of each field
+    returns:
+        values - 1D array holding at least number values
+        bytes_read - number of bytes of text consumed 
+    """
+
+    buffer=np.frombuffer(text,dtype=np.uint8)
+    line_ends=np.flatnonzero(buffer==ord('\n'))
+    if line_ends.size==0 or line_ends[-1]!=buffer.size-1: #last line may not end in newline
+        line_ends=np.append(line_ends,buffer.size)
+    line_starts=np.concatenate(([0],line_ends[:-1]+1))
+    line_lengths=line_ends-line_starts
+    line_lengths[line_lengths>0]-=(buffer[(line_ends-1)[line_lengths>0]]==ord('\r')) #ignore carriage returns
+    fields_per_line=line_lengths//width
+    lines_read=int(np.searchsorted(np.cumsum(fields_per_line),number))+1 #lines needed to hold number fields
+
+    if lines_read<=line_ends.size and np.sum(fields_per_line[:lines_read])==number and np.all(line_lengths[:lines_read]%width==0): #block ends on line boundary
+        bytes_read=min(int(line_ends[lines_read-1])+1,buffer.size)
+        block=buffer[:bytes_read]
+        block=block[(block!=ord('\n'))&(block!=ord('\r'))]
+        try:
+            values=block.view('S{}'.format(width)).astype(np.float64)
+            values[np.isnan(values)]=-0.
+            return values,bytes_read
+        except ValueError: #field is not a single number
+            pass
+
+    values=fortran_numbers(text.decode())
+    return values,len(text)
+
+def numeric_rows(text,number_columns):
+    """
+    bulk reader for lines of numbers in ASCII text e.g. data block of a LOCUST perturbation file
+
+    notes:
+        keeps lines holding exactly number_columns whitespace-separated tokens and no letters except exponents - all other lines (headers etc.) are skipped
+        lines are classified on the raw bytes and kept lines are converted with a single tokeniser call
+    args:
+        text - bytes holding whole lines
+        number_columns - number of numbers in each data line
+    returns:
+        2D array [row,column]
+    """
+
+    buffer=np.frombuffer(text,dtype=np.uint8)
+    if buffer.size==0:
+        return np.empty((0,number_columns))
+    line_ends=np.flatnonzero(buffer==ord('\n'))
+    if line_ends.size==0 or line_ends[-1]!=buffer.size-1: #last line may not end in newline
+        line_ends=np.append(line_ends,buffer.size-1)
+    line_bounds=np.concatenate(([0],line_ends+1))
+
+    whitespace=buffer<=ord(' ') #spaces, tabs, line ends
+    token_starts=np.flatnonzero(~whitespace[1:]&whitespace[:-1])+1
+    if not whitespace[0]:
+        token_starts=np.concatenate(([0],token_starts))
+    tokens_per_line=np.diff(np.searchsorted(token_starts,line_bounds))
+    lower_case=buffer|0x20
+    letters=np.flatnonzero(((lower_case-np.uint8(ord('a')))<26)&(lower_case!=ord('e'))) #uint8 subtraction wraps so only letters are <26
+    letters_per_line=np.diff(np.searchsorted(letters,line_bounds))
+
+    data_lines=(tokens_per_line==number_columns)&(letters_per_line==0)
+    data_bytes=buffer if np.all(data_lines) else buffer[np.repeat(data_lines,np.diff(line_bounds))]
+    return np.fromstring(data_bytes.tobytes(),sep=' ').reshape(-1,number_columns)
+
+def fortran_record_index(file,number_records,header_dtype=np.uint32):
+    """
+    scans record markers of unformatted sequential fortran file without reading record contents
+
+    args:
+        file - binary file object positioned at start of first record to index
+        number_records - number of consecutive records to index
+        header_dtype - dtype of record markers (matches scipy.io.FortranFile default)
+    notes:
+        file is left positioned after final indexed record
+    returns:
+        list of (offset,number of bytes) of each record's contents
+    usage:
+        file_binary=open(filepath,'rb')
+        my_fortran_file=scipy.io.FortranFile(file_binary,'r') #FortranFile reads sequentially from file_binary
+        records=fortran_record_index(file_binary,10) #my_fortran_file then continues after these records
+        data=np.memmap(filepath,dtype=np.float32,mode='r',offset=records[0][0],shape=(records[0][1]//4,))
+    """
+
+    header_bytes=np.dtype(header_dtype).itemsize
+    records=[]
+    for record in range(number_records):
+        number_bytes=np.frombuffer(file.read(header_bytes),dtype=header_dtype)
+        if number_bytes.size==0:
+            raise IOError("ERROR: fortran_record_index reached end of file after {} records!\n".format(record))
+        offset=file.tell()
+        file.seek(int(number_bytes[0]),1)
+        if np.frombuffer(file.read(header_bytes),dtype=header_dtype)[0]!=number_bytes[0]:
+            raise IOError("ERROR: fortran_record_index found mismatched record markers at byte {}!\n".format(offset))
+        records.append((offset,int(number_bytes[0])))
+
+    return records
+
+def read_GEQDSK(filepath):
+    """
+    reads contents of a G-EQDSK-formatted file
+
+    notes:
+        shared by equilibrium and wall readers
+        main 5e16.9 block is parsed in bulk by fortran_block() and sliced by offset, remaining boundary data is tokenised by fortran_numbers()
+        does not apply any LOCUST flag transformations or calculate additional data
+    args:
+        filepath - full path to file
+    """
+
+    input_data={}
+
+    with open(filepath,'rb') as file: #open file
+        line=file.readline().decode() #first line should be case, id number and dimensions
+        text=file.read() #remaining numbers
+
+    if not line:
+        raise IOError("ERROR: read_GEQDSK() cannot read from "+str(filepath))
+
+    #extract case, id number and dimensions 
+    conts=line.split() #split by white space (no argument in .split())
+    if len(conts[-1])>4: #dimensions >999 can run together - read trailing 3i4 fields instead
+        dimensions=line.rstrip('\r\n')[-12:]
+        conts=conts[:-1]+[dimensions[0:4],dimensions[4:8],dimensions[8:12]]
+    input_data['nZ_1D']=np.asarray(int(conts[-1])) #same as nyefit or height dimension
+    input_data['nR_1D']=np.asarray(int(conts[-2])) #same as nxefit or width dimension
+    input_data['idum']=np.asarray(int(conts[-3]))
+    nR_1D=int(input_data['nR_1D'])
+    nZ_1D=int(input_data['nZ_1D'])
+
+    float_keys=[
+    'rdim','zdim','rcentr','rleft','zmid',
+    'rmaxis','zmaxis','simag','sibry','bcentr',
+    'current','simag','xdum','rmaxis','xdum',
+    'zmaxis','xdum','sibry','xdum','xdum']
+
+    #parse main block of 0D floats, fpol, pres, ffprime, pprime, psirz and qpsi
+    number_block=len(float_keys)+5*nR_1D+nR_1D*nZ_1D
+    values,bytes_read=fortran_block(text,number_block)
+    if bytes_read<len(text): #boundary data still to parse
+        values=np.concatenate((values,fortran_numbers(text[bytes_read:].decode())))
+
+    for counter,key in enumerate(float_keys):
+        input_data[key]=np.asarray(values[counter])
+    offset=len(float_keys)
+
+    for key in ['fpol','pres','ffprime','pprime']: #remember nR_1D holds width, nZ_1D holds height
+        input_data[key]=values[offset:offset+nR_1D].copy()
+        offset+=nR_1D
+    input_data['psirz']=values[offset:offset+nR_1D*nZ_1D].reshape(nR_1D,nZ_1D,order='F').copy() #stored psirz[:,0],psirz[:,1]...
+    offset+=nR_1D*nZ_1D
+    input_data['qpsi']=values[offset:offset+nR_1D].copy()
+    offset+=nR_1D
+
+    #now deal with boundaries
+    if offset+2>len(values):
+        raise IOError("ERROR: read_GEQDSK() found too few values in "+str(filepath))
+    input_data['lcfs_n']=np.array(int(values[offset]))
+    input_data['limitr']=np.array(int(values[offset+1]))
+    offset+=2
+    nb,nl=int(input_data['lcfs_n']),int(input_data['limitr'])
+
+    if offset+2*(max(nb,0)+max(nl,0))>len(values): #check we have all boundary data
+        raise IOError("ERROR: read_GEQDSK() found too few values in "+str(filepath))
+
+    if nb>0: #read in boundaries as R,Z pairs
+        input_data['lcfs_r']=values[offset:offset+2*nb:2].copy()
+        input_data['lcfs_z']=values[offset+1:offset+2*nb:2].copy()
+        offset+=2*nb
+    else:
+        input_data['lcfs_r']=np.array(0)
+        input_data['lcfs_z']=np.array(0)
+
+    if nl>0: #read in limiters
+        input_data['rlim']=values[offset:offset+2*nl:2].copy()
+        input_data['zlim']=values[offset+1:offset+2*nl:2].copy()
+    else:
+        input_data['rlim']=np.array(0)
+        input_data['zlim']=np.array(0)
+
+    return input_data
+
 def sort_arrays(main_array,*args):
     """
     sort an arbitrary number of arrays in parallel (*args) according to main_array
@@ -181,7 +449,365 @@ def minor_radius(R_major,R,Z,Z_major=0.):
 
     return np.sqrt((R-R_major)**2+(Z-Z_major)**2) 
 
-def interpolate_2D(X_axis,Y_axis,Z_grid,function='multiquadric',type='RBS',smooth=0,rect_grid=True):
+def simplify_line(x,y,tolerance):
+    """
+    simplifies a line with the Ramer-Douglas-Peucker algorithm
+
+    notes:
+        returns mask of points to keep - end points are always kept
+        perpendicular distances of each section from its chord are calculated in one vectorised call
+        closed sections (start and end at same point) use distance from the start point
+    args:
+        x - 1D array of x coordinates
+        y - 1D array of y coordinates
+        tolerance - maximum distance of discarded points from simplified line
+    usage:
+        keep=simplify_line(R,Z,tolerance=1.e-3)
+        R,Z=R[keep],Z[keep]
+    """
+
+    x,y=np.asarray(x,dtype=float),np.asarray(y,dtype=float)
+    keep=np.zeros(x.size,dtype=bool)
+    if x.size==0:
+        return keep
+    keep[[0,-1]]=True
+
+    sections=[(0,x.size-1)]
+    while sections:
+        start,stop=sections.pop()
+        if stop-start<2:
+            continue
+        dx,dy=x[stop]-x[start],y[stop]-y[start]
+        length=np.hypot(dx,dy)
+        x_section,y_section=x[start+1:stop]-x[start],y[start+1:stop]-y[start]
+        distances=np.abs(dx*y_section-dy*x_section)/length if length>0. else np.hypot(x_section,y_section)
+        furthest=int(np.argmax(distances))
+        if distances[furthest]>tolerance:
+            index=start+1+furthest
+            keep[index]=True
+            sections.extend([(start,index),(index,stop)])
+
+    return keep
+
+def file_checksum(filepath,chunk_size=2**24):
+    """
+    returns blake2b checksum of file contents, None if filepath is not a file
+
+    args:
+        chunk_size - number of bytes hashed at once
+    """
+
+    filepath=pathlib.Path(filepath)
+    if not filepath.is_file():
+        return None
+    checksum=hashlib.blake2b()
+    with open(filepath,'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size),b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+def dump_LOCUST_IO_cache(some_object,filepath):
+    """
+    writes LOCUST_IO object to LOCUST_IO_cache directory of raw .npy arrays
+
+    notes:
+        metadata.json holds ID, object type, source data_format/filename/shot/run, properties and size, mtime and checksum of source file
+        any other instance attributes set by read_data e.g. Perturbation.mode_number are pickled to objects.pickle
+        numeric arrays are stored one per .npy file so they can be memory-mapped on load, everything else (e.g. nested dicts) is pickled to objects.pickle
+        directory is written next to filepath then moved into place so a partially written cache is never read
+        lazily read fields are loaded before writing
+    args:
+        some_object - LOCUST_input or LOCUST_output object
+        filepath - path to cache directory
+    """
+
+    filepath=pathlib.Path(filepath)
+    source=pathlib.Path(some_object.filepath) if getattr(some_object,'filepath',None) is not None else None
+    metadata={
+        'LOCUST_IO_cache_version':1,
+        'type':getattr(some_object,'LOCUST_input_type',getattr(some_object,'LOCUST_output_type',None)),
+        'ID':str(some_object.ID),
+        'data_format':getattr(some_object,'data_format',None),
+        'filename':str(some_object.filename) if getattr(some_object,'filename',None) is not None else None,
+        'filepath':str(source) if source is not None else None,
+        'shot':getattr(some_object,'shot',None),
+        'run':getattr(some_object,'run',None),
+        'properties':{str(key):repr(value) for key,value in getattr(some_object,'properties',{}).items()}, #human readable - exact properties are pickled
+        'source':None,
+        'arrays':{},
+        }
+    if source is not None and source.exists():
+        status=source.stat()
+        metadata['source']={'size':status.st_size,'mtime':status.st_mtime,'checksum':file_checksum(source)}
+
+    filepath.parent.mkdir(parents=True,exist_ok=True)
+    directory=pathlib.Path(tempfile.mkdtemp(prefix=filepath.name+'.',dir=filepath.parent))
+    try:
+        objects={}
+        for counter,key in enumerate(some_object.data.keys()):
+            value=some_object.data[key]
+            if isinstance(value,np.ndarray) and not value.dtype.hasobject:
+                metadata['arrays'][str(counter)]=key
+                np.save(directory / '{}.npy'.format(counter),value,allow_pickle=False)
+            else:
+                objects[key]=value
+        try:
+            properties=pickle.dumps(getattr(some_object,'properties',{}))
+        except: #e.g. properties holding open files - keep readable summary in metadata only
+            properties=None
+        attributes={}
+        for attribute,value in vars(some_object).items():
+            if attribute not in ['ID','data','properties','data_format','filename','filepath','shot','run']:
+                try:
+                    attributes[attribute]=pickle.dumps(value)
+                except:
+                    print("WARNING: dump_LOCUST_IO_cache() cannot store attribute {} of {}".format(attribute,some_object.ID))
+        with open(directory / 'objects.pickle','wb') as file:
+            pickle.dump({'data':objects,'properties':properties,'keys':list(some_object.data.keys()),'attributes':attributes},file)
+        with open(directory / 'metadata.json','w') as file:
+            json.dump(metadata,file,indent=1,default=str)
+        if filepath.exists():
+            shutil.rmtree(filepath)
+        os.replace(directory,filepath)
+    except:
+        shutil.rmtree(directory,ignore_errors=True)
+        raise
+
+def read_LOCUST_IO_cache(filepath,mmap=True):
+    """
+    reads LOCUST_IO_cache directory written by dump_LOCUST_IO_cache
+
+    args:
+        filepath - path to cache directory
+        mmap - toggle memory-mapping arrays copy-on-write - arrays are writeable but edits never reach the file
+    returns:
+        metadata,data,properties
+    notes:
+        other instance attributes stored by dump_LOCUST_IO_cache are returned in metadata['attributes']
+    """
+
+    filepath=pathlib.Path(filepath)
+    try:
+        with open(filepath / 'metadata.json') as file:
+            metadata=json.load(file)
+        with open(filepath / 'objects.pickle','rb') as file:
+            objects=pickle.load(file)
+    except:
+        raise IOError("ERROR: read_LOCUST_IO_cache() cannot read from "+str(filepath))
+
+    arrays={}
+    for counter,key in metadata['arrays'].items():
+        try:
+            arrays[key]=np.load(filepath / '{}.npy'.format(counter),mmap_mode='c' if mmap else None,allow_pickle=False)
+        except ValueError: #empty arrays cannot be mapped
+            arrays[key]=np.load(filepath / '{}.npy'.format(counter),allow_pickle=False)
+
+    data={key:arrays[key] if key in arrays else objects['data'][key] for key in objects['keys']} #restore original order
+    properties=pickle.loads(objects['properties']) if objects['properties'] is not None else {}
+    metadata['attributes']={attribute:pickle.loads(value) for attribute,value in objects.get('attributes',{}).items()}
+
+    return metadata,data,properties
+
+def LOCUST_IO_cache_path(some_object,data_format,filepath,shot,run,**properties):
+    """
+    returns path to read-through cache of object read from source file with given settings
+
+    notes:
+        caches are stored in support.dir_cache_files/LOCUST_IO_cache named after a hash of object type, data_format, resolved source path and properties
+    """
+
+    settings_read=repr((type(some_object).__name__,data_format,str(pathlib.Path(filepath).resolve()),shot,run,sorted((key,repr(value)) for key,value in properties.items() if key!='LOCUST_IO_cache')))
+    return support.dir_cache_files / 'LOCUST_IO_cache' / '{}_{}'.format(pathlib.Path(filepath).name,hashlib.blake2b(settings_read.encode(),digest_size=16).hexdigest())
+
+def LOCUST_IO_cache_read_data(read_data,directory):
+    """
+    wraps read_data method of LOCUST_IO class to add LOCUST_IO_cache data_format and read-through caching
+
+    notes:
+        data_format='LOCUST_IO_cache' reads cache directory written by dump_data(data_format='LOCUST_IO_cache') - object is restored as originally read
+        any other data_format with properties['LOCUST_IO_cache']=True reads through cache - cache is used if size and mtime of source file are unchanged since it was written, otherwise source is read and cache rewritten
+        read_data is called as normal otherwise
+    args:
+        read_data - read_data method to wrap
+        directory - directory holding files for this type of object e.g. support.dir_input_files
+    usage:
+        my_particle_list=Final_Particle_List(ID='',data_format='LOCUST',filename='ptcl_cache.dat',LOCUST_IO_cache=True) #first read parses file, later reads are memory-mapped
+    """
+
+    def restore(self,metadata,data,properties):
+        self.data_format=metadata['data_format']
+        self.filename=metadata['filename']
+        self.filepath=pathlib.Path(metadata['filepath']) if metadata['filepath'] is not None else None
+        for attribute in ['shot','run']:
+            if metadata[attribute] is not None:
+                setattr(self,attribute,metadata[attribute])
+        for attribute,value in metadata.get('attributes',{}).items(): #e.g. Perturbation.mode_number
+            setattr(self,attribute,value)
+        self.properties=properties
+        self.data=data
+
+    @functools.wraps(read_data)
+    def wrapper(self,data_format=None,filename=None,shot=None,run=None,**properties):
+
+        if data_format=='LOCUST_IO_cache':
+            if not none_check(self.ID,type(self).__name__,"ERROR: {} cannot read_data() from LOCUST_IO_cache - filename required\n".format(self.ID),filename):
+                restore(self,*read_LOCUST_IO_cache(directory / filename))
+
+        elif properties.get('LOCUST_IO_cache',False) and filename is not None and (directory / filename).exists():
+            filepath=directory / filename
+            cache=LOCUST_IO_cache_path(self,data_format,filepath,shot,run,**properties)
+            status=filepath.stat()
+            try:
+                metadata,data,cache_properties=read_LOCUST_IO_cache(cache)
+                if metadata['source'] is None or metadata['source']['size']!=status.st_size or metadata['source']['mtime']!=status.st_mtime:
+                    raise IOError("ERROR: LOCUST_IO_cache out of date")
+                restore(self,metadata,data,cache_properties)
+            except IOError: #missing or stale cache
+                read_data(self,data_format,filename,shot,run,**properties)
+                dump_LOCUST_IO_cache(self,cache)
+
+        else:
+            return read_data(self,data_format,filename,shot,run,**properties)
+
+    wrapper.LOCUST_IO_cache=True
+    return wrapper
+
+def LOCUST_IO_cache_dump_data(dump_data,directory):
+    """
+    wraps dump_data method of LOCUST_IO class to add LOCUST_IO_cache data_format - see dump_LOCUST_IO_cache
+
+    args:
+        dump_data - dump_data method to wrap
+        directory - directory holding files for this type of object e.g. support.dir_input_files
+    usage:
+        my_equilibrium.dump_data(data_format='LOCUST_IO_cache',filename='my_equilibrium_cache')
+    """
+
+    @functools.wraps(dump_data)
+    def wrapper(self,data_format=None,filename=None,shot=None,run=None,**properties):
+
+        if data_format=='LOCUST_IO_cache':
+            if not none_check(self.ID,type(self).__name__,"ERROR: {} cannot dump_data() to LOCUST_IO_cache - filename required\n".format(self.ID),filename):
+                dump_LOCUST_IO_cache(self,directory / filename)
+        else:
+            return dump_data(self,data_format,filename,shot,run,**properties)
+
+    wrapper.LOCUST_IO_cache=True
+    return wrapper
+
+class Interpolator_Cache:
+    """
+    least-recently-used store of interpolators shared between all LOCUST_IO objects
+
+    self.interpolators          ordered dictionary of cached interpolators, most recently used last
+    self.size                   maximum memory held by cached interpolators [bytes]
+    self.hits                   number of requests served from cache
+    self.misses                 number of requests which required a new interpolator
+    self.evictions              number of interpolators dropped to stay within self.size
+
+    notes:
+        entries are keyed on identity and content hash of the grid axes and data so in-place changes to arrays are also picked up
+        LOCUST_input/LOCUST_output.__setitem__ call invalidate() on any array they replace
+    usage:
+        interpolator_cache.stats() to return hit/miss/eviction counters
+        interpolator_cache.clear() to empty the cache
+    """
+
+    def __init__(self,size=settings.interpolator_cache_size):
+
+        self.interpolators=collections.OrderedDict()
+        self.memory={}
+        self.sources={}
+        self.size=size
+        self.hits=0
+        self.misses=0
+        self.evictions=0
+
+    def __len__(self):
+
+        return len(self.interpolators)
+
+    def key(self,*arrays,**options):
+        """
+        generate cache key from identity and content hash of arrays and any interpolator settings
+        """
+
+        hashes=[]
+        for array in arrays:
+            array=np.ascontiguousarray(array)
+            hashes.append((array.shape,array.dtype.str,hashlib.blake2b(array.view(np.uint8).ravel(),digest_size=16).hexdigest()))
+        return tuple(id(array) for array in arrays),tuple(hashes),tuple(sorted(options.items()))
+
+    def get(self,key,generate):
+        """
+        return interpolator stored against key, calling generate() to build and store it if missing
+        """
+
+        if key in self.interpolators:
+            self.hits+=1
+            self.interpolators.move_to_end(key)
+            return self.interpolators[key]
+
+        self.misses+=1
+        interpolator=generate()
+        if isinstance(interpolator,np.ndarray):
+            memory=interpolator.nbytes
+        else:
+            if isinstance(interpolator,(list,tuple)): #e.g. histograms and their edges
+                attributes=list(itertools.chain.from_iterable(value if isinstance(value,(list,tuple)) else [value] for value in interpolator))
+            else:
+                attributes=list(vars(interpolator).values()) if hasattr(interpolator,'__dict__') else [getattr(interpolator,attribute,None) for attribute in ['data','indices']] #extension types e.g. cKDTree have no __dict__
+            memory=sum(value.nbytes for value in attributes+list(getattr(interpolator,'tck',[])) if isinstance(value,np.ndarray))
+        self.interpolators[key]=interpolator
+        self.memory[key]=memory
+        self.sources[key]=key[0]
+        while sum(self.memory.values())>self.size and len(self.interpolators)>1: #always keep the newest entry
+            self.remove(next(iter(self.interpolators)))
+            self.evictions+=1
+        return interpolator
+
+    def remove(self,key):
+        """
+        drop single entry from cache
+        """
+
+        del(self.interpolators[key])
+        del(self.memory[key])
+        del(self.sources[key])
+
+    def invalidate(self,array):
+        """
+        drop all entries generated using array
+        """
+
+        for key in [key for key,sources in self.sources.items() if id(array) in sources]:
+            self.remove(key)
+
+    def clear(self):
+        """
+        drop all entries and reset counters
+        """
+
+        self.interpolators.clear()
+        self.memory.clear()
+        self.sources.clear()
+        self.hits=0
+        self.misses=0
+        self.evictions=0
+
+    def stats(self):
+        """
+        return dictionary of cache counters
+        """
+
+        return {'hits':self.hits,'misses':self.misses,'evictions':self.evictions,'entries':len(self.interpolators),'memory':sum(self.memory.values())}
+
+interpolator_cache=Interpolator_Cache()
+LCFS_mask_cache=Interpolator_Cache() #holds rasterised LCFS masks, see LCFS_mask
+histogram_cache=Interpolator_Cache() #holds marker histograms, see histogram_markers
+mesh_tree_cache=Interpolator_Cache() #holds nearest-neighbour trees of irregular dfn meshes, see get_dfn_point
+
+def interpolate_2D(X_axis,Y_axis,Z_grid,function='multiquadric',type='RBS',smooth=0,rect_grid=True,cache=True):
     """
     generate a 2D grid interpolator
 
@@ -191,6 +817,7 @@ def interpolate_2D(X_axis,Y_axis,Z_grid,function='multiquadric',type='RBS',smoot
             - high memory overhead, most accurate
         RBS - https://docs.scipy.org/doc/scipy/reference/generated/scipy.interpolate.RectBivariateSpline.html#scipy.interpolate.RectBivariateSpline
               https://scipython.com/book/chapter-8-scipy/examples/two-dimensional-interpolation-with-scipyinterpolaterectbivariatespline/
+        interpolators are stored in interpolator_cache so repeated calls with the same arrays do not refit
     args:
         X_axis - 1D x-axis
         Y_axis - 1D y-axis
@@ -199,6 +826,7 @@ def interpolate_2D(X_axis,Y_axis,Z_grid,function='multiquadric',type='RBS',smoot
         type - name of interpolation function to use
         smooth - level of smoothing
         rect_grid - toggle whether X_axis, Y_axis are regular rectangular grid edges or arbitrary cordinates 
+        cache - toggle whether to use interpolator_cache
     usage:
         my_interpolator=interpolate_2D(X_axis,Y_axis,data)
         interpolated_value=my_interpolator(x,y) #may need to convert to float or take first array value here
@@ -210,17 +838,26 @@ def interpolate_2D(X_axis,Y_axis,Z_grid,function='multiquadric',type='RBS',smoot
         raise ImportError("ERROR: interpolate_2D could not import scipy.interpolate module!\nreturning\n")
         return
 
-    if type=='RBF':
-        if rect_grid:
-            Y_grid,X_grid=np.meshgrid(Y_axis,X_axis) #swap since things are defined r,z 
-        else:
-            Y_grid,X_grid=Y_axis,X_axis
-        interpolator=scipy.interpolate.Rbf(X_grid,Y_grid,Z_grid,function=function,smooth=smooth)
-    
-    elif type=='RBS':
-        interpolator=scipy.interpolate.RectBivariateSpline(X_axis,Y_axis,Z_grid) #normally order is other way in RBS but I have swapped my axes
+    def generate():
+        if type=='RBF':
+            if rect_grid:
+                Y_grid,X_grid=np.meshgrid(Y_axis,X_axis) #swap since things are defined r,z 
+            else:
+                Y_grid,X_grid=Y_axis,X_axis
+            interpolator=scipy.interpolate.Rbf(X_grid,Y_grid,Z_grid,function=function,smooth=smooth)
+        
+        elif type=='RBS':
+            interpolator=scipy.interpolate.RectBivariateSpline(X_axis,Y_axis,Z_grid) #normally order is other way in RBS but I have swapped my axes
 
-    return interpolator
+        return interpolator
+
+    if not cache:
+        return generate()
+
+    if type=='RBS': #RBS does not use these settings so do not let them split the cache
+        function,smooth,rect_grid=None,None,None
+
+    return interpolator_cache.get(interpolator_cache.key(X_axis,Y_axis,Z_grid,function=function,type=type,smooth=smooth,rect_grid=rect_grid),generate)
 
 def interpolate_1D(X_axis,Y_axis,function='cubic',type='interp1d',smooth=0):
     """
@@ -310,7 +947,7 @@ def V_RphiZ_to_V_XYZ(phi,V_R,V_phi):
 
     return V_X,V_Y
 
-def value_at_RZ(R,Z,quantity,grid):
+def value_at_RZ(R,Z,quantity,grid,rect_grid=False):
     """
     generic function to interpolate value of 2D quantity at position R,Z
 
@@ -319,42 +956,61 @@ def value_at_RZ(R,Z,quantity,grid):
         Z - list of Z coordinates
         quantity - 2D quantity
         grid - quantity is stored on rectangular axes defined by grid['R_1D'] and grid['Z_1D']
+        rect_grid - toggle whether R,Z are treated as paired points or as the axes of a rectangular grid to evaluate quantity over
     notes:
+        if rect_grid then R,Z must be strictly ascending and returned values are ordered [r,z]
+    usage:
+        values=value_at_RZ(R=[1,2,3],Z=[0,0,0],quantity=equilibrium['psirz'],grid=equilibrium) #returns 3 values
+        values=value_at_RZ(R=dfn['R'],Z=dfn['Z'],quantity=equilibrium['psirz'],grid=equilibrium,rect_grid=True) #returns len(R)xlen(Z) array 
     """
 
     interpolator=interpolate_2D(grid['R_1D'],grid['Z_1D'],quantity,function='linear')
-    value_at_coordinate=[]
-
-    for r,z in zip(R,Z): #do element-wise to avoid implicitly interpolating 2x1D arrays onto a single 2D grid
-        rz_point=interpolator(r,z)
-        value_at_coordinate.append(np.squeeze(rz_point))
 
-    return np.asarray(value_at_coordinate)
+    R=np.asarray(R,dtype=float).ravel()
+    Z=np.asarray(Z,dtype=float).ravel()
+    if rect_grid:
+        return interpolator(R,Z)
+    else:
+        return interpolator.ev(R,Z) #evaluate element-wise to avoid implicitly interpolating 2x1D arrays onto a single 2D grid
 
-def flux_func_to_RZ(psi,quantity,equilibrium):
+def flux_func_to_RZ(psi,quantity,equilibrium,type='linear',fill_value=None):
     """
     maps 1D flux function onto a 2D RZ grid equilibrium
 
     notes:
         assumes psi is consistent between psi, quantity and equilibrium i.e all against normalised poloidal flux, or Wb/rad etc.
         psi is measured against equilibrium['psirz']
+        grid points with psirz outside the range of psi take the value of quantity at the nearest end of psi
     args:
         psi - 1D poloidal flux axis 
         quantity - 1D quantity mapped to psi
         equilibrium - equilibrium object with 2D psi grid
+        type - 'linear' for linear interpolation, 'cubic' for cubic spline or 'RBF' for cubic radial basis function
+        fill_value - if not None then grid points outside the LCFS are set to this value e.g. vacuum field
+    usage:
+        fpolrz=flux_func_to_RZ(equilibrium['flux_pol'],equilibrium['fpol'],equilibrium,fill_value=equilibrium['bcentr']*equilibrium['rcentr'])
     """
 
-    interpolator=interpolate_1D(psi,quantity,type='RBF')
-    Z_2D,R_2D=np.meshgrid(equilibrium['Z_1D'],equilibrium['R_1D']) #this way around to order dimensions as [r,z]
-    quantity_2D=copy.deepcopy(R_2D)
+    psi,quantity=sort_arrays(np.asarray(psi,dtype=float),np.asarray(quantity,dtype=float)) #psi may decrease towards the LCFS
+    psirz=np.clip(equilibrium['psirz'],psi[0],psi[-1])
 
-    for r_index in range(len(equilibrium['R_1D'])): #loop over grid, get psi at each point and feed to flux function interpolator
-        for z_index in range(len(equilibrium['Z_1D'])):            
-            quantity_2D[r_index,z_index]=interpolator(equilibrium['psirz'][r_index,z_index])
+    if type=='linear':
+        quantity_2D=np.interp(psirz,psi,quantity)
+    elif type=='cubic':
+        quantity_2D=interpolate_1D(psi,quantity,function='cubic',type='interp1d')(psirz)
+    elif type=='RBF':
+        interpolator=interpolate_1D(psi,quantity,type='RBF')
+        quantity_2D=np.empty(psirz.size)
+        for start in range(0,psirz.size,10000): #RBF evaluation memory scales with number of points x number of nodes
+            quantity_2D[start:start+10000]=interpolator(psirz.ravel()[start:start+10000])
+        quantity_2D=quantity_2D.reshape(psirz.shape)
+
+    if fill_value is not None:
+        quantity_2D[~LCFS_mask(equilibrium,equilibrium)]=fill_value
 
     return quantity_2D
 
-def within_LCFS(R,Z,equilibrium):
+def within_LCFS(R,Z,equilibrium,chunk_size=1000000):
     """
     determines whether R Z points are within LCFS
 
@@ -362,40 +1018,71 @@ def within_LCFS(R,Z,equilibrium):
         R - array of R coordinates at points of interest
         Z - array of Z coordinates at points of interest
         equilibrium - equilibrium object with LCFS
+        chunk_size - number of points to test at once
     notes:
-        assumes LCFS points are monotonic in poloidal angle
+        ray casting test against the polygon defined by equilibrium['lcfs_r'],equilibrium['lcfs_z'] - makes no assumption about the shape of the LCFS
+        for points on a rectangular grid LCFS_mask is faster and cached
     returns:
         True if inside LCFS
         False if outside LCFS
     """
-    distances_point_to_mag_axis=[]
-    pol_angle_points=[]
-    for r,z in zip(R,Z):
-        distances_point_to_mag_axis.append(minor_radius(R=r,R_major=equilibrium['rmaxis'],Z=z,Z_major=equilibrium['zmaxis'])) #translate point to polar coordinates
-        pol_angle_points.append(angle_pol(R=r,R_major=equilibrium['rmaxis'],Z=z,Z_major=equilibrium['zmaxis']))
 
-    distances_point_to_mag_axis=np.asarray(distances_point_to_mag_axis)
-    pol_angle_points=np.asarray(pol_angle_points)
+    R=np.asarray(R,dtype=float).ravel()
+    Z=np.asarray(Z,dtype=float).ravel()
+    within=np.zeros(R.size,dtype=bool)
 
-    minor_rad_LCFS=[] #calculate translate LCFS to polar coordinates 
-    pol_angle_LCFS=[] 
-    for r,z in zip(equilibrium['lcfs_r'],equilibrium['lcfs_z']): 
-        minor_rad_LCFS.append(minor_radius(R=r,R_major=equilibrium['rmaxis'],Z=z,Z_major=equilibrium['zmaxis']))
-        pol_angle_LCFS.append(angle_pol(R=r,R_major=equilibrium['rmaxis'],Z=z,Z_major=equilibrium['zmaxis']))
-    pol_angle_LCFS,minor_rad_LCFS=np.asarray(pol_angle_LCFS),np.asarray(minor_rad_LCFS)
+    R_1,Z_1=np.asarray(equilibrium['lcfs_r'],dtype=float),np.asarray(equilibrium['lcfs_z'],dtype=float) #polygon edges run from point 1 to point 2
+    R_2,Z_2=np.roll(R_1,-1),np.roll(Z_1,-1)
+    candidates=np.where((R>=R_1.min())&(R<=R_1.max())&(Z>=Z_1.min())&(Z<=Z_1.max()))[0] #only test points within bounding box of full polygon
+    not_flat=Z_1!=Z_2 #horizontal edges can never be crossed by horizontal ray
+    R_1,Z_1,R_2,Z_2=R_1[not_flat],Z_1[not_flat],R_2[not_flat],Z_2[not_flat]
+    gradients=(R_2-R_1)/(Z_2-Z_1)
 
-    pol_angle_LCFS[pol_angle_LCFS<0]=2.*np.pi+pol_angle_LCFS[pol_angle_LCFS<0] #modulo angles
-    pol_angle_LCFS,minor_rad_LCFS=sort_arrays(pol_angle_LCFS,minor_rad_LCFS)
-    pol_angle_LCFS=np.concatenate(([pol_angle_LCFS[-1]-2.*np.pi],pol_angle_LCFS,[pol_angle_LCFS[0]+2.*np.pi])) #wrap around arrays for values that lie between last and first poloidal angle
-    minor_rad_LCFS=np.concatenate(([minor_rad_LCFS[-1]],minor_rad_LCFS,[minor_rad_LCFS[0]]))
+    for start in range(0,candidates.size,int(chunk_size)):
+        chunk=candidates[start:start+int(chunk_size)]
+        R_chunk,Z_chunk=R[chunk],Z[chunk]
+        crossings=np.zeros(chunk.size,dtype=bool)
+        for r_1,z_1,z_2,gradient in zip(R_1,Z_1,Z_2,gradients): #count crossings of ray cast from each point in +R direction
+            crossings^=((z_1>Z_chunk)!=(z_2>Z_chunk))&(R_chunk<r_1+(Z_chunk-z_1)*gradient)
+        within[chunk]=crossings #odd number of crossings means inside
 
-    interpolator_LCFS=interpolate_1D(pol_angle_LCFS,minor_rad_LCFS,function='linear',type='interp1d') #generate polar coordinate interpolator of LCFS
-    
-    distances_LCFS_to_mag_axis=[]
-    for pol_angle_point in pol_angle_points:
-        distances_LCFS_to_mag_axis.append(interpolator_LCFS(pol_angle_point)) #find radius of LCFS radius at that polar angle 
+    return within
 
-    return np.array([False if r_point>r_LCFS else True for r_point,r_LCFS in zip(distances_point_to_mag_axis,distances_LCFS_to_mag_axis)]) #is this larger than distance between point and mag axis?
+def LCFS_mask(grid,equilibrium):
+    """
+    returns 2D mask which is True where points on a rectangular grid lie within LCFS
+
+    args:
+        grid - mask is calculated on rectangular axes defined by grid['R_1D'] and grid['Z_1D']
+        equilibrium - equilibrium object with LCFS
+    notes:
+        rasterises the LCFS polygon one row of constant Z at a time, consistent with within_LCFS
+        masks are stored in LCFS_mask_cache against the content of the grid axes and LCFS so returned mask is read-only
+    usage:
+        mask=LCFS_mask(grid=my_equilibrium,equilibrium=my_equilibrium)
+        quantity[~mask]=0. 
+    """
+
+    def generate():
+
+        R_1D,Z_1D=np.asarray(grid['R_1D'],dtype=float),np.asarray(grid['Z_1D'],dtype=float)
+        R_1,Z_1=np.asarray(equilibrium['lcfs_r'],dtype=float),np.asarray(equilibrium['lcfs_z'],dtype=float)
+        R_2,Z_2=np.roll(R_1,-1),np.roll(Z_1,-1)
+        not_flat=Z_1!=Z_2
+        R_1,Z_1,R_2,Z_2=R_1[not_flat],Z_1[not_flat],R_2[not_flat],Z_2[not_flat]
+        gradients=(R_2-R_1)/(Z_2-Z_1)
+
+        mask=np.zeros((R_1D.size,Z_1D.size),dtype=bool)
+        for z_index,z in enumerate(Z_1D):
+            crossed=(Z_1>z)!=(Z_2>z) #edges which cross this row
+            R_crossings=np.sort(R_1[crossed]+(z-Z_1[crossed])*gradients[crossed])
+            number_crossings_right=R_crossings.size-np.searchsorted(R_crossings,R_1D,side='right')
+            mask[:,z_index]=number_crossings_right%2==1
+
+        mask.flags.writeable=False
+        return mask
+
+    return LCFS_mask_cache.get(LCFS_mask_cache.key(grid['R_1D'],grid['Z_1D'],equilibrium['lcfs_r'],equilibrium['lcfs_z']),generate)
 
 def LCFS_crop(quantity,grid,equilibrium,crop_value=0.0,outside=True):
     """
@@ -411,18 +1098,12 @@ def LCFS_crop(quantity,grid,equilibrium,crop_value=0.0,outside=True):
     """
 
     quantity_cropped=copy.deepcopy(quantity)
+    within=LCFS_mask(grid,equilibrium)
 
-    Z_2D,R_2D=np.meshgrid(grid['Z_1D'],grid['R_1D'])    
-    Z_2D_flat,R_2D_flat=Z_2D.flatten(),R_2D.flatten()
-    nR_1D,nZ_1D=len(grid['R_1D']),len(grid['Z_1D'])
-    within=np.array(within_LCFS(R_2D_flat,Z_2D_flat,equilibrium)).reshape(nR_1D,nZ_1D)
-
-    for r_counter,r in enumerate(grid['R_1D']):
-        for z_counter,z in enumerate(grid['Z_1D']):
-            if within[r_counter,z_counter] and outside is False: #crop inside LCFS
-                quantity_cropped[r_counter,z_counter]=crop_value
-            elif not within[r_counter,z_counter] and outside is True: #crop outside LCFS
-                quantity_cropped[r_counter,z_counter]=crop_value
+    if outside: #crop outside LCFS
+        quantity_cropped[~within]=crop_value
+    else: #crop inside LCFS
+        quantity_cropped[within]=crop_value
     
     return quantity_cropped
 
@@ -445,19 +1126,12 @@ def crop_2D(quantity,grid,reference,key,value,crop_value=0.0,over=True):
 
     quantity_cropped=copy.deepcopy(quantity)
 
-    Z_2D,R_2D=np.meshgrid(grid['Z_1D'],grid['R_1D'])
-    Z_2D_flat,R_2D_flat=Z_2D.flatten(),R_2D.flatten()
-
-    reference_values=value_at_RZ(R=R_2D_flat,Z=Z_2D_flat,quantity=reference[key],grid=reference) #calculate value of reference at the gridpoints where quantity is known
-    reference_values=np.squeeze(reference_values)
-    reference_values=reference_values.reshape(len(grid['R_1D']),len(grid['Z_1D']))
+    reference_values=value_at_RZ(R=grid['R_1D'],Z=grid['Z_1D'],quantity=reference[key],grid=reference,rect_grid=True) #calculate value of reference at the gridpoints where quantity is known
 
-    for r_index,r in enumerate(grid['R_1D']): 
-        for z_index,z in enumerate(grid['Z_1D']): 
-            if reference_values[r_index,z_index]>value and over is True:
-                quantity_cropped[r_index,z_index]=crop_value
-            elif reference_values[r_index,z_index]<value and over is False:
-                quantity_cropped[r_index,z_index]=crop_value
+    if over:
+        quantity_cropped[reference_values>value]=crop_value
+    else:
+        quantity_cropped[reference_values<value]=crop_value
 
     return quantity_cropped
 
@@ -525,70 +1199,415 @@ def pitch_calc(particle_list,equilibria=None,perturbations=None,i3dr=-1,phase=0.
 
     return V_pitch
 
-def get_dfn_point(dfn,type='LOCUST',**kwargs):
+def dfn_weights(dfn,shape,EBASE=True):
+    """
+    returns separable Jacobian weights of IDFTYP=1 LOCUST distribution function for each supported transform
+
+    args:
+        dfn - distribution function object holding 1D axes and bin widths
+        shape - shape of dfn['dfn'][P,V/E,V_pitch,R,Z]
+        EBASE - toggle whether dfn is against energy or velocity
+    notes:
+        dict maps tuple of kept dimensions to list of 1D weights for [P,V/E,V_pitch,R,Z] - ('N',) integrates over everything to total number
+    """
+
+    nP,nV,nV_pitch,nR,nZ=shape
+    one=[np.ones(n) for n in [nP,nV,nV_pitch,nR,nZ]]
+    space=np.asarray(dfn['R'],dtype=float)*2.*constants.pi*dfn['dR'] #real space Jacobian integrated over toroidal angle
+    dZ=np.full(nZ,float(dfn['dZ']))
+    dV_pitch=np.full(nV_pitch,float(dfn['dV_pitch']))
+
+    if EBASE:
+        dP=one[0]
+        velocity=np.full(nV,float(dfn['dE'])) #velocity space Jacobian
+        energy=one[1] #Jacobian to transform to [eV]^-1
+    else:
+        dP=np.full(nP,float(dfn['dP']))
+        velocity=np.asarray(dfn['V'],dtype=float)**2*dfn['dV']
+        energy=np.asarray(dfn['V'],dtype=float)*constants.species_charge/constants.species_mass
+
+    weights={ #[P,V/E,V_pitch,R,Z]
+            ('R','Z'):[dP,velocity,dV_pitch,one[3],one[4]],
+            ('E','V_pitch'):[dP,energy,one[2],space,dZ],
+            ('E',):[dP,energy,dV_pitch,space,dZ],
+            ('R',):[dP,velocity,dV_pitch,one[3],one[4]],
+            ('Z',):[dP,velocity,dV_pitch,one[3],one[4]],
+            ('V_pitch',):[dP,velocity,one[2],space,dZ],
+            ('N',):[dP,velocity,dV_pitch,space,dZ]
+            }
+
+    return weights
+
+def dfn_scale(dfn):
+    """
+    returns factor which dfn['dfn'] must be multiplied by to give distribution function per unit pitch
+
+    notes:
+        memory-mapped LOCUST dfns are left as stored in file and hold this factor in dfn['dfn_scale'] - see read_distribution_function_LOCUST
+    """
+
+    try:
+        return float(dfn['dfn_scale'])
+    except KeyError:
+        return 1.
+
+def dfn_integrate(dfn,axes,EBASE=True):
+    """
+    integrates IDFTYP=1 LOCUST distribution function over all dimensions not in axes, applying separable Jacobian
+
+    args:
+        dfn - distribution function object holding unedited dfn['dfn'][P,V/E,V_pitch,R,Z] and its 1D axes and bin widths
+        axes - list of dimensions to transform to (see Distribution_Function.transform() for options)
+        EBASE - toggle whether dfn is against energy or velocity
+    notes:
+        each dimension has a 1D Jacobian weight vector so the whole transform is contracted in one matrix-vector pass without copying dfn['dfn']
+        weights take the dtype of dfn['dfn'] so a float32 dfn is never promoted to a float64 temporary
+        weights for velocity based dfns convert v^2dv to eV^-1 using v*q/m when transforming to E
+        result includes dfn_scale(dfn)
+    returns:
+        integrated dfn ordered as dimensions in axes, None if axes not supported
+    """
+
+    weights=dfn_weights(dfn,dfn['dfn'].shape,EBASE=EBASE)
+
+    if tuple(axes) not in weights:
+        return None
+
+    dimensions={'E':1,'V_pitch':2,'R':3,'Z':4}
+    kept=[dimensions[axis] for axis in axes if axis in dimensions] #kept dimensions are always a contiguous block
+    first,last=(kept[0],kept[-1]+1) if kept else (3,3)
+    weights=[np.asarray(weight,dtype=dfn['dfn'].dtype) for weight in weights[tuple(axes)]]
+
+    def outer(weights):
+        product=np.ones(1,dtype=dfn['dfn'].dtype)
+        for weight in weights:
+            product=np.multiply.outer(product,weight).ravel()
+        return product
+
+    leading,trailing=outer(weights[:first]),outer(weights[last:])
+    dfn_3D=dfn['dfn'].reshape(leading.size,-1,trailing.size) #[leading summed dimensions,kept dimensions,trailing summed dimensions]
+    dfn_integrated=dfn_3D@trailing #contract summed dimensions - trailing is ones(1) when there are none
+    dfn_integrated=leading@dfn_integrated
+    dfn_integrated=dfn_integrated.reshape(dfn['dfn'].shape[first:last])*outer(weights[first:last]).reshape(dfn['dfn'].shape[first:last])*dfn_scale(dfn)
+
+    return dfn_integrated
+
+def axis_edges(centres,width=None):
+    """
+    returns bin edges of 1D axis from bin centres
+
+    args:
+        centres - bin centres
+        width - bin width to use for single bin axes
+    notes:
+        edges lie half way between neighbouring centres so irregular axes are supported
+    """
+
+    centres=np.asarray(centres,dtype=float).reshape(-1)
+    if centres.size==1:
+        width=float(width) if width is not None else 1.
+        return np.array([centres[0]-.5*width,centres[0]+.5*width])
+    midpoints=.5*(centres[1:]+centres[:-1])
+    return np.concatenate(([centres[0]-(midpoints[0]-centres[0])],midpoints,[centres[-1]+(centres[-1]-midpoints[-1])]))
+
+def bin_markers(coordinates,edges,weights=None,chunk_size=1000000):
+    """
+    bins markers onto nD grid in chunks, returning sum of weights and sum of squared weights in each bin
+
+    args:
+        coordinates - list of 1D marker coordinate arrays, one per dimension
+        edges - list of 1D monotonically increasing bin edges, one per dimension
+        weights - marker weights (default unweighted)
+        chunk_size - number of markers binned at once
+    notes:
+        bins are found with np.searchsorted and histogrammed with np.bincount over raveled multi-indices so memory is bounded by chunk_size and grid size, not by number of markers
+        binning follows np.histogramdd - bins are closed on the left, last bin is also closed on the right and markers outside the grid are dropped
+        sum of squared weights gives Monte Carlo variance of each bin
+    usage:
+        binned,binned_squared=bin_markers([markers['R'],markers['Z']],[R_edges,Z_edges],weights=markers['weight'])
+    """
+
+    edges=[np.asarray(edge,dtype=float) for edge in edges]
+    shape=tuple(edge.size-1 for edge in edges)
+    number_markers=len(coordinates[0])
+    binned=np.zeros(int(np.prod(shape)))
+    binned_squared=np.zeros(int(np.prod(shape))) if weights is not None else binned
+
+    for start in range(0,number_markers,chunk_size):
+        chunk=slice(start,min(start+chunk_size,number_markers))
+        inside=np.ones(chunk.stop-chunk.start,dtype=bool)
+        indices=[]
+        for coordinate,edge in zip(coordinates,edges):
+            coordinate=np.asarray(coordinate[chunk],dtype=float)
+            index=np.searchsorted(edge,coordinate,side='right')-1
+            index[coordinate==edge[-1]]=edge.size-2 #right-most edge belongs to last bin
+            inside&=(index>=0)&(index<edge.size-1)
+            indices.append(index)
+        flat_index=np.ravel_multi_index([index[inside] for index in indices],shape)
+        if weights is None:
+            binned+=np.bincount(flat_index,minlength=binned.size)
+        else:
+            weight=np.asarray(weights[chunk],dtype=float)[inside]
+            binned+=np.bincount(flat_index,weights=weight,minlength=binned.size)
+            binned_squared+=np.bincount(flat_index,weights=weight**2,minlength=binned.size)
+
+    return binned.reshape(shape),binned_squared.reshape(shape)
+
+def histogram_markers_chunk(arrays,start,stop,flag_values,edges):
+    """
+    histograms single chunk of markers for histogram_markers - see histogram_markers
+
+    args:
+        arrays - dict of marker arrays 'coordinates','weights','flags' or (shared memory name,dtype,shape) tuples to attach to in worker processes
+        start - index of first marker in chunk
+        stop - index after last marker in chunk
+        flag_values - sorted unique flag values to histogram separately, None to histogram all markers together
+        edges - list of bin edges with shape [number flag values,number bins+1] for each dimension, None to return coordinate ranges of each flag value instead
+    notes:
+        module-level so chunks can be sent to worker processes
+    returns:
+        flattened sum of weights in each [flag value,bins...] or min and max of each coordinate for each flag value
+    """
+
+    blocks=[]
+    def attach(array):
+        if isinstance(array,tuple): #array lives in shared memory
+            import multiprocessing.shared_memory
+            block=multiprocessing.shared_memory.SharedMemory(name=array[0])
+            blocks.append(block)
+            return np.ndarray(array[2],dtype=array[1],buffer=block.buf)
+        return array
+
+    def histogram(coordinates,weights,flags):
+        coordinates=[np.asarray(coordinate[start:stop],dtype=float) for coordinate in coordinates]
+        number_groups=1 if flag_values is None else len(flag_values)
+        if flag_values is None: #group index of each marker, -1 if not wanted
+            group=np.zeros(stop-start,dtype=int)
+            wanted=slice(None)
+        else:
+            flags=flags[start:stop]
+            if flags.dtype.kind in 'iu' and flags.dtype.itemsize==1: #e.g. LOCUST status_flag codes - look up group of every possible byte
+                representable=np.nonzero((flag_values>=np.iinfo(flags.dtype).min)&(flag_values<=np.iinfo(flags.dtype).max))[0]
+                table=np.full(256,-1,dtype=np.int16)
+                table[flag_values[representable].astype(flags.dtype).view(np.uint8)]=representable
+                group=table[flags.view(np.uint8)]
+            else:
+                group=np.searchsorted(flag_values,flags).clip(max=len(flag_values)-1)
+                group[flag_values[group]!=flags]=-1
+            wanted=np.nonzero(group>=0)[0] #drop unwanted markers before binning
+            group=group[wanted]
+            coordinates=[coordinate[wanted] for coordinate in coordinates]
+
+        if edges is None: #find range of each coordinate for each group
+            ranges=np.empty((len(coordinates),2,number_groups))
+            ranges[:,0],ranges[:,1]=np.inf,-np.inf
+            for dimension,coordinate in enumerate(coordinates):
+                if number_groups==1:
+                    ranges[dimension,:,0]=(coordinate.min(),coordinate.max()) if coordinate.size else (np.inf,-np.inf)
+                else:
+                    np.minimum.at(ranges[dimension,0],group,coordinate)
+                    np.maximum.at(ranges[dimension,1],group,coordinate)
+            return ranges
+
+        shape=tuple(edge.shape[1]-1 for edge in edges)
+        inside=np.ones(group.size,dtype=bool)
+        indices=[]
+        for coordinate,edge in zip(coordinates,edges):
+            number_bins=edge.shape[1]-1
+            if edge.shape[0]==1: #same edges for every group
+                index=np.searchsorted(edge[0],coordinate,side='right')-1
+                index[coordinate==edge[0,-1]]=number_bins-1 #right-most edge belongs to last bin
+            else: #uniform edges per group - estimate bin then correct for rounding against edges, as np.histogram
+                rows=group.clip(min=0)
+                lower,upper=edge[rows,0],edge[rows,-1]
+                inside&=(coordinate>=lower)&(coordinate<=upper)
+                index=(coordinate-lower)*(number_bins/(edge[:,-1]-edge[:,0]))[rows]
+                index=np.fmin(np.fmax(index,0),number_bins-1).astype(int) #fmax drops nan
+                flat_edge=edge.ravel()
+                rows*=number_bins+1
+                index-=coordinate<flat_edge[rows+index]
+                index+=(coordinate>=flat_edge[rows+index+1])&(index!=number_bins-1)
+            inside&=(index>=0)&(index<number_bins)
+            indices.append(index)
+
+        flat_index=np.ravel_multi_index([group[inside]]+[index[inside] for index in indices],(number_groups,)+shape)
+        weights=np.asarray(weights[start:stop],dtype=float)[wanted][inside] if weights is not None else None
+        return np.bincount(flat_index,weights=weights,minlength=number_groups*int(np.prod(shape)))
+
+    try:
+        return histogram([attach(coordinate) for coordinate in arrays['coordinates']],attach(arrays['weights']),attach(arrays['flags']))
+    finally: #views into shared memory are released when histogram returns
+        for block in blocks:
+            block.close()
+
+def histogram_markers(coordinates,bins=10,weights=None,flags=None,flag_values=None,chunk_size=1000000,processes=1,cache=True):
+    """
+    histograms markers separately for each of a set of flag values, filtering and binning every chunk in one pass
+
+    args:
+        coordinates - list of 1D marker coordinate arrays, one per dimension
+        bins - number of bins (for all or each dimension) or bin edges for each dimension, as np.histogramdd
+        weights - marker weights (default unweighted)
+        flags - marker flags used to filter markers e.g. my_final_particle_list['status_flag']
+        flag_values - list of flag values to histogram separately (default all markers together)
+        chunk_size - number of markers binned at once
+        processes - number of worker processes which chunks are split across - marker arrays are copied once to shared memory
+        cache - toggle storing result in histogram_cache against content of marker arrays, bins and flag values so repeat calls are instant
+    notes:
+        each marker is assigned its group once per chunk, so flag masks are never recomputed and no filtered copies are made
+        when bins are numbers each flag value gets its own range, as with separate np.histogramdd calls - ranges need an extra pass over markers
+        results match np.histogramdd (np.histogram for 1D) called on each filtered set of markers
+    returns:
+        list of (histogram,edges) for each flag value, where edges is list of bin edges for each dimension
+    usage:
+        [(lost,lost_edges)]=histogram_markers([my_particle_list['R'],my_particle_list['Z']],bins=20,flags=my_particle_list['status_flag'],flag_values=[my_particle_list.status_flag_code('PFC_intercept_3D')])
+    """
+
+    number_dimensions=len(coordinates)
+    bins=[bins]*number_dimensions if isinstance(bins,(int,np.integer)) else list(bins)
+    bins=[int(bin_setting) if isinstance(bin_setting,(int,np.integer)) else np.asarray(bin_setting,dtype=float) for bin_setting in bins]
+
+    def generate():
+
+        unique_values,group_indices=(None,np.zeros(1,dtype=int)) if flag_values is None else np.unique(np.asarray(flag_values),return_inverse=True)
+        number_markers=len(coordinates[0])
+        chunks=[(start,min(start+chunk_size,number_markers)) for start in range(0,number_markers,chunk_size)] or [(0,0)]
+        arrays={'coordinates':list(coordinates),'weights':weights,'flags':flags}
+        blocks=[]
+        executor=None
+
+        try:
+            if processes>1: #copy arrays to shared memory so each worker attaches to the same copy
+                import concurrent.futures
+                import multiprocessing.shared_memory
+
+                def share(array):
+                    array=np.ascontiguousarray(array)
+                    block=multiprocessing.shared_memory.SharedMemory(create=True,size=max(array.nbytes,1))
+                    blocks.append(block)
+                    np.ndarray(array.shape,dtype=array.dtype,buffer=block.buf)[...]=array
+                    return (block.name,array.dtype.str,array.shape)
+
+                arrays={'coordinates':[share(coordinate) for coordinate in coordinates],'weights':share(weights) if weights is not None else None,'flags':share(flags) if flags is not None else None}
+                executor=concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+                def map_chunks(edges):
+                    return list(executor.map(histogram_markers_chunk,*zip(*[(arrays,start,stop,unique_values,edges) for start,stop in chunks])))
+            else:
+                def map_chunks(edges):
+                    return [histogram_markers_chunk(arrays,start,stop,unique_values,edges) for start,stop in chunks]
+
+            edges=[bin_setting[np.newaxis,:] if isinstance(bin_setting,np.ndarray) else None for bin_setting in bins]
+            if any(edge is None for edge in edges): #find range of each group to set uniform edges, as np.histogramdd
+                ranges=map_chunks(None)
+                lower=np.min([chunk_ranges[:,0] for chunk_ranges in ranges],axis=0)
+                upper=np.max([chunk_ranges[:,1] for chunk_ranges in ranges],axis=0)
+                for dimension,bin_setting in enumerate(bins):
+                    if edges[dimension] is None:
+                        first,last=lower[dimension],upper[dimension]
+                        empty=~np.isfinite(first)
+                        first[empty],last[empty]=0.,1.
+                        equal=first==last
+                        first[equal]-=.5
+                        last[equal]+=.5
+                        edges[dimension]=np.linspace(first,last,bin_setting+1,axis=1)
+
+            binned=np.sum(map_chunks(edges),axis=0).reshape((-1,)+tuple(edge.shape[1]-1 for edge in edges))
+            binned.flags.writeable=False #may be shared through histogram_cache
+            for edge in edges:
+                edge.flags.writeable=False
+
+        finally:
+            if executor is not None: #workers must exit before shared memory is unlinked
+                executor.shutdown()
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+        return [(binned[group],[edge[group] if edge.shape[0]>1 else edge[0] for edge in edges]) for group in group_indices]
+
+    if not cache:
+        return generate()
+
+    arrays=[np.asarray(array) for array in list(coordinates)+[weights,flags] if array is not None]
+    bin_options=tuple(tuple(bin_setting.tolist()) if isinstance(bin_setting,np.ndarray) else bin_setting for bin_setting in bins)
+    key=histogram_cache.key(*arrays,type='histogram',bins=bin_options,weighted=weights is not None,flagged=flags is not None,flag_values=tuple(np.asarray(flag_values).tolist()) if flag_values is not None else None)
+    return histogram_cache.get(key,generate)
+
+def get_dfn_point(dfn,type='LOCUST',interpolate=False,**kwargs):
     """
     returns magnitude of dfn at a point closest to that supplied
 
     args:
         dfn - distribution_function object
         type - type of distribution function
+        interpolate - toggle multilinear interpolation between neighbouring grid points instead of nearest neighbour (points outside grid are clamped to edge)
         kwargs - should define desired points in all possible dimensions to sample at
     usage:
         my_values=get_dfn_point(my_dfn,E=[1,2,3],V_pitch=[-1,0,1],R=[1,2,3],Z=[0,0,0],P=[-pi,-pi,-pi])
         my_values=get_dfn_point(my_dfn,type='TRANSP',E=[1,2,3],V_pitch=[-1,0,1],R=[1,2,3],Z=[0,0,0]) (for TRANSP)
     notes:
+        regular axes are searched with np.searchsorted and all values are gathered with a single fancy index
+        TRANSP irregular R2D,Z2D mesh is queried with a scipy.spatial.cKDTree which is stored in mesh_tree_cache so is only built once per mesh
+        TRANSP interpolation is only applied along V_pitch and E - nearest mesh cell is always taken in R,Z
+        values include dfn_scale(dfn)
     """
 
-    if type=='TRANSP': #TRANSP has non-standard way of defining dimensions
+    def axis_weights(axis,points):
+        """
+        returns indices and weights of neighbouring grid points along axis - single index with unit weight if not interpolating
+        """
 
-        dfn_values=[]
+        axis=np.asarray(axis).reshape(-1)
+        points=np.asarray(points,dtype=float).reshape(-1)
+        if axis.size==1:
+            return [(np.zeros(points.size,dtype=int),np.ones(points.size))]
+        order=np.argsort(axis,kind='stable') #axes are usually monotonic but direction is not guaranteed
+        axis_sorted=axis[order]
+        upper=np.searchsorted(axis_sorted,points).clip(1,axis.size-1)
+        lower=upper-1
+        if interpolate:
+            fraction=((points-axis_sorted[lower])/(axis_sorted[upper]-axis_sorted[lower])).clip(0.,1.)
+            return [(order[lower],1.-fraction),(order[upper],fraction)]
+        nearest=np.where(points-axis_sorted[lower]<=axis_sorted[upper]-points,lower,upper) #ties go to lower grid point, as argmin
+        return [(order[nearest],np.ones(points.size))]
+
+    def gather(dfn_values,dimension_weights):
+        """
+        sums dfn_values over every combination of neighbouring grid points in each dimension
+        """
 
-        for E,V_pitch,R,Z in zip(kwargs['E'],kwargs['V_pitch'],kwargs['R'],kwargs['Z']):
+        values=0.
+        for corner in itertools.product(*dimension_weights):
+            indices=tuple(index for index,weight in corner)
+            weights=np.prod([weight for index,weight in corner],axis=0)
+            values=values+dfn_values[indices]*weights if interpolate else dfn_values[indices]
+        return values
 
-            diff_R=np.abs(dfn['R2D']-R)**2 #irregular grid so need to minimise distance to every point
-            diff_Z=np.abs(dfn['Z2D']-Z)**2
+    if type=='TRANSP': #TRANSP has non-standard way of defining dimensions
 
-            index_RZ=(diff_R+diff_Z).argmin()
-            index_V_pitch=np.abs(dfn['V_pitch']-V_pitch).argmin()
-            index_E=np.abs(dfn['E']-E).argmin()
+        try:
+            import scipy.spatial
+        except:
+            raise ImportError("ERROR: get_dfn_point could not import scipy.spatial!\nreturning\n")
 
-            dfn_values.append(dfn['dfn'][index_RZ,index_V_pitch,index_E])
+        R2D,Z2D=np.asarray(dfn['R2D']).reshape(-1),np.asarray(dfn['Z2D']).reshape(-1)
+        tree=mesh_tree_cache.get(mesh_tree_cache.key(dfn['R2D'],dfn['Z2D'],type='cKDTree'),lambda: scipy.spatial.cKDTree(np.column_stack((R2D,Z2D)))) #irregular grid so find nearest mesh point with tree
+        index_RZ=tree.query(np.column_stack((np.asarray(kwargs['R'],dtype=float).reshape(-1),np.asarray(kwargs['Z'],dtype=float).reshape(-1))))[1]
 
-            print('R') #diagnostic printing out to show the point is in right ball park
-            print(dfn['R2D'][index_RZ])
-            print('Z') #diagnostic printing out to show the point is in right ball park
-            print(dfn['Z2D'][index_RZ])
-            print('V_pitch') #diagnostic printing out to show the point is in right ball park
-            print(dfn['V_pitch'][index_V_pitch])  
-            print('E') #diagnostic printing out to show the point is in right ball park
-            print(dfn['E'][index_E])
+        dfn_values=gather(dfn['dfn'],[[(index_RZ,np.ones(index_RZ.size))],axis_weights(dfn['V_pitch'],kwargs['V_pitch']),axis_weights(dfn['E'],kwargs['E'])])
 
     else:
 
-        number_dimensions=len(kwargs.keys())
-        for key in kwargs:
-            number_points=len(kwargs[key])
-
-        coordinate_array=np.ndarray(shape=(number_points,number_dimensions),dtype=int) #hold nD indices of all the N points we want to know in an NxnD array for an nD distribution function
-
-        for key in kwargs: #go through supplied dimensions
-
-            for dimension in dfn['dfn_index']: #find the dfn index of the dimension we're dealing with
-                if key == dimension:
-                    dimension_index=dfn['dfn_index'].tolist().index(key)
+        dimension_weights=[]
+        for dimension in dfn['dfn_index']: #go through dfn dimensions in order
+            if dimension not in kwargs:
+                print("ERROR: get_dfn_point requires points in all dfn dimensions - missing {}!\nreturning\n".format(dimension))
+                return
+            dimension_weights.append(axis_weights(dfn[dimension],kwargs[dimension])) #find indices of grid points around the points we're dealing with along this dimension
 
-            for counter,point in enumerate(kwargs[key]):
-                point_index=np.abs(dfn[key]-point).argmin() #find index of nearest grid point to the point we're dealing with along this dimension 
-                coordinate_array[counter,dimension_index]=point_index 
-                #print(key) #diagnostic printing out to show the point is in right ball park
-                #print(dfn[key][point_index])
+        dfn_values=gather(dfn['dfn'],dimension_weights)
 
-        dfn_values=[]
-        for coordinate in coordinate_array:
-            dfn_values.append(dfn['dfn'][tuple(coordinate)])
-
-
-    dfn_values=np.asarray(dfn_values)
+    dfn_values=np.asarray(dfn_values)*dfn_scale(dfn)
     return dfn_values
 
 def Zeff_calc(density,charge):
@@ -648,22 +1667,53 @@ def knuth_shuffle(*args):
       *args - arrays of same length to be shuffled in parallel
    notes:
       preserves index mapping between arrays
+      shuffles in place - kept for backwards compatibility, see shuffle()
    """
 
-   import random
+   return shuffle(*args,in_place=True)
+
+def shuffle(*args,seed=None,in_place=False,block_size=None):
+    """
+    shuffles arrays in parallel with a single random permutation
 
-   number_entries=len(args[0])
-   range_number_entries=list(range(number_entries))[1:] #remove first entry since do not want entries swapping with themselves
-   range_number_entries_reverse=range_number_entries.reverse()
-   
-   for i in range_number_entries:
-      rand=random.uniform(0.,1.)
-      rand_entry=int(rand*i+1)
-      #iterate over all *args
-      for arg in args:
-         arg[rand_entry],arg[i]=arg[i],arg[rand_entry]
-   return [arg for arg in args]
+    notes:
+        preserves index mapping between arrays
+        each array is permuted with one gather so cost is O(n) regardless of number of arrays
+        returns shuffled copies and leaves args untouched unless in_place
+        if block_size is given, returns a generator of lists of shuffled blocks instead, so whole shuffled arrays never need to be held in memory e.g. for memory-mapped arrays
+            each block is gathered in ascending index order to keep reads local 
+            in_place is ignored
+    args:
+        *args - arrays of same length to be shuffled in parallel
+        seed - seed (or numpy.random.Generator) for reproducible shuffles
+        in_place - toggle overwriting args with shuffled values 
+        block_size - number of entries per generated block
+    usage:
+        R,Z=shuffle(R,Z,seed=1)
+        shuffle(R,Z,in_place=True)
+        for R_block,Z_block in shuffle(R,Z,block_size=1000000): 
+    """
 
+    permutation=np.random.default_rng(seed).permutation(len(args[0]))
+
+    def shuffle_blocks():
+        for start in range(0,len(permutation),block_size):
+            indices=permutation[start:start+block_size]
+            order=np.argsort(indices)
+            inverse_order=np.empty_like(order)
+            inverse_order[order]=np.arange(len(order))
+            sorted_indices=indices[order]
+            yield [np.asarray(arg)[sorted_indices][inverse_order] for arg in args]
+
+    if block_size is not None:
+        return shuffle_blocks()
+
+    shuffled=[np.asarray(arg)[permutation] for arg in args]
+    if in_place:
+        for arg,shuffled_arg in zip(args,shuffled):
+            arg[:]=shuffled_arg
+        return list(args)
+    return shuffled
 
 def sigmoid(x):
     """
@@ -801,9 +801,7 @@ def dump_profiles_ASCOT(filename,temperature_i,temperature_e,density_i,density_e
         flux_pol_norm_sqrt=np.sqrt(np.abs(temperature_e['flux_pol_norm'])) #calculate profiles vs np.sqrt(flux_pol)
         flux_pol_norm_sqrt,te,ne,rot,ti,ni=processing.utils.sort_arrays(flux_pol_norm_sqrt,temperature_e['T'],density_e['n'],rotation_toroidal,temperature_i['T'],density_i['n']) #check order
 
-        for RHO,Te,Ne,Vtor_I,Ti1,Ni1 in zip(flux_pol_norm_sqrt,te,ne,rot,ti,ni): 
-            line=processing.utils.fortran_string(RHO,16,7)+processing.utils.fortran_string(Te,16,7)+processing.utils.fortran_string(Ne,16,7)+processing.utils.fortran_string(Vtor_I,15,7)+processing.utils.fortran_string(Ti1,17,7)+processing.utils.fortran_string(Ni1,15,7)+"\n"
-            file.write(line)
+        file.writelines(processing.utils.fortran_lines([flux_pol_norm_sqrt,te,ne,rot,ti,ni],[(16,7),(16,7),(16,7),(15,7),(17,7),(15,7)])) #RHO,Te,Ne,Vtor_I,Ti1,Ni1
 
     print("finished dumping profiles to ASCOT format")
 
@@ -1369,8 +1367,7 @@ def dump_rotation_MARSF(filename,some_rotation):
  
         file.write("{length} {some_number}\n".format(length=int(flux_pol_norm_sqrt.size),some_number=1)) #re-insert line containing length
         
-        for point in range(flux_pol_norm_sqrt.size): #iterate through all points i.e. length of our dictionary's arrays
-            file.write("{flux_pol_norm_sqrt}{rotation}\n".format(flux_pol_norm_sqrt=processing.utils.fortran_string(flux_pol_norm_sqrt[point],24,18),rotation=processing.utils.fortran_string(rotation[point],24,18)))
+        file.writelines(processing.utils.fortran_lines([flux_pol_norm_sqrt,rotation],(24,18))) #write all points i.e. length of our dictionary's arrays
 
     print("finished writing rotation to MARSF mogui")
 
@@ -1592,30 +1589,10 @@ def dump_perturbation_point_data_input(BCHECK=1,**kwargs):
     with open(filepath,'w') as file: #open file
 
         if BCHECK==1:
-            for R,Phi,Z,time in zip(kwargs['R'],kwargs['phi'],kwargs['Z'],kwargs['time']):
-                line=' '
-                line+=processing.utils.fortran_string(R,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(Phi,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(Z,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(time,11,6,exponential=False)
-                line+='  '
-                file.write('{}\n'.format(line))
+            file.writelines(processing.utils.fortran_lines([kwargs['R'],kwargs['phi'],kwargs['Z'],kwargs['time']],(12,6,False),line_end='  \n')) #each column is a space followed by 11 character float
 
         elif BCHECK==2:
-            for X,Y,Z,time in zip(kwargs['X'],kwargs['Y'],kwargs['Z'],kwargs['time']):
-                line=' '
-                line+=processing.utils.fortran_string(X,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(Y,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(Z,11,6,exponential=False)
-                line+=' '
-                line+=processing.utils.fortran_string(time,11,6,exponential=False)
-                line+='  '
-                file.write('{}\n'.format(line))
+            file.writelines(processing.utils.fortran_lines([kwargs['X'],kwargs['Y'],kwargs['Z'],kwargs['time']],(12,6,False),line_end='  \n'))
 
     print("finished writing point_inp.dat test points")
 
@@ -30,6 +30,8 @@ except:
 #general
 np.set_printoptions(precision=None,threshold=99999999) #set printing style of numpy arrays
 np.set_printoptions(linewidth=99999999)
+interpolator_cache_size=2.e9 #maximum memory held by processing.utils.interpolator_cache [bytes]
+histogram_processes=1 #number of worker processes used by processing.utils.histogram_markers when plotting marker histograms
 
 #plotting
 def cmap_custom(from_rgb,to_rgb):